@@ -0,0 +1,49 @@
+"""
+asgi.py
+---------
+Defines an entrypoint for serving the backend as an ASGI app across several
+worker processes.
+"""
+
+import glob
+import os
+import tempfile
+
+import uvicorn
+
+
+def _share_metrics(workers: int) -> None:
+    """Has the worker processes report their Prometheus metrics together.
+
+    Each worker otherwise keeps its own counters, and a scrape of /metrics
+    would only see the worker that happened to answer it. The directory is
+    cleared of earlier runs' files before the workers start.
+    """
+    if workers <= 1:
+        return
+
+    directory = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR",
+        os.path.join(tempfile.gettempdir(), "candybowl-metrics"),
+    )
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(path)
+
+
+def main() -> None:
+    """Runs the asynchronous backend under uvicorn."""
+    workers = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    _share_metrics(workers)
+    uvicorn.run(
+        "backend.routes.asgi:create_app",
+        factory=True,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "5000")),
+        workers=workers,
+        timeout_keep_alive=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
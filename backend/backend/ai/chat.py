@@ -1,10 +1,29 @@
+from __future__ import annotations
 import os
+import threading
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Iterator,
+    Literal,
+    TypeAlias,
+    get_args,
+)
+
+from loguru import logger
+
+from backend import metrics
+from backend.ai import snapshot
+from backend.analytics import BOWL_VOLUME_CUBIC_FEET, STORAGE_VOLUME_CUBIC_FEET
+from backend.node import new_chat_id
 
-from google import genai
-from google.genai import types
-from google.genai.chats import Chat
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+    from google.genai.chats import AsyncChat, Chat
 
-from .tools import inventory, notes, supplier, bank
+    from backend.ai.sessions import ChatSessionStore
+    from backend.jobs import JobContext
 
 INITIAL_MONEY_BALANCE = 100
 
@@ -15,8 +34,8 @@ BASIC_INFO = [
     "You must stock the candy bowl with products based on requests from users. However, you should only stock the candy bowl with products that you believe will turn a profit.",
     "Take note of what products users request and the prices they suggest you sell them for. You can use this information to make better decisions about how best to turn a profit.",
     "You should primarily aim to stock the bowl with candy, but you can also stock it with other products that you believe will turn a profit so long as they account for the size constraints of the bowl.",
-    "You have an initial balance of ${INITIAL_MONEY_BALANCE}.",
-    "The candy bowl has a volume of approximately two cubic feet. Excess inventory can be placed in storage, which has a volume of 10 cubic feet. **Do not** make orders excessively larger than this.",
+    f"You have an initial balance of ${INITIAL_MONEY_BALANCE}.",
+    f"The candy bowl has a volume of approximately {BOWL_VOLUME_CUBIC_FEET:g} cubic feet. Excess inventory can be placed in storage, which has a volume of {STORAGE_VOLUME_CUBIC_FEET:g} cubic feet. **Do not** make orders excessively larger than this.",
     f"You are a digital agent, but {OPERATOR_NAME} can interact with your customers in the physical realm and manually restock the candy bowl when you purchase items.",
     f"In the case of an error, direct users to {OPERATOR_NAME} for assistance.",
     "Be concise when you communicate with others.",
@@ -40,8 +59,9 @@ HAGGLE_PROMPT = [
 
 RESTOCK_MESSAGE = (
     "Given the notes that you have taken, restock the candy bowl with products that you believe will turn a profit."
-    "Search for products that have sold well historically, or that you believe will do well going forward."
+    "Search for products that have sold well historically, or that you believe will do well going forward. Start with get_restock_analytics, which ranks the items by how profitable they are to restock and suggests how many of each to reorder, and use get_sales_summary for more detail on how each item has sold."
     "Each search that you make for an item costs $0.01, which you should include in the total cost of the restock. Try to avoid excessive, unnecessary searches."
+    "When considering several products, search for them together in a single batch."
     "For each item that you wish to add to the candy bowl, provide the following information:"
     "   1. The unique identifier for the item."
     "   2. The name of the item."
@@ -51,64 +71,164 @@ RESTOCK_MESSAGE = (
     "   6. A description of the item."
     "   7. The per-unit price that you suggest selling the item for in the candy bowl."
     "For each item in the candy bowl, re-assess the current price against how well they have sold, and adjust the price accordingly."
+    "Record the items you add with stock_items, and make all of your price changes together with set_prices."
     "Justify your decisions in a concise manner, and provide the total cost of the restock."
     "The total cost of the restock must not exceed the current balance in the bank account."
 )
 
-_client = genai.Client(
-    api_key=os.getenv("GOOGLE_API_KEY"),
-)
+_client: genai.Client | None = None
+_client_lock = threading.Lock()
 
-_chats = {}
+MODEL = "gemini-2.5-flash"
 
+ChatKind: TypeAlias = Literal["request", "haggle", "restock"]
 
-def request_chat() -> Chat:
-    """Returns a chat session with the Gemini model about making a request for the candy bowl."""
-    config = types.GenerateContentConfigDict(
-        system_instruction=BASIC_INFO + REQUEST_PROMPT,
-        tools=[inventory.get_inventory, notes.get_notes, notes.add_note],
-    )
+_configs: dict[ChatKind, types.GenerateContentConfig] = {}
+_configs_lock = threading.Lock()
 
-    try:
-        return _client.chats.create(model="gemini-2.5-flash", config=config)
 
-    except Exception as e:
-        raise RuntimeError(f"Failed to create chat: {e}")
+def _get_client() -> genai.Client:
+    """Returns the model client, importing the SDK and creating it on first use.
 
+    The SDK takes about a second to import, so deferring it keeps it off the
+    startup path of the apps and of anything importing this module.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai
 
-def haggle_chat() -> Chat:
-    """Returns a chat session with the Gemini model about haggling over prices."""
-    config = types.GenerateContentConfigDict(
-        system_instruction=BASIC_INFO + HAGGLE_PROMPT,
-        tools=[
+            _client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        return _client
+
+
+def _build_config(kind: ChatKind) -> types.GenerateContentConfigDict:
+    """Builds the model configuration for the given kind of chat."""
+    # Loading the tools pulls in pydantic, so it happens with the first chat
+    # or the warm-up rather than at startup.
+    from .tools import analytics, bank, inventory, notes, supplier
+
+    if kind == "request":
+        return {
+            "system_instruction": BASIC_INFO + REQUEST_PROMPT,
+            "tools": [
+                inventory.get_inventory,
+                notes.get_notes,
+                notes.search_notes,
+                notes.add_note,
+            ],
+        }
+
+    if kind == "haggle":
+        return {
+            "system_instruction": BASIC_INFO + HAGGLE_PROMPT,
+            "tools": [
+                inventory.get_inventory,
+                inventory.set_price,
+                notes.get_notes,
+                notes.search_notes,
+                notes.add_note,
+            ],
+        }
+
+    return {
+        "system_instruction": list(BASIC_INFO),
+        "tools": [
             inventory.get_inventory,
-            inventory.set_price,
+            inventory.stock_items,
+            inventory.set_prices,
             notes.get_notes,
-            notes.add_note,
+            notes.search_notes,
+            supplier.search_product,
+            supplier.search_products,
+            bank.get_account_balance,
+            bank.get_sales_summary,
+            analytics.get_restock_analytics,
         ],
-    )
+    }
+
+
+def _config(kind: ChatKind) -> types.GenerateContentConfig:
+    """Returns the model configuration for the given kind of chat.
+
+    Configurations are validated once per kind, and every session gets its
+    own copy, so changes to one cannot leak into another. Keeping the system
+    instruction and tools identical across requests lets the model's
+    implicit prefix caching apply to them.
+    """
+    with _configs_lock:
+        config = _configs.get(kind)
+        if config is None:
+            from google.genai import types
+
+            config = types.GenerateContentConfig.model_validate(
+                _build_config(kind)
+            )
+            _configs[kind] = config
+
+    # The tools are functions, which are shared rather than copied.
+    return config.model_copy(deep=True)
 
+
+def _warm_up(asynchronous: bool) -> None:
+    try:
+        for kind in get_args(ChatKind):
+            _config(kind)
+
+        client = _get_client()
+        if not asynchronous:
+            # Opens the connection to the API, so the first model call does
+            # not pay for the handshake.
+            client.models.get(model=MODEL)
+
+    except Exception as ex:
+        logger.warning(f"Failed to warm up the model client: {ex}")
+
+
+def start_warm_up(asynchronous: bool = False) -> None:
+    """Loads the model client in the background without blocking startup.
+
+    The chat configurations are built as well, so the first chat does not
+    wait for the tools to load.
+
+    Args:
+        asynchronous: Whether the app makes asynchronous model calls, whose
+            connections cannot be opened ahead of time from another thread.
+    """
+    threading.Thread(
+        target=_warm_up,
+        args=(asynchronous,),
+        name="model-warm-up",
+        daemon=True,
+    ).start()
+
+
+def create_chat(kind: ChatKind, history: list | None = None) -> Chat:
+    """Returns a chat session of the given kind, optionally resuming a history."""
     try:
-        return _client.chats.create(model="gemini-2.5-flash", config=config)
+        return _get_client().chats.create(
+            model=MODEL, config=_config(kind), history=history
+        )
 
     except Exception as e:
         raise RuntimeError(f"Failed to create chat: {e}")
 
 
+def request_chat() -> Chat:
+    """Returns a chat session with the Gemini model about making a request for the candy bowl."""
+    return create_chat("request")
+
+
+def haggle_chat() -> Chat:
+    """Returns a chat session with the Gemini model about haggling over prices."""
+    return create_chat("haggle")
+
+
 def restock_chat() -> tuple[Chat, str]:
     """Returns chat session with the Gemini model about restocking the candy bowl with the initial response to the prompt."""
-    config = types.GenerateContentConfigDict(
-        system_instruction=BASIC_INFO,
-        tools=[
-            inventory.get_inventory,
-            notes.get_notes,
-            supplier.search_product,
-            bank.get_account_balance,
-        ],
-    )
+    chat = create_chat("restock")
 
     try:
-        chat = _client.chats.create(model="gemini-2.5-flash", config=config)
         response = send_message(chat, RESTOCK_MESSAGE)
         return chat, response
 
@@ -116,10 +236,40 @@ def restock_chat() -> tuple[Chat, str]:
         raise RuntimeError(f"Failed to create chat: {e}")
 
 
+def run_restock(job: JobContext, chats: ChatSessionStore[Chat]) -> None:
+    """Runs a restocking session as a background job.
+
+    The session is registered before the model is called, so its chat ID is
+    in the job's result as soon as the job starts and the chat can be
+    continued once the job finishes. The response is written to the job's
+    output as it is generated.
+    """
+    chat = create_chat("restock")
+    chat_id = new_chat_id()
+    chats.add(chat_id, "restock", chat)
+    job.update(chat_id=chat_id)
+
+    for text in send_message_stream(chat, RESTOCK_MESSAGE):
+        job.write(text)
+
+    chats.save(chat_id)
+
+
 def send_message(chat, message: str) -> str:
     """Sends a message to the Gemini model and returns the response."""
     try:
-        response = chat.send_message(message=message).text
+        with (
+            snapshot.turn(),
+            metrics.span(
+                "model.send_message",
+                metrics.MODEL_LATENCY,
+                operation="send_message",
+            ),
+        ):
+            result = chat.send_message(message=message)
+
+        metrics.record_usage(result.usage_metadata)
+        response = result.text
         if response is None:
             raise ValueError("Received empty response from the model.")
 
@@ -127,3 +277,98 @@ def send_message(chat, message: str) -> str:
 
     except Exception as e:
         raise RuntimeError(f"Failed to generate content: {e}")
+
+
+def send_message_stream(chat: Chat, message: str) -> Iterator[str]:
+    """Sends a message to the Gemini model and yields the response text as it is generated."""
+    try:
+        usage = None
+        with (
+            snapshot.turn(),
+            metrics.span(
+                "model.send_message_stream",
+                metrics.MODEL_LATENCY,
+                operation="send_message_stream",
+            ),
+        ):
+            for chunk in chat.send_message_stream(message=message):
+                usage = chunk.usage_metadata or usage
+                if chunk.text:
+                    yield chunk.text
+
+        metrics.record_usage(usage)
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate content: {e}")
+
+
+def create_async_chat(kind: ChatKind, history: list | None = None) -> AsyncChat:
+    """Returns an asynchronous chat session of the given kind, optionally resuming a history."""
+    try:
+        return _get_client().aio.chats.create(
+            model=MODEL, config=_config(kind), history=history
+        )
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to create chat: {e}")
+
+
+async def restock_async_chat() -> tuple[AsyncChat, str]:
+    """Returns an asynchronous restock chat session with the initial response to the prompt."""
+    chat = create_async_chat("restock")
+
+    try:
+        response = await send_message_async(chat, RESTOCK_MESSAGE)
+        return chat, response
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to create chat: {e}")
+
+
+async def send_message_async(chat: AsyncChat, message: str) -> str:
+    """Sends a message to the Gemini model without blocking the event loop and returns the response."""
+    try:
+        with (
+            snapshot.turn(),
+            metrics.span(
+                "model.send_message",
+                metrics.MODEL_LATENCY,
+                operation="send_message",
+            ),
+        ):
+            result = await chat.send_message(message=message)
+
+        metrics.record_usage(result.usage_metadata)
+        response = result.text
+        if response is None:
+            raise ValueError("Received empty response from the model.")
+
+        return response
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate content: {e}")
+
+
+async def send_message_stream_async(
+    chat: AsyncChat, message: str
+) -> AsyncIterator[str]:
+    """Sends a message to the Gemini model and yields the response text as it is generated, without blocking the event loop."""
+    try:
+        usage = None
+        with (
+            snapshot.turn(),
+            metrics.span(
+                "model.send_message_stream",
+                metrics.MODEL_LATENCY,
+                operation="send_message_stream",
+            ),
+        ):
+            async for chunk in await chat.send_message_stream(message=message):
+                usage = chunk.usage_metadata or usage
+                if chunk.text:
+                    yield chunk.text
+
+        metrics.record_usage(usage)
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate content: {e}")
@@ -0,0 +1,273 @@
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Generic, TypeVar
+
+from loguru import logger
+
+from backend.locking import atomic_write
+from backend.tenancy import DEFAULT_TENANT, current_tenant
+
+
+ChatT = TypeVar("ChatT")
+
+SESSION_DIR = os.getenv("CHAT_SESSION_DIR", "data/chats")
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "256"))
+MAX_HISTORY_BYTES = int(os.getenv("CHAT_MAX_HISTORY_BYTES", str(64 * 2**20)))
+IDLE_TTL_SECONDS = float(os.getenv("CHAT_IDLE_TTL_SECONDS", "1800"))
+SESSION_RETENTION_SECONDS = float(
+    os.getenv("CHAT_SESSION_RETENTION_SECONDS", str(7 * 24 * 3600))
+)
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+_CHAT_ID_PATTERN = re.compile(r"^[\w-]+(\.[\w-]+)*$")
+
+
+@dataclass
+class _Session(Generic[ChatT]):
+    kind: str
+    chat: ChatT
+    last_used: float
+    history_bytes: int = 0
+    tenant: str = DEFAULT_TENANT
+    # Identifies the session file as last written or read by this process.
+    signature: tuple[int, int, int] | None = None
+
+
+class ChatSessionStore(Generic[ChatT]):
+    """Keeps chat sessions in memory with LRU and idle-TTL eviction.
+
+    Every session is written to disk as JSON whenever it is added or saved,
+    so sessions that were evicted, or lost to a restart, are rebuilt through
+    `factory` the next time they are requested. Session files that have not
+    been written for `retention` seconds are deleted.
+
+    Sessions belong to the tenant that started them and are only returned to
+    requests of that tenant.
+
+    Workers sharing the directory can each pick up a chat: a session held in
+    memory is rebuilt from disk when another worker has saved it since. Two
+    workers running turns of the same chat at once still race, and the last
+    to save wins.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., ChatT],
+        directory: str | None = SESSION_DIR,
+        max_sessions: int = MAX_SESSIONS,
+        max_history_bytes: int = MAX_HISTORY_BYTES,
+        idle_ttl: float = IDLE_TTL_SECONDS,
+        retention: float = SESSION_RETENTION_SECONDS,
+    ):
+        """Initializes the store.
+
+        Args:
+            factory: Builds a chat of the given kind from a serialized history.
+            directory: Where sessions are persisted, or None to keep them in memory only.
+            max_sessions: The most sessions kept in memory at once.
+            max_history_bytes: The most serialized history kept in memory at once.
+            idle_ttl: Seconds after which an unused session is evicted.
+            retention: Seconds after which an unused session file is deleted.
+        """
+        self._factory = factory
+        self._directory = directory
+        self._max_sessions = max_sessions
+        self._max_history_bytes = max_history_bytes
+        self._idle_ttl = idle_ttl
+        self._retention = retention
+        self._pruned_at = float("-inf")
+        self._lock = threading.RLock()
+        self._sessions: OrderedDict[str, _Session[ChatT]] = OrderedDict()
+        self._history_bytes = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "rehydrations": 0,
+            "evictions_idle": 0,
+            "evictions_capacity": 0,
+            "evictions_stale": 0,
+        }
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def add(self, chat_id: str, kind: str, chat: ChatT) -> None:
+        """Registers a new chat session."""
+        with self._lock:
+            self._sessions[chat_id] = _Session(
+                kind, chat, time.monotonic(), tenant=current_tenant()
+            )
+            self.save(chat_id)
+            self._prune_expired()
+
+    def get(self, chat_id: str) -> ChatT | None:
+        """Returns the chat session, rehydrating it from disk if needed."""
+        with self._lock:
+            self._evict_idle()
+
+            session = self._sessions.get(chat_id)
+            if session is not None and session.tenant != current_tenant():
+                return None
+
+            if session is not None and self._changed_on_disk(chat_id, session):
+                self._evict(chat_id, "stale")
+                session = None
+
+            if session is not None:
+                self._counters["hits"] += 1
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(chat_id)
+                return session.chat
+
+            self._counters["misses"] += 1
+            return self._rehydrate(chat_id)
+
+    def kind(self, chat_id: str) -> str | None:
+        """Returns the kind of a session held in memory."""
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            return session.kind if session is not None else None
+
+    def save(self, chat_id: str) -> None:
+        """Persists the current history of a session and enforces the budget."""
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                return
+
+            data = json.dumps(
+                {
+                    "kind": session.kind,
+                    "tenant": session.tenant,
+                    "history": [
+                        content.model_dump(mode="json", exclude_none=True)
+                        for content in session.chat.get_history()  # type: ignore[attr-defined]
+                    ],
+                }
+            )
+            self._history_bytes += len(data) - session.history_bytes
+            session.history_bytes = len(data)
+            session.signature = self._write(chat_id, data)
+            self._evict_over_budget()
+
+    def stats(self) -> dict[str, int]:
+        """Returns cache counters and the current memory footprint."""
+        with self._lock:
+            return {
+                **self._counters,
+                "sessions": len(self._sessions),
+                "history_bytes": self._history_bytes,
+            }
+
+    def _path(self, chat_id: str) -> str | None:
+        if self._directory is None or not _CHAT_ID_PATTERN.match(chat_id):
+            return None
+
+        return os.path.join(self._directory, f"{chat_id}.json")
+
+    def _signature(self, chat_id: str) -> tuple[int, int, int] | None:
+        path = self._path(chat_id)
+        if path is None:
+            return None
+
+        try:
+            stat = os.stat(path)
+
+        except FileNotFoundError:
+            return None
+
+        # Every write replaces the file, so its inode changes even when the
+        # modification time is too coarse to tell two writes apart.
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _changed_on_disk(self, chat_id: str, session: _Session) -> bool:
+        """Whether another process saved the session after this one did."""
+        signature = self._signature(chat_id)
+        return signature is not None and signature != session.signature
+
+    def _write(self, chat_id: str, data: str) -> tuple[int, int, int] | None:
+        path = self._path(chat_id)
+        if path is None:
+            return None
+
+        with atomic_write(path) as file:
+            file.write(data)
+        return self._signature(chat_id)
+
+    def _prune_expired(self) -> None:
+        """Deletes the files of sessions unused for the retention period.
+
+        Runs at most once per `PRUNE_INTERVAL_SECONDS`. The caller must hold
+        the store lock.
+        """
+        now = time.monotonic()
+        if self._directory is None or now - self._pruned_at < (
+            PRUNE_INTERVAL_SECONDS
+        ):
+            return
+        self._pruned_at = now
+
+        deadline = time.time() - self._retention
+        removed = 0
+        for entry in os.scandir(self._directory):
+            if not entry.name.endswith(".json"):
+                continue
+
+            # Another worker may be pruning the same directory.
+            with suppress(FileNotFoundError):
+                if entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    removed += 1
+
+        if removed:
+            logger.info(f"Deleted {removed} expired chat session files.")
+
+    def _rehydrate(self, chat_id: str) -> ChatT | None:
+        path = self._path(chat_id)
+        if path is None or not os.path.exists(path):
+            return None
+
+        with open(path, "r") as file:
+            data: dict[str, Any] = json.load(file)
+
+        tenant = data.get("tenant", DEFAULT_TENANT)
+        if tenant != current_tenant():
+            return None
+
+        chat = self._factory(data["kind"], data["history"])
+        self._sessions[chat_id] = _Session(
+            data["kind"], chat, time.monotonic(), 0, tenant
+        )
+        self._counters["rehydrations"] += 1
+        logger.info(f"Rehydrated chat {chat_id} from {path}.")
+
+        self.save(chat_id)
+        return chat
+
+    def _evict(self, chat_id: str, reason: str) -> None:
+        session = self._sessions.pop(chat_id)
+        self._history_bytes -= session.history_bytes
+        self._counters[f"evictions_{reason}"] += 1
+        logger.debug(f"Evicted chat {chat_id} ({reason}).")
+
+    def _evict_idle(self) -> None:
+        deadline = time.monotonic() - self._idle_ttl
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if session.last_used > deadline:
+                break
+
+            self._evict(chat_id, "idle")
+
+    def _evict_over_budget(self) -> None:
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self._max_sessions
+            or self._history_bytes > self._max_history_bytes
+        ):
+            self._evict(next(iter(self._sessions)), "capacity")
@@ -0,0 +1,149 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import functools
+import threading
+from typing import Callable, Iterator, ParamSpec
+
+from loguru import logger
+
+from backend import metrics
+
+P = ParamSpec("P")
+
+Resource = str
+
+
+@dataclass
+class Snapshot:
+    """Results of the read tools called so far in one model turn.
+
+    Each result remembers the resources it was read from, so a write only
+    drops the results it could have changed.
+    """
+
+    results: dict[tuple[str, str], tuple[str, frozenset[Resource]]] = field(
+        default_factory=dict
+    )
+    hits: int = 0
+    misses: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def get(self, key: tuple[str, str]) -> str | None:
+        with self._lock:
+            entry = self.results.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return entry[0]
+
+    def put(
+        self, key: tuple[str, str], result: str, resources: frozenset[Resource]
+    ) -> None:
+        with self._lock:
+            self.results[key] = (result, resources)
+
+    def invalidate(self, resources: frozenset[Resource]) -> None:
+        with self._lock:
+            self.results = {
+                key: entry
+                for key, entry in self.results.items()
+                if entry[1].isdisjoint(resources)
+            }
+
+
+_snapshot: ContextVar[Snapshot | None] = ContextVar("snapshot", default=None)
+
+
+@contextmanager
+def turn() -> Iterator[Snapshot]:
+    """Serves repeated tool reads from memory until the block exits.
+
+    Within one model turn, automatic function calling often asks for the
+    same inventory, notes or balance several times. Read tools called
+    within the block return their earlier result unless a write tool has
+    changed what it was read from since. Changes made outside the turn, such
+    as by another request, are not seen until the next turn.
+    """
+    previous = _snapshot.get()
+    snapshot = Snapshot()
+    # Restoring the previous value rather than resetting a token lets this
+    # span the yields of generators that may be closed from another context.
+    _snapshot.set(snapshot)
+    try:
+        yield snapshot
+
+    finally:
+        _snapshot.set(previous)
+        if snapshot.hits:
+            logger.info(
+                f"Served {snapshot.hits} of "
+                f"{snapshot.hits + snapshot.misses} tool reads from the turn "
+                "snapshot."
+            )
+
+
+def reads(
+    *resources: Resource,
+) -> Callable[[Callable[P, str]], Callable[P, str]]:
+    """Caches a read tool's results within a turn.
+
+    Args:
+        resources: What the tool reads, such as "inventory", "notes" or
+            "ledger".
+    """
+    tags = frozenset(resources)
+
+    def decorator(func: Callable[P, str]) -> Callable[P, str]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> str:
+            snapshot = _snapshot.get()
+            if snapshot is None:
+                return func(*args, **kwargs)
+
+            key = (func.__qualname__, repr((args, sorted(kwargs.items()))))
+            result = snapshot.get(key)
+            if result is not None:
+                metrics.TOOL_SNAPSHOT_HITS.labels(tool=func.__name__).inc()
+                return result
+
+            result = func(*args, **kwargs)
+            if not result.startswith("Error"):
+                snapshot.put(key, result, tags)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def writes(
+    *resources: Resource,
+) -> Callable[[Callable[P, str]], Callable[P, str]]:
+    """Drops cached reads of the resources a write tool changes.
+
+    Args:
+        resources: What the tool changes, such as "inventory", "notes" or
+            "ledger".
+    """
+    tags = frozenset(resources)
+
+    def decorator(func: Callable[P, str]) -> Callable[P, str]:
+        @functools.wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> str:
+            try:
+                return func(*args, **kwargs)
+
+            finally:
+                snapshot = _snapshot.get()
+                if snapshot is not None:
+                    snapshot.invalidate(tags)
+
+        return wrapper
+
+    return decorator
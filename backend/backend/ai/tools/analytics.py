@@ -0,0 +1,81 @@
+import json
+
+from loguru import logger
+
+from backend import analytics, metrics
+from backend.ai import snapshot
+from backend.storage import get_storage
+
+
+@metrics.tool
+@snapshot.reads("inventory", "ledger")
+def get_restock_analytics(limit: int = 20) -> str:
+    """Ranks items by how profitable they are to restock, with how fast each sells and a suggested reorder quantity.
+
+    Use this first when restocking, instead of working out sales from the notes and inventory.
+
+    Args:
+        limit: The maximum number of items to return.
+
+    Returns:
+        A JSON string with the following fields:
+            - window_days: The number of days of sales that velocities are measured over.
+            - target_cover_days: The number of days of sales that reorder quantities aim to keep in stock.
+            - free_units: Roughly how many more units fit in the bowl and storage.
+            - total: The number of items analyzed.
+            - columns: The names of the values in each row, which are as follows:
+                - item_id: Unique identifier for the item.
+                - item_name: The name of the item.
+                - quantity: The number of units in stock.
+                - units_sold: The number of units sold within the window.
+                - velocity_per_day: The average number of units sold per day.
+                - days_of_cover: The number of days until the item sells out at that rate, or null if it is not selling.
+                - unit_cost_usd: The average price paid per unit in USD, or null if unknown.
+                - sell_price_usd: The price of a single unit in USD.
+                - margin_usd: The profit made on each unit sold in USD, or null if unknown.
+                - reorder_quantity: The suggested number of units to buy, within the space left.
+            - rows: The items, most profitable to restock first.
+        In the event of an error, returns an error message.
+    """
+    logger.info(f"Computing restock analytics (limit={limit}).")
+
+    try:
+        import numpy as np
+
+        storage = get_storage()
+        inventory = storage.inventory().get_inventory()
+        table = analytics.demand(inventory, storage.ledger)
+        free_units = analytics.capacity_units() - int(
+            inventory["quantity"].sum()
+        )
+
+        rows = (
+            table.head(max(limit, 1))
+            .round(
+                {
+                    "velocity_per_day": 2,
+                    "days_of_cover": 1,
+                    "unit_cost_usd": 3,
+                    "sell_price_usd": 2,
+                    "margin_usd": 3,
+                }
+            )
+            .replace([np.inf, -np.inf], np.nan)
+            .astype(object)
+            .where(lambda frame: frame.notna(), None)
+        )
+
+        return json.dumps(
+            {
+                "window_days": analytics.VELOCITY_WINDOW_DAYS,
+                "target_cover_days": analytics.TARGET_COVER_DAYS,
+                "free_units": max(free_units, 0),
+                "total": len(table),
+                "columns": list(rows.columns),
+                "rows": rows.values.tolist(),
+            }
+        )
+
+    except Exception as ex:
+        logger.error(f"Error computing restock analytics: {ex}")
+        return f"Error: {ex}"
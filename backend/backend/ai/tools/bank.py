@@ -1,11 +1,14 @@
-from loguru import logger
-
-from backend.notes import NotesFile
+import json
 
+from loguru import logger
 
-_bank_txt = "data/bank.txt"
+from backend import metrics
+from backend.ai import snapshot
+from backend.storage import get_storage
 
 
+@metrics.tool
+@snapshot.reads("ledger")
 def get_account_balance() -> str:
     """Retrieves the current account balance.
 
@@ -15,11 +18,78 @@ def get_account_balance() -> str:
     logger.info("Retrieving current account balance.")
 
     try:
-        notes_file = NotesFile(_bank_txt)
-        notes_content = notes_file.read()
-        logger.info(f"Current account balance: {notes_content}")
-        return notes_content
+        balance = f"${get_storage().ledger.balance_usd:.2f}"
+        logger.info(f"Current account balance: {balance}")
+        return balance
 
     except Exception as ex:
         logger.error(f"Error retrieving notes: {ex}")
         return f"Error: {ex}"
+
+
+@metrics.tool
+@snapshot.reads("ledger")
+def get_sales_summary(
+    item_id: str = "", name_contains: str = "", limit: int = 20
+) -> str:
+    """Retrieves the sales history of the bowl: its balance, totals and how well each item has sold.
+
+    Items are listed best-selling first. Use this to find which items sold well historically before restocking or repricing them.
+
+    Args:
+        item_id: Only include the item with this unique identifier.
+        name_contains: Only include items whose name contains this text (case-insensitive).
+        limit: The maximum number of items to return.
+
+    Returns:
+        A JSON string with the following fields:
+            - balance_usd: The current amount of money in the bank account in USD.
+            - totals: The total deposits, sales revenue, purchases and search fees in USD.
+            - items: A list of items, each with the following fields:
+                - item_id: Unique identifier for the item.
+                - item_name: The name of the item.
+                - units_purchased: The number of units bought for the bowl.
+                - units_sold: The number of units sold.
+                - purchase_cost_usd: The total paid for the units bought, in USD.
+                - revenue_usd: The total received for the units sold, in USD.
+                - unit_cost_usd: The average cost of a unit in USD.
+                - margin_usd: The revenue less the cost of the units sold, in USD.
+                - sell_through: The share of the units bought that have sold, from 0 to 1.
+                - sell_price_usd: The last price set for a unit in USD, if it was ever changed.
+                - price_changes: The number of times the price was changed.
+                - first_purchased: When the item was first bought.
+                - last_sold: When the item last sold.
+        In the event of an error, returns an error message.
+    """
+    logger.info(
+        f"Retrieving sales summary (item_id={item_id!r}, "
+        f"name_contains={name_contains!r}, limit={limit})."
+    )
+
+    try:
+        ledger = get_storage().ledger
+        if item_id:
+            item = ledger.item(item_id)
+            items = [item] if item is not None else []
+        else:
+            items = [
+                item
+                for item in ledger.items()
+                if name_contains.lower() in item.item_name.lower()
+            ]
+            items.sort(key=lambda item: (-item.units_sold, -item.revenue_usd))
+
+        return json.dumps(
+            {
+                "balance_usd": round(ledger.balance_usd, 2),
+                "totals": {
+                    name: round(value, 2)
+                    for name, value in ledger.totals().items()
+                },
+                "items": [item.to_dict() for item in items[: max(limit, 1)]],
+            }
+        )
+
+    except Exception as ex:
+        logger.error(f"Error retrieving sales summary: {ex}")
+        return f"Error: {ex}"
@@ -1,39 +1,175 @@
+import json
+import os
+from typing import TYPE_CHECKING
+
 from loguru import logger
+from pydantic import BaseModel
+
+from backend import metrics
+from backend.ai import snapshot
+from backend.storage import get_storage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TOKEN_BUDGET = int(os.getenv("INVENTORY_TOKEN_BUDGET", "2000"))
+DESCRIPTION_CHARS = 120
+
+SUMMARY_COLUMNS = [
+    "item_id",
+    "item_name",
+    "quantity",
+    "total_purchase_price_usd",
+    "sell_price_usd",
+]
+DETAIL_COLUMNS = ["link", "description"]
+
+_ENVELOPE = '{"total": 0, "next_offset": 0, "items": []}'
+
+
+class StockEntry(BaseModel):
+    """An item to add to the inventory with stock_items."""
+
+    item_name: str
+    link: str
+    quantity: int
+    total_purchase_price_usd: float
+    sell_price_usd: float
+    description: str
 
-from backend.inventory import InventoryManagerCSV
 
+class PriceChange(BaseModel):
+    """A new price for an item, for set_prices."""
 
-_inventory_csv = "data/inventory.csv"
+    item_id: str
+    new_price_usd: float
 
 
-def get_inventory() -> str:
-    """Retrieves a collection of all items currently in the inventory.
+def _estimate_tokens(text: str) -> int:
+    """Roughly estimates how many model tokens a string costs."""
+    return len(text) // 4 + 1
+
+
+def _summarize(inventory: "pd.DataFrame") -> str:
+    """Returns an overview of the inventory that fits within the token budget."""
+    names = []
+    for name in inventory["item_name"]:
+        names.append(name)
+        if _estimate_tokens(json.dumps(names)) > TOKEN_BUDGET // 2:
+            names.pop()
+            break
+
+    return json.dumps(
+        {
+            "total": len(inventory),
+            "total_units": int(inventory["quantity"].sum()),
+            "item_names": names,
+            "note": "Too many items to list. Narrow the results with name_contains or item_id, or page through them with offset and limit.",
+        }
+    )
+
+
+@metrics.tool
+@snapshot.reads("inventory")
+def get_inventory(
+    name_contains: str = "",
+    item_id: str = "",
+    in_stock_only: bool = False,
+    offset: int = 0,
+    limit: int = 50,
+    include_details: bool = False,
+) -> str:
+    """Retrieves items currently in the inventory, optionally filtered and paginated.
+
+    Args:
+        name_contains: Only include items whose name contains this text (case-insensitive).
+        item_id: Only include the item with this unique identifier.
+        in_stock_only: Only include items with a quantity above zero.
+        offset: The number of matching items to skip.
+        limit: The maximum number of items to return.
+        include_details: Also include the purchase link and a shortened description of each item.
 
     Returns:
-        A JSON string representation of the current inventory. The fields for each item are as follows:
-            - item_id: Unique identifier for the item.
-            - item_name: The name of the item.
-            - link: A link for where to purchase the item.
-            - quantity: The current quantity of the item in stock.
-            - total_purchase_price_usd: The price of one of the item in USD (note that one item can have multiple units).
-            - sell_price_usd: The price of a single unit of the item in USD.
-            - description: A description of the item.
+        A JSON string with the following fields:
+            - total: The number of items matching the filters.
+            - next_offset: The offset of the next page of items, or null if there are no more.
+            - items: A list of items, each with the following fields:
+                - item_id: Unique identifier for the item.
+                - item_name: The name of the item.
+                - quantity: The current quantity of the item in stock.
+                - total_purchase_price_usd: The price of one of the item in USD (note that one item can have multiple units).
+                - sell_price_usd: The price of a single unit of the item in USD.
+                - link: A link for where to purchase the item (only with include_details).
+                - description: A description of the item (only with include_details).
+        If the items do not fit within the response size limit, returns a summary of the inventory instead.
     """
-    logger.info("Retrieving current inventory.")
+    logger.info(
+        f"Retrieving inventory (name_contains={name_contains!r}, "
+        f"item_id={item_id!r}, in_stock_only={in_stock_only}, "
+        f"offset={offset}, limit={limit}, include_details={include_details})."
+    )
 
     try:
-        inventory = (
-            InventoryManagerCSV(_inventory_csv).get_inventory().to_json()
-        )
+        inventory = get_storage().inventory().get_inventory()
 
-        logger.info(f"Current inventory: {inventory}")
-        return inventory
+        if name_contains:
+            inventory = inventory[
+                inventory["item_name"].str.contains(
+                    name_contains, case=False, regex=False, na=False
+                )
+            ]
+        if item_id:
+            inventory = inventory[inventory["item_id"] == item_id]
+        if in_stock_only:
+            inventory = inventory[inventory["quantity"] > 0]
+
+        offset = max(offset, 0)
+        page = inventory.iloc[offset : offset + max(limit, 1)]
+
+        for details in (include_details, False):
+            columns = SUMMARY_COLUMNS + (DETAIL_COLUMNS if details else [])
+            records = page[columns].copy()
+            if details:
+                records["description"] = (
+                    records["description"]
+                    .fillna("")
+                    .str.slice(0, DESCRIPTION_CHARS)
+                )
+
+            # Keep as many whole records as fit, leaving the rest to later
+            # pages.
+            items: list[dict] = []
+            used = _estimate_tokens(_ENVELOPE)
+            for record in records.to_dict("records"):
+                used += _estimate_tokens(json.dumps(record)) + 1
+                if used > TOKEN_BUDGET:
+                    break
+                items.append(record)
+
+            if not items and len(page) > 0:
+                continue
+
+            end = offset + len(items)
+            result = json.dumps(
+                {
+                    "total": len(inventory),
+                    "next_offset": end if end < len(inventory) else None,
+                    "items": items,
+                }
+            )
+            logger.debug(f"Returning {len(items)} of {len(inventory)} items.")
+            return result
+
+        logger.info("Inventory exceeds the token budget; summarizing.")
+        return _summarize(inventory)
 
     except Exception as e:
         logger.error(f"Error retrieving inventory: {e}")
         return f"Error: {e}"
 
 
+@metrics.tool
+@snapshot.writes("inventory", "ledger")
 def stock_item(
     item_name: str,
     link: str,
@@ -63,17 +199,20 @@ def stock_item(
     )
 
     try:
-        inventory = InventoryManagerCSV(_inventory_csv)
-        inventory.stock_item(
-            item_name=item_name,
-            link=link,
-            quantity=quantity,
-            total_purchase_price_usd=total_purchase_price_usd,
-            sell_price_usd=sell_price_usd,
-            description=description,
-        )
+        storage = get_storage()
+        with storage.transaction():
+            item_id = storage.inventory().stock_item(
+                item_name=item_name,
+                link=link,
+                quantity=quantity,
+                total_purchase_price_usd=total_purchase_price_usd,
+                sell_price_usd=sell_price_usd,
+                description=description,
+            )
+            storage.ledger.record_purchase(
+                item_id, item_name, quantity, total_purchase_price_usd
+            )
 
-        logger.info(f"Current inventory: {inventory.get_inventory().to_json()}")
         return "Item added successfully."
 
     except Exception as ex:
@@ -81,6 +220,8 @@ def stock_item(
         return f"Error: {ex}"
 
 
+@metrics.tool
+@snapshot.writes("inventory", "ledger")
 def set_price(item_id: str, new_price_usd: float) -> str:
     """Sets a new price for an item in the inventory.
     Args:
@@ -92,12 +233,115 @@ def set_price(item_id: str, new_price_usd: float) -> str:
     logger.info(f"Setting new price for item {item_id}: {new_price_usd} USD")
 
     try:
-        inventory = InventoryManagerCSV(_inventory_csv)
-        inventory.set_price(item_id=item_id, new_price_usd=new_price_usd)
+        storage = get_storage()
+        with storage.transaction():
+            storage.inventory().set_price(
+                item_id=item_id, new_price_usd=new_price_usd
+            )
+            storage.ledger.record_price_change(item_id, new_price_usd)
 
-        logger.info(f"Current inventory: {inventory.get_inventory().to_json()}")
         return "Price updated successfully."
 
     except Exception as ex:
         logger.error(f"Error updating price: {ex}")
         return f"Error: {ex}"
+
+
+@metrics.tool
+@snapshot.writes("inventory", "ledger")
+def stock_items(items: list[StockEntry]) -> str:
+    """Adds several items to the inventory at once. Prefer this over calling stock_item once per item.
+
+    Increases the quantity of each item that already exists in the inventory, and adds a new entry for each item that does not.
+
+    Args:
+        items: The items to add, each with the following fields:
+            - item_name: The name of the item.
+            - link: The link to the item.
+            - quantity: The quantity to add.
+            - total_purchase_price_usd: The price of one of the item in USD (note that one item can have multiple units).
+            - sell_price_usd: The price of a single unit of the item in USD.
+            - description: A description of the item.
+
+    Returns:
+        A JSON list with the result for each item, in order, each with the item name and either "ok" or the reason the item could not be added.
+    """
+    logger.info(f"Adding {len(items)} items to inventory.")
+
+    try:
+        storage = get_storage()
+        with storage.transaction():
+            results = storage.inventory().stock_items(
+                [item.model_dump() for item in items]
+            )
+            storage.ledger.record_all(
+                [
+                    storage.ledger.purchase(
+                        result,
+                        item.item_name,
+                        item.quantity,
+                        item.total_purchase_price_usd,
+                    )
+                    for item, result in zip(items, results)
+                    if not isinstance(result, Exception)
+                ]
+            )
+
+        return json.dumps(
+            [
+                {
+                    "item_name": item.item_name,
+                    "result": (
+                        str(result) if isinstance(result, Exception) else "ok"
+                    ),
+                }
+                for item, result in zip(items, results)
+            ]
+        )
+
+    except Exception as ex:
+        logger.error(f"Error adding items: {ex}")
+        return f"Error: {ex}"
+
+
+@metrics.tool
+@snapshot.writes("inventory", "ledger")
+def set_prices(prices: list[PriceChange]) -> str:
+    """Sets new prices for several items in the inventory at once. Prefer this over calling set_price once per item.
+
+    Args:
+        prices: The price changes, each with the following fields:
+            - item_id: The unique identifier for the item.
+            - new_price_usd: The new price of the item in USD.
+
+    Returns:
+        A JSON list with the result for each item, in order, each with the item ID and either "ok" or the reason the price could not be set.
+    """
+    logger.info(f"Setting new prices for {len(prices)} items.")
+
+    try:
+        storage = get_storage()
+        with storage.transaction():
+            errors = storage.inventory().set_prices(
+                [(price.item_id, price.new_price_usd) for price in prices]
+            )
+            storage.ledger.record_all(
+                [
+                    storage.ledger.price_change(
+                        price.item_id, price.new_price_usd
+                    )
+                    for price, error in zip(prices, errors)
+                    if error is None
+                ]
+            )
+
+        return json.dumps(
+            [
+                {"item_id": price.item_id, "result": error or "ok"}
+                for price, error in zip(prices, errors)
+            ]
+        )
+
+    except Exception as ex:
+        logger.error(f"Error updating prices: {ex}")
+        return f"Error: {ex}"
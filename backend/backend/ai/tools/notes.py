@@ -1,46 +1,187 @@
+import json
+import os
+import time
+
 from loguru import logger
 
-from backend.notes import NotesFile
+from backend import metrics
+from backend.ai import snapshot
+from backend.notes import Note
+from backend.storage import get_storage
+
+CHAR_BUDGET = int(os.getenv("NOTES_CHAR_BUDGET", "4000"))
+SNIPPET_CHARS = 200
+SUMMARY_USERS = 10
 
 
-_notes_txt = "data/notes.txt"
+@metrics.tool
+@snapshot.reads("notes")
+def get_notes(user: str = "", item: str = "", days: int = 0) -> str:
+    """Retrieves the most recent notes, optionally filtered by user, item or age.
 
+    Older notes are rolled up into per-item summaries, which are returned alongside the recent notes. Summaries take up at most half of the response, most recently mentioned items first.
 
-def get_notes() -> str:
-    """Retrieves the current notes.
+    Args:
+        user: Only include notes about users whose name contains this text.
+        item: Only include notes about items whose name contains this text.
+        days: Only include notes taken within this many days. Zero includes notes of any age.
 
     Returns:
-        A string containing the current notes.
+        A JSON string with the following fields:
+            - summaries: Per-item aggregates of older notes, most recently mentioned first, each with the number of notes, the first few users involved, the range and mean of suggested prices, when the item was first and last mentioned, and the latest few note texts, shortened.
+            - omitted_summaries: How many matching summaries did not fit in the response.
+            - notes: The most recent matching notes, newest first, each with a timestamp, user, item, suggested price and text.
+            - omitted: How many older matching notes did not fit in the response.
     """
-    logger.info("Retrieving current notes.")
+    logger.info(
+        f"Retrieving notes (user={user!r}, item={item!r}, days={days})."
+    )
 
     try:
-        notes_file = NotesFile(_notes_txt)
-        notes_content = notes_file.read()
-        logger.info(f"Current notes: {notes_content}")
-        return notes_content
+        log = get_storage().notes_log
+        since = time.time() - days * 24 * 3600 if days > 0 else 0.0
+        notes = log.query(user=user, item=item, since=since)
+
+        matching = sorted(
+            log.summaries(user, item),
+            key=lambda summary: summary.last_seen,
+            reverse=True,
+        )
+        summaries: list[dict] = []
+        used = 0
+        for summary in matching:
+            entry = summary.to_dict()
+            entry["users"] = entry["users"][:SUMMARY_USERS]
+            entry["recent_texts"] = [
+                text[:SNIPPET_CHARS] for text in entry["recent_texts"]
+            ]
+            size = len(json.dumps(entry)) + 2
+            if used + size > CHAR_BUDGET // 2:
+                break
+            used += size
+            summaries.append(entry)
+
+        recent: list[dict] = []
+        for note in reversed(notes):
+            entry = note.to_dict()
+            used += len(json.dumps(entry)) + 2
+            if used > CHAR_BUDGET:
+                break
+            recent.append(entry)
+
+        result = json.dumps(
+            {
+                "summaries": summaries,
+                "omitted_summaries": len(matching) - len(summaries),
+                "notes": recent,
+                "omitted": len(notes) - len(recent),
+            }
+        )
+        logger.debug(
+            f"Returning {len(summaries)} summaries and {len(recent)} notes."
+        )
+        return result
 
     except Exception as ex:
         logger.error(f"Error retrieving notes: {ex}")
         return f"Error: {ex}"
 
 
-def add_note(note: str) -> str:
+@metrics.tool
+@snapshot.writes("notes")
+def add_note(
+    note: str,
+    user: str = "",
+    item: str = "",
+    suggested_price_usd: float = 0.0,
+) -> str:
     """Adds a new note.
 
     Args:
         note: The note to add.
+        user: The name of the user the note is about, if any.
+        item: The name of the item the note is about, if any.
+        suggested_price_usd: The per-unit price the user suggested for the item in USD, or zero if none was suggested.
 
     Returns:
         A message indicating success or failure.
     """
-    logger.info(f"Adding new note: {note}")
+    logger.info(
+        f"Adding new note: {note} (user={user!r}, item={item!r}, "
+        f"suggested_price_usd={suggested_price_usd})"
+    )
 
     try:
-        notes_file = NotesFile(_notes_txt)
-        notes_file.append(note)
+        get_storage().notes_log.append(
+            note,
+            user=user,
+            item=item,
+            suggested_price_usd=suggested_price_usd or None,
+        )
         logger.info("Note added successfully.")
         return "Note added successfully."
     except Exception as ex:
         logger.error(f"Error adding note: {ex}")
         return f"Error: {ex}"
+
+
+@metrics.tool
+@snapshot.reads("notes", "inventory")
+def search_notes(query: str, k: int = 5) -> str:
+    """Searches the notes and the inventory for the entries most relevant to a query, such as a product, a kind of candy or a user.
+
+    Prefer this over get_notes to find out who asked for what, or whether a product is already stocked.
+
+    Args:
+        query: The words to search for.
+        k: The maximum number of notes and of inventory items to return.
+
+    Returns:
+        A JSON string with the following fields:
+            - notes: The most relevant notes, best match first, each with a relevance score, timestamp, user, item, suggested price and text. Matching summaries of older notes have an item, the users involved, the number of notes and their latest texts instead.
+            - inventory: The most relevant inventory items, best match first, each with a relevance score, the item ID, name, quantity, sell price in USD and a shortened description.
+    """
+    logger.info(f"Searching notes and inventory for {query!r} (k={k}).")
+
+    try:
+        storage = get_storage()
+        notes: list[dict] = []
+        for entry, score in storage.notes_log.search(query, k):
+            if isinstance(entry, Note):
+                match = entry.to_dict()
+                match["text"] = match["text"][:SNIPPET_CHARS]
+            else:
+                match = {
+                    "item": entry.item or None,
+                    "users": entry.users,
+                    "count": entry.count,
+                    "recent_texts": [
+                        text[:SNIPPET_CHARS] for text in entry.recent_texts
+                    ],
+                }
+            notes.append({"score": round(score, 2), **match})
+
+        inventory = [
+            {
+                "score": round(item["score"], 2),
+                "item_id": item["item_id"],
+                "item_name": item["item_name"],
+                "quantity": item["quantity"],
+                "sell_price_usd": item["sell_price_usd"],
+                "description": (
+                    item["description"]
+                    if isinstance(item["description"], str)
+                    else ""
+                )[:SNIPPET_CHARS],
+            }
+            for item in storage.inventory().search(query, k)
+        ]
+
+        logger.debug(
+            f"Found {len(notes)} notes and {len(inventory)} inventory items."
+        )
+        return json.dumps({"notes": notes, "inventory": inventory})
+
+    except Exception as ex:
+        logger.error(f"Error searching notes: {ex}")
+        return f"Error: {ex}"
@@ -1,6 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+
 from loguru import logger
 
+from backend import amazon, metrics
+from backend.ai import snapshot
+from backend.storage import get_storage
+
+SEARCH_PARALLELISM = int(os.getenv("SEARCH_PARALLELISM", "4"))
+SEARCH_FEE_USD = 0.01
 
+
+@metrics.tool
+@snapshot.writes("ledger")
 def search_product(name: str) -> str:
     """Searches the marketplace for a product by name and returns a JSON string of the results.
 
@@ -20,16 +33,80 @@ def search_product(name: str) -> str:
     logger.info(f"Searching for product: {name}")
 
     try:
-        items = search_product(name, limit=5)
-        if items is None:
+        get_storage().ledger.record_search_fee(1, SEARCH_FEE_USD)
+        items = amazon.search_product(name, limit=5)
+        if not items:
             logger.info("No items found for the given product name.")
             return "Error: No items found."
 
         results_json = {"results": [item.to_dict() for item in items]}
 
-        logger.info(f"Search results: {results_json}")
+        logger.debug(f"Search results: {results_json}")
         return str(results_json)
 
     except Exception as ex:
         logger.error(f"Error searching for product: {ex}")
         return f"Error: {ex}"
+
+
+@metrics.tool
+@snapshot.writes("ledger")
+def search_products(names: list[str]) -> str:
+    """Searches the marketplace for several products at once and returns a JSON string of the results grouped by product name.
+
+    Prefer this over repeated calls to search_product when considering more than one product. Each name still counts as one search.
+
+    Args:
+        names: The names of the products to search for.
+
+    Returns:
+        A JSON string mapping each product name to its search results. The fields for each item are as follows:
+            - id: Unique identifier for the item in the marketplace.
+            - name: The name of the item.
+            - description: A description of the item.
+            - price_usd: The price of the item in USD.
+            - url: A link to the item in the marketplace.
+            - rating: The average rating of the item based on user reviews.
+        An item found by several searches is only listed under the first of them. Searches that fail map to an error message instead of a list.
+    """
+    names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+    logger.info(f"Searching for products: {names}")
+
+    if not names:
+        return "Error: No product names given."
+
+    try:
+        get_storage().ledger.record_search_fee(len(names), SEARCH_FEE_USD)
+
+    except Exception as ex:
+        logger.error(f"Error recording search fees: {ex}")
+        return f"Error: {ex}"
+
+    def search(name: str) -> list[amazon.Item] | Exception:
+        try:
+            return amazon.search_product(name, limit=5)
+
+        except Exception as ex:
+            logger.error(f"Error searching for product {name}: {ex}")
+            return ex
+
+    with ThreadPoolExecutor(
+        max_workers=min(SEARCH_PARALLELISM, len(names))
+    ) as executor:
+        outcomes = list(executor.map(search, names))
+
+    seen: set[str] = set()
+    results: dict[str, list[dict] | str] = {}
+    for name, outcome in zip(names, outcomes):
+        if isinstance(outcome, Exception):
+            results[name] = f"Error: {outcome}"
+            continue
+
+        results[name] = [
+            item.to_dict() for item in outcome if item.id not in seen
+        ]
+        seen.update(item.id for item in outcome)
+
+    results_json = json.dumps({"results": results})
+    logger.debug(f"Search results: {results_json}")
+    return results_json
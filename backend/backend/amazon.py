@@ -1,10 +1,25 @@
 from __future__ import annotations
+from collections import OrderedDict
 from dataclasses import dataclass
+import hashlib
+import json
 import os
-import requests
+import threading
+import time
+from typing import TYPE_CHECKING
 
 from loguru import logger
 
+if TYPE_CHECKING:
+    import requests
+
+CANOPY_API_URL = os.getenv("CANOPY_API_URL", "https://graphql.canopyapi.co/")
+CACHE_TTL_SECONDS = float(os.getenv("CANOPY_CACHE_TTL_SECONDS", "86400"))
+CACHE_MAX_ENTRIES = int(os.getenv("CANOPY_CACHE_MAX_ENTRIES", "1024"))
+CACHE_DIR = os.getenv("CANOPY_CACHE_DIR")
+RATE_LIMIT_PER_SECOND = float(os.getenv("CANOPY_RATE_LIMIT_PER_SECOND", "2"))
+RATE_LIMIT_BURST = int(os.getenv("CANOPY_RATE_LIMIT_BURST", "5"))
+
 
 @dataclass(frozen=True, kw_only=True)
 class Item:
@@ -26,6 +41,10 @@ class Item:
             rating=item["rating"],
         )
 
+    @staticmethod
+    def from_dict(item: dict) -> Item:
+        return Item(**item)
+
     def to_dict(self) -> dict:
         return {
             "id": self.id,
@@ -37,9 +56,214 @@ class Item:
         }
 
 
+class TokenBucket:
+    """Limits the rate of calls, allowing short bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class SearchCache:
+    """Size-bounded LRU cache of search results with a time to live.
+
+    When `directory` is set, entries are also written there as JSON files so
+    they survive restarts and are shared between worker processes.
+    """
+
+    def __init__(
+        self,
+        ttl: float = CACHE_TTL_SECONDS,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        directory: str | None = CACHE_DIR,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries: OrderedDict[str, tuple[float, list[dict]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> list[dict] | None:
+        """Returns the cached results for the key, if fresh."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.time() - entry[0] < self.ttl:
+                    self._entries.move_to_end(key)
+                    _counters["hits"] += 1
+                    return entry[1]
+
+                del self._entries[key]
+
+        entry = self._read(key)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            self._put_memory(key, entry)
+            _counters["disk_hits"] += 1
+            return entry[1]
+
+        _counters["misses"] += 1
+        return None
+
+    def put(self, key: str, results: list[dict]) -> None:
+        """Caches the results for the key."""
+        entry = (time.time(), results)
+        self._put_memory(key, entry)
+        self._write(key, entry)
+
+    def _put_memory(self, key: str, entry: tuple[float, list[dict]]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                _counters["evictions"] += 1
+
+    def _path(self, key: str) -> str | None:
+        if self.directory is None:
+            return None
+
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _read(self, key: str) -> tuple[float, list[dict]] | None:
+        path = self._path(key)
+        if path is None or not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+            return data["cached_at"], data["results"]
+
+        except (OSError, ValueError, KeyError) as ex:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {ex}")
+            return None
+
+    def _write(self, key: str, entry: tuple[float, list[dict]]) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"cached_at": entry[0], "results": entry[1]}, file)
+        os.replace(temp_path, path)
+
+
+_counters = {
+    "hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "evictions": 0,
+    "requests": 0,
+}
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+_rate_limiter = TokenBucket(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+_cache = SearchCache()
+
+_in_flight: dict[str, threading.Event] = {}
+_in_flight_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Returns the pooled HTTP session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            for prefix in ("https://", "http://"):
+                _session.mount(
+                    prefix, HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                )
+        return _session
+
+
+def cache_stats() -> dict[str, int]:
+    """Returns the hit, miss and request counters of the product search."""
+    return dict(_counters)
+
+
+def _cache_key(keywords: str, limit: int) -> str:
+    return f"{' '.join(keywords.lower().split())}|{limit}"
+
+
 def search_product(keywords: str, limit: int) -> list[Item]:
+    """Searches Amazon for products, serving repeated searches from the cache.
+
+    Concurrent searches for the same keywords share a single request.
+    """
+    key = _cache_key(keywords, limit)
+
+    while True:
+        results = _cache.get(key)
+        if results is not None:
+            return [Item.from_dict(item) for item in results]
+
+        with _in_flight_lock:
+            event = _in_flight.get(key)
+            if event is None:
+                event = _in_flight[key] = threading.Event()
+                leader = True
+            else:
+                leader = False
+                _counters["coalesced"] += 1
+
+        if not leader:
+            # Wait for the leading request, then retry from the cache. If it
+            # failed, the next iteration takes over as the leader.
+            event.wait()
+            continue
+
+        try:
+            items = _fetch(keywords, limit)
+            _cache.put(key, [item.to_dict() for item in items])
+            return items
+
+        finally:
+            with _in_flight_lock:
+                del _in_flight[key]
+            event.set()
+
+
+def _fetch(keywords: str, limit: int) -> list[Item]:
+    """Queries the Canopy API for products matching the keywords."""
     # Define the URL of the GraphQL endpoint
-    url = "https://graphql.canopyapi.co/"
+    url = CANOPY_API_URL
 
     # Define the GraphQL query
     query = """
@@ -77,13 +301,20 @@ def search_product(keywords: str, limit: int) -> list[Item]:
     logger.debug(f"Payload: {payload}")
 
     # Send the POST request to the GraphQL endpoint
-    response = requests.post(url, json=payload, headers=headers)
+    _rate_limiter.acquire()
+    _counters["requests"] += 1
+    response = _get_session().post(
+        url, json=payload, headers=headers, timeout=30
+    )
 
     if response.status_code != 200:
         logger.error(
             f"Query failed to run with a {response.status_code} status code."
         )
         logger.error(f"Response: {response.text}")
+        raise RuntimeError(
+            f"Product search failed with status {response.status_code}."
+        )
 
     data = response.json()
     logger.debug(f"Response data: {data}")
@@ -0,0 +1,177 @@
+from __future__ import annotations
+import os
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from backend.ledger import Ledger
+
+
+BOWL_VOLUME_CUBIC_FEET = 2.0
+STORAGE_VOLUME_CUBIC_FEET = 10.0
+# Item volumes are not tracked, so capacity is estimated from the volume of
+# a typical unit, such as a fun-size candy bar in its wrapper.
+UNIT_VOLUME_CUBIC_FEET = float(os.getenv("UNIT_VOLUME_CUBIC_FEET", "0.005"))
+VELOCITY_WINDOW_DAYS = float(os.getenv("VELOCITY_WINDOW_DAYS", "14"))
+TARGET_COVER_DAYS = float(os.getenv("TARGET_COVER_DAYS", "14"))
+
+SECONDS_PER_DAY = 24 * 3600
+
+DEMAND_COLUMNS = [
+    "item_id",
+    "item_name",
+    "quantity",
+    "units_sold",
+    "velocity_per_day",
+    "days_of_cover",
+    "unit_cost_usd",
+    "sell_price_usd",
+    "margin_usd",
+    "reorder_quantity",
+]
+
+
+def capacity_units(unit_volume: float = UNIT_VOLUME_CUBIC_FEET) -> int:
+    """Returns how many units the bowl and storage hold together."""
+    volume = BOWL_VOLUME_CUBIC_FEET + STORAGE_VOLUME_CUBIC_FEET
+    return int(volume / unit_volume)
+
+
+def demand(
+    inventory: pd.DataFrame,
+    ledger: Ledger,
+    window_days: float = VELOCITY_WINDOW_DAYS,
+    target_cover_days: float = TARGET_COVER_DAYS,
+    capacity: int | None = None,
+    now: float | None = None,
+) -> pd.DataFrame:
+    """Computes how fast each item sells and how much of it to reorder.
+
+    Covers every item in stock and every item that sold within the window,
+    including ones that have since sold out. For each item:
+
+        - velocity_per_day: Units sold per day over the window, or over the
+          time since the item was first bought if that is shorter.
+        - days_of_cover: Days until the stock runs out at that velocity.
+        - margin_usd: Sell price less the average unit cost paid for it.
+        - reorder_quantity: Units to buy to hold `target_cover_days` of
+          stock. Items known to sell at a loss are not reordered, and when
+          the suggestions do not fit in the space left in the bowl and
+          storage, it goes to the most profitable items first.
+
+    Returns:
+        The items in `DEMAND_COLUMNS`, most profitable to restock first.
+    """
+    import numpy as np
+    import pandas as pd
+
+    now = time.time() if now is None else now
+    capacity = capacity_units() if capacity is None else capacity
+
+    sales = ledger.sales(since=now - window_days * SECONDS_PER_DAY)
+    sold = (
+        pd.DataFrame(
+            {
+                "item_id": [sale.item_id for sale in sales],
+                "units_sold": [sale.quantity for sale in sales],
+                "revenue_usd": [sale.amount_usd for sale in sales],
+            }
+        )
+        .groupby("item_id")
+        .sum()
+    )
+    history = pd.DataFrame(
+        [
+            (
+                item.item_id,
+                item.item_name,
+                item.units_purchased,
+                item.purchase_cost_usd,
+                item.first_purchased,
+            )
+            for item in ledger.items()
+        ],
+        columns=[
+            "item_id",
+            "ledger_name",
+            "units_purchased",
+            "purchase_cost_usd",
+            "first_purchased",
+        ],
+    ).set_index("item_id")
+    stock = inventory.set_index("item_id")[
+        ["item_name", "quantity", "sell_price_usd"]
+    ]
+
+    items = stock.index.union(sold.index)
+    table = (
+        pd.DataFrame(index=items)
+        .join(stock)
+        .join(sold)
+        .join(history)
+        .rename_axis("item_id")
+    )
+
+    table["item_name"] = table["item_name"].fillna(table["ledger_name"])
+    quantity = table["quantity"].fillna(0).to_numpy(dtype=float)
+    units_sold = table["units_sold"].fillna(0).to_numpy(dtype=float)
+
+    # Sold-out items are no longer listed, so fall back to what they sold
+    # for.
+    sell_price = (
+        table["sell_price_usd"]
+        .fillna(table["revenue_usd"] / table["units_sold"])
+        .to_numpy(dtype=float)
+    )
+    purchased = table["units_purchased"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit_cost = np.where(
+            purchased > 0,
+            table["purchase_cost_usd"].to_numpy(dtype=float) / purchased,
+            np.nan,
+        )
+
+    first_purchased = table["first_purchased"].to_numpy(dtype=float)
+    exposure_days = np.where(
+        first_purchased > 0,
+        (now - first_purchased) / SECONDS_PER_DAY,
+        window_days,
+    ).clip(1.0, window_days)
+    velocity = units_sold / exposure_days
+    days_of_cover = np.divide(
+        quantity,
+        velocity,
+        out=np.full(len(velocity), np.inf),
+        where=velocity > 0,
+    )
+
+    margin = sell_price - unit_cost
+    wanted = np.ceil(velocity * target_cover_days - quantity).clip(0)
+    wanted[margin <= 0] = 0
+
+    # Give the free space to the items expected to make the most profit per
+    # day, in order, until it runs out.
+    priority = np.nan_to_num(velocity * margin, nan=0.0)
+    order = np.lexsort((-velocity, -priority))
+    free = max(capacity - quantity.sum(), 0)
+    allotted = np.clip(
+        free - (np.cumsum(wanted[order]) - wanted[order]), 0, wanted[order]
+    )
+
+    return pd.DataFrame(
+        {
+            "item_id": table.index.to_numpy()[order],
+            "item_name": table["item_name"].to_numpy()[order],
+            "quantity": quantity[order].astype(int),
+            "units_sold": units_sold[order].astype(int),
+            "velocity_per_day": velocity[order],
+            "days_of_cover": days_of_cover[order],
+            "unit_cost_usd": unit_cost[order],
+            "sell_price_usd": sell_price[order],
+            "margin_usd": margin[order],
+            "reorder_quantity": allotted.astype(int),
+        },
+        columns=DEMAND_COLUMNS,
+    )
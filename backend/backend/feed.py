@@ -0,0 +1,95 @@
+import json
+import math
+import os
+import threading
+from typing import Callable
+
+from loguru import logger
+
+# How long an event stream waits for a change before checking for ones made
+# by other processes and sending a keep-alive comment.
+FEED_POLL_SECONDS = float(os.getenv("FEED_POLL_SECONDS", "5"))
+# How many changes a stream buffers before its subscriber is considered to
+# have fallen behind and is sent a fresh snapshot instead.
+FEED_BUFFER_SIZE = int(os.getenv("FEED_BUFFER_SIZE", "1000"))
+
+Change = dict
+Subscriber = Callable[[Change], None]
+
+
+def jsonable(row: dict) -> dict:
+    """Returns a copy of a row with NaN, as pandas reads blanks, as None."""
+    return {
+        key: None if isinstance(value, float) and math.isnan(value) else value
+        for key, value in row.items()
+    }
+
+
+def diff(before: dict[str, dict], after: dict[str, dict]) -> list[Change]:
+    """Returns the changes that turn rows keyed by ID into other rows."""
+    changes: list[Change] = [
+        {"op": "delete", "item_id": item_id}
+        for item_id in before
+        if item_id not in after
+    ]
+    changes.extend(
+        {"op": "put", "item": jsonable(row)}
+        for item_id, row in after.items()
+        if jsonable(before.get(item_id) or {}) != jsonable(row)
+    )
+    return changes
+
+
+def server_sent_event(event: str, data: object) -> str:
+    """Formats a server-sent event carrying JSON data."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ChangeFeed:
+    """In-process publish/subscribe channel for changes to a bowl's inventory.
+
+    Changes are dicts with an "op" of:
+
+        - put: `item` was added or changed and is given in full.
+        - delete: The item with `item_id` was removed.
+        - reset: The inventory was replaced by `items`.
+
+    Subscribers are called on the publishing thread, so they should only
+    hand the change over, such as to a queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: list[Subscriber] = []
+
+    def __bool__(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, subscriber: Subscriber) -> Callable[[], None]:
+        """Calls the subscriber with every change until unsubscribed.
+
+        Returns:
+            A function that unsubscribes it.
+        """
+        with self._lock:
+            self._subscribers = [*self._subscribers, subscriber]
+
+        def unsubscribe() -> None:
+            with self._lock:
+                self._subscribers = [
+                    other
+                    for other in self._subscribers
+                    if other is not subscriber
+                ]
+
+        return unsubscribe
+
+    def publish(self, changes: list[Change]) -> None:
+        """Hands changes to every subscriber, in order."""
+        for subscriber in self._subscribers:
+            for change in changes:
+                try:
+                    subscriber(change)
+
+                except Exception as ex:
+                    logger.error(f"Error publishing an inventory change: {ex}")
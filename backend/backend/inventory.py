@@ -1,8 +1,461 @@
+from __future__ import annotations
+import atexit
+from contextlib import AbstractContextManager, contextmanager
+import math
+import numbers
 import os
+import threading
+from typing import TYPE_CHECKING, Callable, Iterator, TypeVar
 import uuid
 
 from loguru import logger
-import pandas as pd
+
+from backend import metrics
+from backend.feed import Change, ChangeFeed, Subscriber, diff, jsonable
+from backend.locking import Version, atomic_write, file_lock, file_version
+from backend.search import TextIndex
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+COLUMNS = [
+    "item_id",
+    "item_name",
+    "link",
+    "quantity",
+    "total_purchase_price_usd",
+    "sell_price_usd",
+    "description",
+]
+
+FLUSH_INTERVAL_SECONDS = float(os.getenv("INVENTORY_FLUSH_INTERVAL", "1.0"))
+
+T = TypeVar("T")
+
+
+def check_quantity(quantity: int) -> None:
+    """Checks that a quantity of stock is a positive whole number.
+
+    Raises:
+        TypeError: If the quantity is not a number.
+        ValueError: If the quantity is not positive and whole.
+    """
+    if not isinstance(quantity, numbers.Real) or isinstance(quantity, bool):
+        raise TypeError(f"Quantity must be a number, not {quantity!r}")
+    if (
+        not math.isfinite(quantity)
+        or quantity <= 0
+        or quantity != int(quantity)
+    ):
+        raise ValueError(
+            f"Quantity must be a positive whole number: {quantity!r}"
+        )
+
+
+def check_price(name: str, price_usd: float) -> None:
+    """Checks that a price is a finite, non-negative number.
+
+    The ledger records prices under the same rules, so nothing enters the
+    inventory that its events would reject.
+
+    Raises:
+        TypeError: If the price is not a number.
+        ValueError: If the price is negative or not finite.
+    """
+    if not isinstance(price_usd, numbers.Real) or isinstance(price_usd, bool):
+        raise TypeError(f"{name} must be a number, not {price_usd!r}")
+    if not math.isfinite(price_usd) or price_usd < 0:
+        raise ValueError(
+            f"{name} must be finite and non-negative: {price_usd!r}"
+        )
+
+
+def _searchable(row: dict) -> str:
+    """Returns the text of a row that searches match against."""
+    description = row["description"]
+    if not isinstance(description, str):  # Empty descriptions read as NaN.
+        description = ""
+    return f"{row['item_name']} {description}"
+
+
+class InventoryStore:
+    """Resident, indexed copy of an inventory CSV file.
+
+    Rows are keyed by item_id, with secondary indexes on item_name and link,
+    and a full-text index on item_name and description that is built on the
+    first search. Mutations are applied in memory and written back to the
+    CSV file in coalesced batches, either once the flush interval elapses or
+    when `commit` is called.
+
+    The file may be shared by several worker processes. Reads hold a shared
+    lock on it and writes an exclusive one, and it is only ever replaced
+    atomically. Writes are optimistic: mutations are kept until they are
+    flushed, and if another process wrote the file in the meantime, the
+    store reloads it and replays them on top instead of overwriting it.
+
+    Changes to the rows are published to `feed` once each mutation
+    completes, and so are changes picked up from other processes.
+    """
+
+    def __init__(
+        self, csv_filepath: str, flush_interval: float = FLUSH_INTERVAL_SECONDS
+    ):
+        self.csv_filepath = csv_filepath
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._rows: dict[str, dict] = {}
+        self._by_name: dict[str, str] = {}
+        self._by_link: dict[str, str] = {}
+        self._text: TextIndex[str] | None = None
+        self._version: Version = None
+        self._pending: list[Callable[[], object]] = []
+        self._depth = 0
+        self._dirty = False
+        self._flushes = 0
+        self._timer: threading.Timer | None = None
+        self.feed = ChangeFeed()
+        self._changes: list[Change] = []
+        self._replaying = False
+        self._load()
+
+    def _read(self) -> None:
+        """Reads the CSV file into memory and rebuilds the indexes.
+
+        The caller must hold a lock on the file.
+        """
+        import pandas as pd
+
+        with metrics.span(
+            "storage.inventory.load",
+            metrics.STORAGE_LATENCY,
+            operation="inventory_load",
+        ):
+            inventory = pd.read_csv(self.csv_filepath, dtype={"item_id": str})
+            version = file_version(self.csv_filepath)
+        with self._lock:
+            self._rows.clear()
+            self._by_name.clear()
+            self._by_link.clear()
+            self._text = None
+            for row in inventory.to_dict("records"):
+                self._index(row)
+            self._version = version
+
+    def _load(self) -> None:
+        with file_lock(self.csv_filepath):
+            self._read()
+
+    def _replay(self) -> None:
+        """Re-applies the pending mutations on top of freshly read rows."""
+        pending, self._pending = self._pending, []
+        self._depth += 1
+        self._replaying = True
+        try:
+            for operation in pending:
+                try:
+                    operation()
+
+                except ValueError as ex:
+                    logger.warning(
+                        f"Dropped an inventory change that conflicts with "
+                        f"another process: {ex}"
+                    )
+                    continue
+
+                self._pending.append(operation)
+
+        finally:
+            self._depth -= 1
+            self._replaying = False
+
+    def _refresh(self) -> None:
+        """Picks up changes that other processes wrote since the last read."""
+        if self._depth or file_version(self.csv_filepath) == self._version:
+            return
+
+        before = self._watched_rows()
+        self._load()
+        self._replay()
+        self._publish_diff(before)
+
+    def _watched_rows(self) -> dict[str, dict] | None:
+        """Copies the rows to diff against after a reload, if anyone listens."""
+        if not self.feed:
+            return None
+
+        return {item_id: dict(row) for item_id, row in self._rows.items()}
+
+    def _publish_diff(self, before: dict[str, dict] | None) -> None:
+        if before is not None:
+            self.feed.publish(diff(before, self._rows))
+
+    def _record(self, change: Change) -> None:
+        """Queues a change to publish once the current mutation completes.
+
+        Replays are left out, since their changes were published when they
+        were first applied.
+        """
+        if self.feed and not self._replaying:
+            self._changes.append(change)
+
+    def _index(self, row: dict) -> None:
+        item_id = row["item_id"]
+        self._rows[item_id] = row
+        self._by_name.setdefault(row["item_name"], item_id)
+        self._by_link.setdefault(row["link"], item_id)
+        if self._text is not None:
+            self._text.add(item_id, _searchable(row))
+
+    def _unindex(self, item_id: str) -> dict:
+        row = self._rows.pop(item_id)
+        self._unindex_keys(item_id, row)
+        if self._text is not None:
+            self._text.remove(item_id)
+        return row
+
+    def _unindex_keys(self, item_id: str, row: dict) -> None:
+        if self._by_name.get(row["item_name"]) == item_id:
+            del self._by_name[row["item_name"]]
+        if self._by_link.get(row["link"]) == item_id:
+            del self._by_link[row["link"]]
+
+    def get(self, item_id: str) -> dict | None:
+        """Returns a copy of the row with the given ID, if any."""
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(item_id)
+            return dict(row) if row is not None else None
+
+    def find(self, item_name: str, link: str) -> str | None:
+        """Returns the ID of the item matching either the name or the link."""
+        with self._lock:
+            self._refresh()
+            return self._by_name.get(item_name) or self._by_link.get(link)
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[dict, float]]:
+        """Returns copies of the rows most relevant to a query, with scores.
+
+        Rows are ranked by BM25 over their item_name and description.
+        """
+        with self._lock:
+            self._refresh()
+            if self._text is None:
+                self._text = TextIndex()
+                for item_id, row in self._rows.items():
+                    self._text.add(item_id, _searchable(row))
+
+            return [
+                (dict(self._rows[item_id]), score)
+                for item_id, score in self._text.search(query, limit)
+            ]
+
+    def refresh(self) -> None:
+        """Picks up changes that other processes wrote, publishing them."""
+        with self._lock:
+            self._refresh()
+
+    def rows(self) -> list[dict]:
+        """Returns a copy of every row in insertion order."""
+        with self._lock:
+            self._refresh()
+            return [dict(row) for row in self._rows.values()]
+
+    def mutate(self, operation: Callable[[], T]) -> T:
+        """Applies a change to the rows and schedules it to be written.
+
+        The operation is run again on newer rows if another process writes
+        the file before this change is flushed, so it must look up whatever
+        it depends on from the store rather than capture it beforehand.
+        Operations that fail with a ValueError on replay are dropped.
+        """
+        with self._lock:
+            self._refresh()
+            self._depth += 1
+            try:
+                result = operation()
+
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._changes:
+                    changes, self._changes = self._changes, []
+                    self.feed.publish(changes)
+
+            if self._depth == 0:
+                self._pending.append(operation)
+                self._mark_dirty()
+            return result
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Undoes the mutations made in the block if it raises.
+
+        The store stays locked until the block completes, so no other
+        thread reads its changes or flushes them halfway. The rows are
+        rolled back by reloading the file and replaying the changes that
+        were pending before the block, which is only possible while none of
+        the block's changes have been written.
+        """
+        with self._lock:
+            pending = list(self._pending)
+            flushes = self._flushes
+            try:
+                yield
+
+            except BaseException:
+                if self._flushes != flushes:
+                    logger.error(
+                        f"Cannot roll back changes already flushed to "
+                        f"{self.csv_filepath}."
+                    )
+                    raise
+
+                before = self._watched_rows()
+                self._pending = pending
+                self._load()
+                self._replay()
+                self._dirty = bool(self._pending)
+                self._publish_diff(before)
+                raise
+
+    def insert(self, row: dict) -> None:
+        """Adds a new row to the store."""
+
+        def operation() -> None:
+            item_id = row["item_id"]
+            if item_id in self._rows:
+                raise ValueError(f"Item with ID {item_id} already exists.")
+
+            self._index({column: row.get(column) for column in COLUMNS})
+            self._record({"op": "put", "item": jsonable(self._rows[item_id])})
+
+        self.mutate(operation)
+
+    def update(self, item_id: str, **fields) -> None:
+        """Updates fields of an existing row."""
+
+        def operation() -> None:
+            if item_id not in self._rows:
+                raise ValueError(f"Item with ID {item_id} does not exist.")
+
+            # Re-indexing in place keeps the row's position, so pages of
+            # the inventory do not shift as items are updated.
+            row = self._rows[item_id]
+            self._unindex_keys(item_id, row)
+            row.update(fields)
+            self._index(row)
+            self._record({"op": "put", "item": jsonable(row)})
+
+        self.mutate(operation)
+
+    def delete(self, item_id: str) -> None:
+        """Removes a row from the store."""
+
+        def operation() -> None:
+            if item_id not in self._rows:
+                raise ValueError(f"Item with ID {item_id} does not exist.")
+
+            self._unindex(item_id)
+            self._record({"op": "delete", "item_id": item_id})
+
+        self.mutate(operation)
+
+    def replace_all(self, rows: list[dict]) -> None:
+        """Replaces the contents of the store."""
+
+        def operation() -> None:
+            self._rows.clear()
+            self._by_name.clear()
+            self._by_link.clear()
+            self._text = None
+            for row in rows:
+                self._index({column: row.get(column) for column in COLUMNS})
+            self._record(
+                {
+                    "op": "reset",
+                    "items": [jsonable(row) for row in self._rows.values()],
+                }
+            )
+
+        self.mutate(operation)
+
+    def _mark_dirty(self) -> None:
+        """Schedules a write-behind flush if one is not already pending."""
+        self._dirty = True
+        if self.flush_interval <= 0:
+            self.flush()
+            return
+
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Writes pending changes to the CSV file."""
+        import pandas as pd
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if not self._dirty:
+                return
+
+            with (
+                metrics.span(
+                    "storage.inventory.flush",
+                    metrics.STORAGE_LATENCY,
+                    operation="inventory_flush",
+                ),
+                file_lock(self.csv_filepath, exclusive=True),
+            ):
+                if file_version(self.csv_filepath) != self._version:
+                    logger.info(
+                        f"{self.csv_filepath} changed in another process; "
+                        "replaying pending changes on top."
+                    )
+                    before = self._watched_rows()
+                    self._read()
+                    self._replay()
+                    self._publish_diff(before)
+
+                with atomic_write(self.csv_filepath) as file:
+                    pd.DataFrame(
+                        list(self._rows.values()), columns=COLUMNS
+                    ).to_csv(file, index=False)
+                self._version = file_version(self.csv_filepath)
+
+            self._pending.clear()
+            self._dirty = False
+            self._flushes += 1
+            logger.debug(
+                f"Flushed {len(self._rows)} items to {self.csv_filepath}."
+            )
+
+
+_stores: dict[str, InventoryStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(csv_filepath: str) -> InventoryStore:
+    """Returns the process-wide store for the given CSV file."""
+    key = os.path.abspath(csv_filepath)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = InventoryStore(csv_filepath)
+        return _stores[key]
+
+
+@atexit.register
+def flush_all() -> None:
+    """Writes pending changes for every open store."""
+    with _stores_lock:
+        stores = list(_stores.values())
+
+    for store in stores:
+        store.flush()
 
 
 class InventoryManagerCSV:
@@ -10,57 +463,82 @@ class InventoryManagerCSV:
         """Initializes the InventoryManager with a CSV file."""
         self.csv_filepath = csv_file
         self._initialize_csv()
+        self._store = get_store(csv_file)
 
     def _initialize_csv(self):
         """Ensures the CSV file exists with the correct header."""
+        import pandas as pd
+
         if not os.path.exists(self.csv_filepath):
             os.makedirs(os.path.dirname(self.csv_filepath), exist_ok=True)
-            pd.DataFrame(
-                columns=[
-                    "item_id",
-                    "item_name",
-                    "link",
-                    "quantity",
-                    "total_purchase_price_usd",
-                    "sell_price_usd",
-                    "description",
-                ]
-            ).to_csv(self.csv_filepath, index=False)
+            with file_lock(self.csv_filepath, exclusive=True):
+                if not os.path.exists(self.csv_filepath):
+                    with atomic_write(self.csv_filepath) as file:
+                        pd.DataFrame(columns=COLUMNS).to_csv(file, index=False)
 
     def _get_all_items(self) -> pd.DataFrame:
-        """Returns the inventory from the CSV file."""
-        return pd.read_csv(
-            self.csv_filepath, dtype={"id": str}
-        )  # Ensure UUIDs are read as strings
+        """Returns the inventory from the resident store."""
+        import pandas as pd
+
+        return pd.DataFrame(self._store.rows(), columns=COLUMNS)
 
     def _set_all_items(self, inventory: pd.DataFrame) -> None:
-        """Saves the current inventory to the CSV file."""
-        inventory.to_csv(self.csv_filepath, index=False)
+        """Replaces the inventory in the resident store."""
+        self._store.replace_all(inventory.to_dict("records"))
 
     def get_inventory(self) -> pd.DataFrame:
         """Returns the inventory as a DataFrame."""
         return self._get_all_items()
 
+    def commit(self) -> None:
+        """Writes any pending changes to the CSV file immediately."""
+        self._store.flush()
+
+    def transaction(self) -> AbstractContextManager[None]:
+        """Rolls back the inventory changes of the block if it raises."""
+        return self._store.transaction()
+
+    def subscribe(self, subscriber: Subscriber) -> Callable[[], None]:
+        """Calls the subscriber with every change to the inventory.
+
+        Returns:
+            A function that unsubscribes it.
+        """
+        return self._store.feed.subscribe(subscriber)
+
+    def refresh(self) -> None:
+        """Picks up changes written by other processes, publishing them."""
+        self._store.refresh()
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Returns the items most relevant to a query, best match first.
+
+        Each item has its relevance under "score".
+        """
+        return [
+            {**row, "score": score}
+            for row, score in self._store.search(query, limit)
+        ]
+
     def _prune_inventory(self) -> None:
         """Removes items from the inventory that have a quantity of 0."""
-        inventory = self._get_all_items()
-        inventory = inventory[inventory["quantity"] > 0]
-        self._set_all_items(inventory)
+
+        def operation() -> None:
+            for row in self._store.rows():
+                if row["quantity"] <= 0:
+                    self._store.delete(row["item_id"])
+
+        self._store.mutate(operation)
 
     def _update_quantity(self, item_id: str, new_quantity: int) -> None:
         """Updates the quantity of an item in the inventory."""
         if new_quantity < 0:
             raise ValueError("Quantity cannot be negative.")
 
-        inventory = self._get_all_items()
-        if item_id not in inventory["item_id"].values:
-            raise ValueError(f"Item with ID {item_id} does not exist.")
-
-        inventory.loc[inventory["item_id"] == item_id, "quantity"] = (
-            new_quantity
-        )
-        self._set_all_items(inventory)
-        self._prune_inventory()
+        if new_quantity == 0:
+            self._store.delete(item_id)
+        else:
+            self._store.update(item_id, quantity=new_quantity)
 
     def _add_item(
         self,
@@ -68,15 +546,11 @@ class InventoryManagerCSV:
         quantity: int,
     ) -> None:
         """Adds stock for an item, increasing its quantity in the inventory."""
-        inventory = self._get_all_items()
-        if item_id not in inventory["item_id"].values:
+        item = self._store.get(item_id)
+        if item is None:
             raise ValueError(f"Item with ID {item_id} does not exist.")
 
-        current_quantity = inventory.loc[
-            inventory["item_id"] == item_id, "quantity"
-        ].values[0]
-        new_quantity = current_quantity + quantity
-        self._update_quantity(item_id, new_quantity)
+        self._update_quantity(item_id, item["quantity"] + quantity)
 
     def stock_item(
         self,
@@ -86,7 +560,7 @@ class InventoryManagerCSV:
         total_purchase_price_usd: float,
         sell_price_usd: float,
         description: str,
-    ) -> None:
+    ) -> str:
         """Adds new items to the inventory.
 
         Increases the quantity of a given item if it already exists in the inventory, or adds a new entry if it does not.
@@ -98,38 +572,125 @@ class InventoryManagerCSV:
             total_purchase_price_usd: The price of one of the item in USD (note that one item can have multiple units).
             sell_price_usd: The price of a single unit of the item in USD.
             description: A description of the item.
+
+        Returns:
+            The ID of the item.
+
+        Raises:
+            TypeError: If the quantity or a price is not a number.
+            ValueError: If the quantity is not a positive whole number or a
+                price is negative or not finite.
         """
-        inventory = self._get_all_items()
-        if not inventory[
-            (inventory["item_name"] == item_name) | (inventory["link"] == link)
-        ].empty:
+        new_item_id = str(uuid.uuid4())
+        return self._store.mutate(
+            lambda: self._stock(
+                new_item_id,
+                item_name=item_name,
+                link=link,
+                quantity=quantity,
+                total_purchase_price_usd=total_purchase_price_usd,
+                sell_price_usd=sell_price_usd,
+                description=description,
+            )
+        )
+
+    def stock_items(self, items: list[dict]) -> list[str | Exception]:
+        """Adds many items to the inventory in one store operation.
+
+        The items are written out together in a single flush. An item that
+        cannot be stocked does not prevent the others from being stocked.
+
+        Args:
+            items: The keyword arguments of `stock_item` for each item.
+
+        Returns:
+            For each item, its ID if it was stocked, or the error that
+            prevented it.
+        """
+        new_item_ids = [str(uuid.uuid4()) for _ in items]
+        results: list[str | Exception] = []
+
+        def operation() -> None:
+            results.clear()
+            for item, new_item_id in zip(items, new_item_ids):
+                try:
+                    results.append(self._stock(new_item_id, **item))
+
+                except (TypeError, ValueError) as ex:
+                    results.append(ex)
+
+        self._store.mutate(operation)
+        return list(results)
+
+    def _stock(
+        self,
+        new_item_id: str,
+        item_name: str,
+        link: str,
+        quantity: int,
+        total_purchase_price_usd: float,
+        sell_price_usd: float,
+        description: str,
+    ) -> str:
+        check_quantity(quantity)
+        check_price("Purchase price", total_purchase_price_usd)
+        check_price("Sell price", sell_price_usd)
+
+        # Runs within a store operation, so that if another process stocks
+        # the same item first, the replay adds to its entry instead.
+        item_id = self._store.find(item_name, link)
+        if item_id is not None:
             logger.info(
                 f"Item '{item_name}' already exists in inventory. Updating quantity..."
             )
-            item_id = inventory[
-                (inventory["item_name"] == item_name)
-                | (inventory["link"] == link)
-            ]["item_id"].values[0]
             self._add_item(item_id, quantity)
+            return item_id
 
-        new_row = {
-            "item_id": str(uuid.uuid4()),
-            "item_name": item_name,
-            "link": link,
-            "quantity": 0,
-            "total_purchase_price_usd": total_purchase_price_usd,
-            "sell_price_usd": sell_price_usd,
-            "description": description,
-        }
-
-        inventory = pd.concat(
-            [
-                inventory,
-                pd.DataFrame([new_row]),
-            ],
-            ignore_index=True,
+        self._store.insert(
+            {
+                "item_id": new_item_id,
+                "item_name": item_name,
+                "link": link,
+                "quantity": quantity,
+                "total_purchase_price_usd": total_purchase_price_usd,
+                "sell_price_usd": sell_price_usd,
+                "description": description,
+            }
         )
-        self._set_all_items(inventory)
+        return new_item_id
+
+    def sell_item(self, item_id: str, quantity: int) -> dict:
+        """Takes sold units of an item out of the inventory.
+
+        Items that sell out are removed from the inventory.
+
+        Args:
+            item_id: The ID of the item sold.
+            quantity: The number of units sold.
+
+        Returns:
+            The item as it was before the sale.
+
+        Raises:
+            ValueError: If the item does not exist or has too few units.
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity sold must be positive.")
+
+        def operation() -> dict:
+            item = self._store.get(item_id)
+            if item is None:
+                raise ValueError(f"Item with ID {item_id} does not exist.")
+            if item["quantity"] < quantity:
+                raise ValueError(
+                    f"Only {item['quantity']} units of item {item_id} are in "
+                    "stock."
+                )
+
+            self._update_quantity(item_id, item["quantity"] - quantity)
+            return item
+
+        return self._store.mutate(operation)
 
     def set_price(self, item_id: str, new_price_usd: float) -> None:
         """Sets the price of an item in the inventory.
@@ -138,14 +699,31 @@ class InventoryManagerCSV:
             item_id: The ID of the item to update.
             new_price_usd: The new price of the item in USD.
         """
-        if new_price_usd < 0:
-            raise ValueError("Price cannot be negative.")
+        check_price("Price", new_price_usd)
+        self._store.update(item_id, sell_price_usd=new_price_usd)
 
-        inventory = self._get_all_items()
-        if item_id not in inventory["item_id"].values:
-            raise ValueError(f"Item with ID {item_id} does not exist.")
+    def set_prices(self, prices: list[tuple[str, float]]) -> list[str | None]:
+        """Sets the prices of many items in one store operation.
 
-        inventory.loc[inventory["item_id"] == item_id, "sell_price_usd"] = (
-            new_price_usd
-        )
-        self._set_all_items(inventory)
+        Args:
+            prices: The ID and new price in USD of each item.
+
+        Returns:
+            For each item, None if its price was set, or why it was not.
+        """
+        errors: list[str | None] = []
+
+        def operation() -> None:
+            errors.clear()
+            for item_id, new_price_usd in prices:
+                try:
+                    self.set_price(item_id, new_price_usd)
+
+                except (TypeError, ValueError) as ex:
+                    errors.append(str(ex))
+
+                else:
+                    errors.append(None)
+
+        self._store.mutate(operation)
+        return list(errors)
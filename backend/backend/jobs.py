@@ -0,0 +1,338 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from dataclasses import asdict, dataclass, field
+from functools import cache
+import json
+import os
+import threading
+import time
+from typing import Callable, Literal, TypeAlias
+from urllib.parse import urlsplit
+import uuid
+
+from loguru import logger
+
+from backend.locking import atomic_write, file_lock
+from backend.tenancy import DEFAULT_TENANT, current_tenant
+
+JOB_DIR = os.getenv(
+    "JOB_DIR", os.path.join(os.getenv("CANDYBOWL_DATA_DIR", "data"), "jobs")
+)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RETENTION_SECONDS = float(
+    os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600))
+)
+HEARTBEAT_SECONDS = 5.0
+PROGRESS_INTERVAL_SECONDS = 0.5
+CALLBACK_TIMEOUT_SECONDS = 10.0
+
+# Hosts that finished jobs may be POSTed to, so clients cannot make the
+# server send requests to arbitrary, possibly internal, addresses.
+# Callbacks are refused when unset.
+CALLBACK_HOSTS = frozenset(
+    host.strip().lower()
+    for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",")
+    if host.strip()
+)
+
+JobStatus: TypeAlias = Literal["queued", "running", "succeeded", "failed"]
+
+ACTIVE_STATUSES: tuple[JobStatus, ...] = ("queued", "running")
+
+
+def check_callback_url(url: str) -> None:
+    """Checks that a job callback goes to an allowed host over HTTP(S).
+
+    Raises:
+        ValueError: If the URL is not allowed.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid callback URL: {url}")
+    if parts.hostname not in CALLBACK_HOSTS:
+        raise ValueError(f"Callback host not allowed: {parts.hostname}")
+
+
+@dataclass(kw_only=True)
+class Job:
+    """A unit of background work and everything known about its progress."""
+
+    job_id: str
+    kind: str
+    tenant: str = DEFAULT_TENANT
+    status: JobStatus = "queued"
+    idempotency_key: str = ""
+    callback_url: str = ""
+    created_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+    heartbeat_at: float = 0.0
+    output: str = ""
+    result: dict = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    def stale(self, now: float) -> bool:
+        """Whether the job is active but its worker stopped reporting."""
+        return self.active and now - self.heartbeat_at > 3 * HEARTBEAT_SECONDS
+
+    def to_dict(self, offset: int = 0) -> dict:
+        """Returns the job for clients, with the output from the offset on."""
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "output": self.output[max(offset, 0) :],
+            "offset": len(self.output),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobContext:
+    """Handle through which a running job reports its progress."""
+
+    def __init__(self, queue: JobQueue, job: Job):
+        self._queue = queue
+        self._job = job
+        self._saved_at = 0.0
+
+    @property
+    def job_id(self) -> str:
+        return self._job.job_id
+
+    def write(self, text: str) -> None:
+        """Appends text to the job's output."""
+        self._job.output += text
+        if time.monotonic() - self._saved_at >= PROGRESS_INTERVAL_SECONDS:
+            self.flush()
+
+    def update(self, **result) -> None:
+        """Adds fields to the job's result, such as IDs clients need early."""
+        self._job.result.update(result)
+        self.flush()
+
+    def flush(self) -> None:
+        """Persists the progress so pollers in other processes see it."""
+        self._saved_at = time.monotonic()
+        self._queue._save(self._job)
+
+
+class JobQueue:
+    """Runs jobs on a local pool of worker threads and persists their state.
+
+    Each job is stored as a JSON file, so its status and output can be
+    polled from any worker process and survive a restart. Jobs submitted
+    again with the same idempotency key return the original job instead of
+    running twice, and single-flight kinds run at most one job at a time per
+    tenant across every process sharing the directory. Jobs run in the
+    context they were submitted from, so they work on the same tenant.
+
+    Workers report a heartbeat while their jobs are active. Jobs whose
+    heartbeat stops, such as when their process died, are marked failed.
+    """
+
+    def __init__(self, directory: str = JOB_DIR, workers: int = JOB_WORKERS):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._jobs: dict[str, Job] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="job"
+        )
+        self._heartbeat: threading.Thread | None = None
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(
+        self,
+        kind: str,
+        run: Callable[[JobContext], None],
+        idempotency_key: str = "",
+        callback_url: str = "",
+        single_flight: bool = False,
+    ) -> tuple[Job, bool]:
+        """Queues a job unless an equivalent one already exists.
+
+        Args:
+            kind: What the job does, such as "restock".
+            run: Does the work, reporting progress through the context.
+                Raising marks the job failed.
+            idempotency_key: Identifies retries of the same submission.
+            callback_url: Receives the finished job as a JSON POST. Its host
+                must be listed in JOB_CALLBACK_HOSTS.
+            single_flight: Whether to return the active job of this kind, if
+                there is one, instead of queueing another.
+
+        Returns:
+            The job, and whether it was newly created.
+
+        Raises:
+            ValueError: If the callback URL is not allowed.
+        """
+        if callback_url:
+            check_callback_url(callback_url)
+
+        with (
+            self._lock,
+            file_lock(os.path.join(self.directory, "queue"), exclusive=True),
+        ):
+            now = time.time()
+            tenant = current_tenant()
+            for job in self._scan(now):
+                if job.kind != kind or job.tenant != tenant:
+                    continue
+                if idempotency_key and job.idempotency_key == idempotency_key:
+                    return job, False
+                if single_flight and job.active:
+                    return job, False
+
+            job = Job(
+                job_id=str(uuid.uuid4()),
+                kind=kind,
+                tenant=tenant,
+                idempotency_key=idempotency_key,
+                callback_url=callback_url,
+                created_at=now,
+                heartbeat_at=now,
+            )
+            self._jobs[job.job_id] = job
+            self._save(job)
+
+        logger.info(f"Queued {kind} job {job.job_id}.")
+        self._start_heartbeat()
+        self._executor.submit(
+            contextvars.copy_context().run, self._run, job, run
+        )
+        return job, True
+
+    def get(self, job_id: str) -> Job | None:
+        """Returns a job, reading it from disk if another process runs it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job
+
+        return self._read(job_id)
+
+    def _run(self, job: Job, run: Callable[[JobContext], None]) -> None:
+        context = JobContext(self, job)
+        job.status = "running"
+        job.started_at = time.time()
+        context.flush()
+
+        try:
+            run(context)
+
+        except Exception as ex:
+            logger.error(f"{job.kind} job {job.job_id} failed: {ex}")
+            job.status = "failed"
+            job.error = str(ex)
+
+        else:
+            logger.info(f"{job.kind} job {job.job_id} succeeded.")
+            job.status = "succeeded"
+
+        job.finished_at = time.time()
+        with self._lock:
+            self._save(job)
+            del self._jobs[job.job_id]
+
+        if job.callback_url:
+            self._call_back(job)
+
+    def _call_back(self, job: Job) -> None:
+        import requests
+
+        try:
+            # Checked again, as the job may predate the allowed hosts, and
+            # redirects are not followed so they cannot lead elsewhere.
+            check_callback_url(job.callback_url)
+            requests.post(
+                job.callback_url,
+                json=job.to_dict(),
+                timeout=CALLBACK_TIMEOUT_SECONDS,
+                allow_redirects=False,
+            ).raise_for_status()
+
+        except Exception as ex:
+            logger.error(f"Callback for job {job.job_id} failed: {ex}")
+
+    def _start_heartbeat(self) -> None:
+        with self._lock:
+            if self._heartbeat is not None:
+                return
+
+            def beat() -> None:
+                while True:
+                    time.sleep(HEARTBEAT_SECONDS)
+                    with self._lock:
+                        for job in list(self._jobs.values()):
+                            self._save(job)
+
+            self._heartbeat = threading.Thread(
+                target=beat, name="job-heartbeat", daemon=True
+            )
+            self._heartbeat.start()
+
+    def _scan(self, now: float) -> list[Job]:
+        """Reads every job, failing stale ones and removing expired ones.
+
+        The caller must hold the queue lock.
+        """
+        jobs = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+
+            job = self._read(name.removesuffix(".json"))
+            if job is None:
+                continue
+
+            if job.job_id not in self._jobs and job.stale(now):
+                logger.warning(f"Job {job.job_id} stopped responding.")
+                job.status = "failed"
+                job.error = "The job was interrupted."
+                job.finished_at = now
+                self._save(job)
+
+            if (
+                not job.active
+                and now - (job.finished_at or job.created_at)
+                > JOB_RETENTION_SECONDS
+            ):
+                os.remove(self._path(job.job_id))
+                continue
+
+            jobs.append(job)
+        return jobs
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _read(self, job_id: str) -> Job | None:
+        try:
+            uuid.UUID(job_id)
+            with open(self._path(job_id), "r") as file:
+                return Job(**json.load(file))
+
+        except (ValueError, FileNotFoundError):
+            return None
+
+    def _save(self, job: Job) -> None:
+        with self._lock:
+            if job.active:
+                job.heartbeat_at = time.time()
+            with atomic_write(self._path(job.job_id)) as file:
+                json.dump(asdict(job), file)
+
+
+@cache
+def get_job_queue() -> JobQueue:
+    """Returns the job queue shared by the application."""
+    return JobQueue()
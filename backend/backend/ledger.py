@@ -0,0 +1,363 @@
+from __future__ import annotations
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import json
+import math
+import numbers
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Callable, Literal, TypeAlias, get_args
+
+from loguru import logger
+
+from backend.linelog import LineLog
+
+if TYPE_CHECKING:
+    from backend.storage.base import Notes
+
+
+OPENING_BALANCE_USD = float(os.getenv("CANDYBOWL_OPENING_BALANCE_USD", "100"))
+
+EventType: TypeAlias = Literal[
+    "deposit", "purchase", "sale", "price_change", "search_fee"
+]
+
+
+def parse_balance(text: str) -> float:
+    """Extracts the first dollar amount from the free-text bank file."""
+    match = re.search(r"-?\d[\d,]*(?:\.\d+)?", text)
+    if match is None:
+        raise ValueError(f"No balance found in bank file: {text!r}")
+
+    return float(match.group().replace(",", ""))
+
+
+def _isoformat(timestamp: float) -> str | None:
+    if not timestamp:
+        return None
+
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(
+        timespec="minutes"
+    )
+
+
+@dataclass(frozen=True, kw_only=True)
+class Event:
+    """Something that moved money or changed what the bowl sells.
+
+    `amount_usd` is the change to the balance: positive for deposits and
+    sales, negative for purchases and fees, and zero for price changes.
+    """
+
+    type: EventType
+    timestamp: float
+    amount_usd: float = 0.0
+    item_id: str = ""
+    item_name: str = ""
+    quantity: int = 0
+    unit_price_usd: float | None = None
+
+    def __post_init__(self) -> None:
+        """Checks and normalizes the fields, so no malformed event is stored.
+
+        Raises:
+            TypeError: If a field has the wrong type.
+            ValueError: If a field has an invalid value.
+        """
+        if self.type not in get_args(EventType):
+            raise ValueError(f"Unknown event type: {self.type!r}")
+        if not isinstance(self.item_id, str) or not isinstance(
+            self.item_name, str
+        ):
+            raise TypeError("item_id and item_name must be strings")
+
+        for name in ("timestamp", "amount_usd", "quantity", "unit_price_usd"):
+            value = getattr(self, name)
+            if value is None and name == "unit_price_usd":
+                continue
+
+            if not isinstance(value, numbers.Real) or isinstance(value, bool):
+                raise TypeError(f"{name} must be a number, not {value!r}")
+            if not math.isfinite(value):
+                raise ValueError(f"{name} must be finite, not {value!r}")
+            if name == "quantity" and (
+                value < 0 or not float(value).is_integer()
+            ):
+                raise ValueError(f"{name} must be a whole number: {value!r}")
+            if name == "unit_price_usd" and value < 0:
+                raise ValueError(f"{name} cannot be negative: {value!r}")
+
+            object.__setattr__(
+                self,
+                name,
+                int(float(value)) if name == "quantity" else float(value),
+            )
+
+
+@dataclass(kw_only=True)
+class ItemStats:
+    """Running totals of the purchases, sales and prices of one item."""
+
+    item_id: str
+    item_name: str = ""
+    units_purchased: int = 0
+    purchase_cost_usd: float = 0.0
+    units_sold: int = 0
+    revenue_usd: float = 0.0
+    sell_price_usd: float | None = None
+    price_changes: int = 0
+    first_purchased: float = 0.0
+    last_sold: float = 0.0
+
+    @property
+    def unit_cost_usd(self) -> float | None:
+        """The average purchase cost of a unit."""
+        if not self.units_purchased:
+            return None
+
+        return self.purchase_cost_usd / self.units_purchased
+
+    @property
+    def margin_usd(self) -> float:
+        """Revenue less the average cost of the units sold."""
+        return self.revenue_usd - self.units_sold * (self.unit_cost_usd or 0.0)
+
+    @property
+    def sell_through(self) -> float | None:
+        """The share of the units purchased that have been sold."""
+        if not self.units_purchased:
+            return None
+
+        return self.units_sold / self.units_purchased
+
+    def add(self, event: Event) -> None:
+        """Folds an event about this item into the totals."""
+        self.item_name = event.item_name or self.item_name
+        if event.type == "purchase":
+            self.units_purchased += event.quantity
+            self.purchase_cost_usd -= event.amount_usd
+            self.first_purchased = self.first_purchased or event.timestamp
+        elif event.type == "sale":
+            self.units_sold += event.quantity
+            self.revenue_usd += event.amount_usd
+            self.last_sold = max(self.last_sold, event.timestamp)
+        elif event.type == "price_change":
+            self.sell_price_usd = event.unit_price_usd
+            self.price_changes += 1
+
+    def to_dict(self) -> dict:
+        unit_cost = self.unit_cost_usd
+        sell_through = self.sell_through
+        return {
+            "item_id": self.item_id,
+            "item_name": self.item_name,
+            "units_purchased": self.units_purchased,
+            "units_sold": self.units_sold,
+            "purchase_cost_usd": round(self.purchase_cost_usd, 2),
+            "revenue_usd": round(self.revenue_usd, 2),
+            "unit_cost_usd": round(unit_cost, 4) if unit_cost else unit_cost,
+            "margin_usd": round(self.margin_usd, 2),
+            "sell_through": (
+                round(sell_through, 3) if sell_through else sell_through
+            ),
+            "sell_price_usd": self.sell_price_usd,
+            "price_changes": self.price_changes,
+            "first_purchased": _isoformat(self.first_purchased),
+            "last_sold": _isoformat(self.last_sold),
+        }
+
+
+class Ledger(LineLog):
+    """Append-only log of the bowl's money and pricing events.
+
+    Every event is stored as one JSON line in the underlying backend and is
+    never changed afterwards. The balance, totals and per-item statistics
+    are maintained incrementally as events are read, so answering them does
+    not scan the history.
+
+    The first event of a new ledger is a deposit of the opening balance.
+    """
+
+    def __init__(
+        self,
+        backend: Notes,
+        opening_balance_usd: Callable[[], float] = lambda: OPENING_BALANCE_USD,
+    ):
+        self._balance_usd = 0.0
+        self._totals: dict[EventType, float] = {}
+        self._items: dict[str, ItemStats] = {}
+        self._sales: list[Event] = []
+        self._sale_times: list[float] = []
+        super().__init__(backend)
+
+        if not self._consumed:
+            # Rewrite under the backend's exclusive lock so that processes
+            # starting together deposit the opening balance only once.
+            opening = Event(
+                type="deposit",
+                timestamp=time.time(),
+                amount_usd=opening_balance_usd(),
+            )
+            line = json.dumps(vars(opening))
+            backend.rewrite(lambda lines: lines or [line])
+            self._reload()
+            logger.info(
+                f"Opened ledger with a balance of ${self.balance_usd:.2f}."
+            )
+
+    def _reset(self) -> None:
+        self._balance_usd = 0.0
+        self._totals.clear()
+        self._items.clear()
+        self._sales.clear()
+        self._sale_times.clear()
+
+    def _apply(self, line: str) -> None:
+        try:
+            event = Event(**json.loads(line))
+
+        except (TypeError, ValueError) as ex:
+            # Lines written before events were checked could be malformed.
+            # Skipping them keeps one bad line from disabling the ledger.
+            logger.error(f"Skipping malformed ledger event {line!r}: {ex}")
+            return
+
+        self._balance_usd += event.amount_usd
+        self._totals[event.type] = (
+            self._totals.get(event.type, 0.0) + event.amount_usd
+        )
+        if event.item_id:
+            self._items.setdefault(
+                event.item_id, ItemStats(item_id=event.item_id)
+            ).add(event)
+        if event.type == "sale":
+            # Events are appended in time order, so sales stay sorted by
+            # timestamp and time windows can be found by bisection.
+            self._sales.append(event)
+            self._sale_times.append(event.timestamp)
+
+    def record(
+        self,
+        type: EventType,
+        amount_usd: float = 0.0,
+        item_id: str = "",
+        item_name: str = "",
+        quantity: int = 0,
+        unit_price_usd: float | None = None,
+    ) -> Event:
+        """Appends an event to the ledger."""
+        event = Event(
+            type=type,
+            timestamp=time.time(),
+            amount_usd=amount_usd,
+            item_id=item_id,
+            item_name=item_name,
+            quantity=quantity,
+            unit_price_usd=unit_price_usd,
+        )
+        self.record_all([event])
+        return event
+
+    def record_all(self, events: list[Event]) -> None:
+        """Appends several events to the ledger in one write."""
+        if events:
+            self._append([json.dumps(vars(event)) for event in events])
+
+    def record_purchase(
+        self, item_id: str, item_name: str, quantity: int, cost_usd: float
+    ) -> Event:
+        """Records stock bought for the given total cost."""
+        event = self.purchase(item_id, item_name, quantity, cost_usd)
+        self.record_all([event])
+        return event
+
+    @staticmethod
+    def purchase(
+        item_id: str, item_name: str, quantity: int, cost_usd: float
+    ) -> Event:
+        """Returns the event of stock bought for the given total cost."""
+        return Event(
+            type="purchase",
+            timestamp=time.time(),
+            amount_usd=-cost_usd,
+            item_id=item_id,
+            item_name=item_name,
+            quantity=quantity,
+            unit_price_usd=cost_usd / quantity if quantity else None,
+        )
+
+    def record_sale(
+        self, item_id: str, item_name: str, quantity: int, unit_price_usd: float
+    ) -> Event:
+        """Records units sold at the given price each."""
+        return self.record(
+            "sale",
+            amount_usd=quantity * unit_price_usd,
+            item_id=item_id,
+            item_name=item_name,
+            quantity=quantity,
+            unit_price_usd=unit_price_usd,
+        )
+
+    def record_price_change(self, item_id: str, new_price_usd: float) -> Event:
+        """Records a new sell price for an item."""
+        event = self.price_change(item_id, new_price_usd)
+        self.record_all([event])
+        return event
+
+    @staticmethod
+    def price_change(item_id: str, new_price_usd: float) -> Event:
+        """Returns the event of a new sell price for an item."""
+        return Event(
+            type="price_change",
+            timestamp=time.time(),
+            item_id=item_id,
+            unit_price_usd=new_price_usd,
+        )
+
+    def record_search_fee(self, searches: int, fee_usd: float) -> Event:
+        """Records the fees paid for marketplace searches."""
+        return self.record(
+            "search_fee",
+            amount_usd=-searches * fee_usd,
+            quantity=searches,
+            unit_price_usd=fee_usd,
+        )
+
+    @property
+    def balance_usd(self) -> float:
+        """The current balance of the bank account."""
+        with self._lock:
+            self._refresh()
+            return self._balance_usd
+
+    def totals(self) -> dict[str, float]:
+        """Returns the net amount moved by each type of event, in USD."""
+        with self._lock:
+            self._refresh()
+            return {
+                "deposits_usd": self._totals.get("deposit", 0.0),
+                "revenue_usd": self._totals.get("sale", 0.0),
+                "purchases_usd": abs(self._totals.get("purchase", 0.0)),
+                "search_fees_usd": abs(self._totals.get("search_fee", 0.0)),
+            }
+
+    def item(self, item_id: str) -> ItemStats | None:
+        """Returns the statistics of an item, if it has any events."""
+        with self._lock:
+            self._refresh()
+            return self._items.get(item_id)
+
+    def items(self) -> list[ItemStats]:
+        """Returns the statistics of every item with events."""
+        with self._lock:
+            self._refresh()
+            return list(self._items.values())
+
+    def sales(self, since: float = 0.0) -> list[Event]:
+        """Returns the sales made since the given time, oldest first."""
+        with self._lock:
+            self._refresh()
+            return self._sales[bisect_left(self._sale_times, since) :]
@@ -0,0 +1,76 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from backend.storage.base import Notes
+
+
+class LineLog(ABC):
+    """In-memory view of an append-only log of lines, kept up to date.
+
+    The lines live in a notes backend shared with other processes. Each read
+    first folds in the lines appended since the last one, reading only those,
+    so views stay current without rescanning the log. If the log was
+    rewritten instead of appended to, the view is rebuilt from scratch.
+
+    Subclasses set up their state before calling `__init__`, which reads the
+    existing lines.
+    """
+
+    def __init__(self, backend: Notes):
+        self._backend = backend
+        self._lock = threading.RLock()
+        self._version: object = None
+        self._cursor: object = None
+        self._consumed = 0
+        self._refresh()
+
+    @abstractmethod
+    def _reset(self) -> None:
+        """Clears the view."""
+
+    @abstractmethod
+    def _apply(self, line: str) -> None:
+        """Folds a non-empty line into the view."""
+
+    def _refresh(self) -> None:
+        """Folds in lines written since the last read, including by others."""
+        with self._lock:
+            version = self._backend.version()
+            if version == self._version:
+                return
+
+            update = self._backend.tail(self._cursor)
+            if update is None:
+                self._rebuild([])
+                update = self._backend.tail(None)
+            lines, self._cursor = update or ([], None)
+            self._ingest(lines)
+            self._version = version
+
+    def _rebuild(self, lines: list[str]) -> None:
+        self._reset()
+        self._cursor = None
+        self._consumed = 0
+        self._ingest(lines)
+
+    def _ingest(self, lines: list[str]) -> None:
+        for line in lines:
+            self._consumed += 1
+            if line.strip():
+                self._apply(line)
+
+    def _append(self, lines: list[str]) -> None:
+        """Writes lines to the log and folds them into the view."""
+        with self._lock:
+            self._backend.extend(lines)
+            self._refresh()
+
+    def _reload(self) -> None:
+        """Rebuilds the view after the log was rewritten by this process."""
+        with self._lock:
+            self._rebuild([])
+            self._version = None
+            self._refresh()
@@ -0,0 +1,72 @@
+from contextlib import contextmanager, suppress
+import os
+import tempfile
+from typing import IO, Iterator, TypeAlias
+
+try:
+    import fcntl
+except ImportError:  # Windows has no advisory locks; rely on atomic writes.
+    fcntl = None  # type: ignore[assignment]
+
+Version: TypeAlias = tuple[int, int, int] | None
+
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = False) -> Iterator[None]:
+    """Holds an advisory lock on a file across processes.
+
+    Readers share the lock while a writer holds it exclusively. The lock is
+    taken on a `.lock` file next to the data file rather than on the data
+    file itself, since atomic writes replace the data file with a new one.
+
+    Locks are not reentrant: a thread must not take a lock on a file it
+    already holds one on.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    descriptor = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(descriptor, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+    finally:
+        # Closing the descriptor releases the lock.
+        os.close(descriptor)
+
+
+@contextmanager
+def atomic_write(path: str) -> Iterator[IO[str]]:
+    """Opens a temporary file that replaces the given file once closed.
+
+    Readers see either the old or the new contents, never a partial write. If
+    the block raises, the file is left untouched.
+    """
+    descriptor, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(path)}.",
+        suffix=".tmp",
+        dir=os.path.dirname(path) or ".",
+    )
+    try:
+        with os.fdopen(descriptor, "w", newline="") as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+
+def file_version(path: str) -> Version:
+    """Returns a stamp that changes whenever the file is written, if it exists."""
+    try:
+        stat = os.stat(path)
+
+    except FileNotFoundError:
+        return None
+
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+import functools
+import os
+import time
+from typing import Any, Callable, Iterator, ParamSpec
+
+from loguru import logger
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+P = ParamSpec("P")
+
+# When set, as it is for several ASGI workers, every worker process writes its
+# metrics here and any of them can report the totals. It must be set before
+# prometheus_client is imported.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+ROUTE_LATENCY = Histogram(
+    "candybowl_route_latency_seconds",
+    "Time spent handling HTTP requests.",
+    ["route", "method", "status"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+MODEL_LATENCY = Histogram(
+    "candybowl_model_call_latency_seconds",
+    "Time spent waiting on the model, including automatic tool calls.",
+    ["operation"],
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+MODEL_TOKENS = Counter(
+    "candybowl_model_tokens_total",
+    "Tokens reported in the model's usage metadata.",
+    ["type"],
+)
+TOOL_LATENCY = Histogram(
+    "candybowl_tool_latency_seconds",
+    "Time spent running tools called by the model.",
+    ["tool"],
+)
+TOOL_ERRORS = Counter(
+    "candybowl_tool_errors_total",
+    "Tool calls that returned an error to the model.",
+    ["tool"],
+)
+TOOL_SNAPSHOT_HITS = Counter(
+    "candybowl_tool_snapshot_hits_total",
+    "Tool reads served from the turn snapshot instead of storage.",
+    ["tool"],
+)
+STORAGE_LATENCY = Histogram(
+    "candybowl_storage_io_seconds",
+    "Time spent reading and writing persistent storage.",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+)
+
+
+@contextmanager
+def span(
+    name: str, histogram: Histogram | None = None, **labels: str
+) -> Iterator[dict[str, Any]]:
+    """Times a block, recording it in the histogram and as a trace log line.
+
+    The yielded dict can be filled with extra attributes to log with the span.
+    """
+    attributes: dict[str, Any] = {}
+    start = time.perf_counter()
+    try:
+        yield attributes
+
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is not None:
+            histogram.labels(**labels).observe(elapsed)
+
+        logger.bind(
+            span=name,
+            duration_ms=round(elapsed * 1000, 3),
+            **labels,
+            **attributes,
+        ).debug(f"span {name} took {elapsed * 1000:.1f} ms")
+
+
+def tool(func: Callable[P, str]) -> Callable[P, str]:
+    """Records the latency and errors of a tool exposed to the model.
+
+    Tools report failures by returning a string starting with "Error", so
+    those are counted as errors alongside raised exceptions.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> str:
+        with span(f"tool.{func.__name__}", TOOL_LATENCY, tool=func.__name__):
+            try:
+                result = func(*args, **kwargs)
+
+            except Exception:
+                TOOL_ERRORS.labels(tool=func.__name__).inc()
+                raise
+
+        if result.startswith("Error"):
+            TOOL_ERRORS.labels(tool=func.__name__).inc()
+        return result
+
+    return wrapper
+
+
+def record_usage(usage: Any) -> None:
+    """Adds the token counts of a model response's usage metadata."""
+    if usage is None:
+        return
+
+    for type_, count in (
+        ("input", usage.prompt_token_count),
+        ("output", usage.candidates_token_count),
+        ("cached", usage.cached_content_token_count),
+        ("tool_use", usage.tool_use_prompt_token_count),
+        ("thoughts", usage.thoughts_token_count),
+    ):
+        if count:
+            MODEL_TOKENS.labels(type=type_).inc(count)
+
+
+class _StatsCollector(Collector):
+    """Exposes the counters of in-process caches as gauges.
+
+    With several worker processes, each only knows its own caches, so the
+    gauges are labelled with the process ID of the worker that reported them.
+    """
+
+    def __init__(self) -> None:
+        self._sources: dict[str, Callable[[], dict[str, int]]] = {}
+
+    def add(self, name: str, stats: Callable[[], dict[str, int]]) -> None:
+        self._sources[name] = stats
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        for name, stats in self._sources.items():
+            gauge = GaugeMetricFamily(
+                f"candybowl_{name}",
+                f"Counters of the {name} cache.",
+                labels=["stat", "pid"] if MULTIPROC_DIR else ["stat"],
+            )
+            for stat, value in stats().items():
+                gauge.add_metric(
+                    [stat, str(os.getpid())] if MULTIPROC_DIR else [stat],
+                    value,
+                )
+            yield gauge
+
+
+_stats = _StatsCollector()
+REGISTRY.register(_stats)
+
+
+def register_stats(name: str, stats: Callable[[], dict[str, int]]) -> None:
+    """Publishes a cache's `stats()` counters on the metrics endpoint."""
+    _stats.add(name, stats)
+
+
+@functools.cache
+def _multiprocess_registry() -> CollectorRegistry:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, MULTIPROC_DIR)
+    registry.register(_stats)
+    return registry
+
+
+def exposition() -> tuple[bytes, str]:
+    """Returns the metrics in the Prometheus text format with its content type.
+
+    The totals cover every worker process when `MULTIPROC_DIR` is set.
+    """
+    if MULTIPROC_DIR:
+        return generate_latest(_multiprocess_registry()), CONTENT_TYPE_LATEST
+
+    return generate_latest(), CONTENT_TYPE_LATEST
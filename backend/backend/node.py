@@ -0,0 +1,57 @@
+from contextlib import suppress
+import os
+import re
+import socket
+import uuid
+
+# Identifies this backend node in the chat IDs it hands out, so clients can
+# send the rest of a conversation to the node that holds it in memory.
+#
+# Clients fall back to another node when a chat's owner is gone, and every
+# node may write any bowl, so the nodes must share CANDYBOWL_DATA_DIR and
+# CHAT_SESSION_DIR. The file locks that keep concurrent writers consistent
+# only hold where the processes see the same locks, such as on one host or
+# a filesystem with working POSIX locks, and SQLite must not be shared over
+# a network filesystem at all. Elsewhere, run a single node per bowl.
+NODE_ID = re.sub(r"[^\w-]", "-", os.getenv("NODE_ID", socket.gethostname()))
+
+# While this file exists the node is draining: it keeps serving the chats it
+# owns but refuses to start new ones. A file is shared by every worker
+# process of the node and survives restarts.
+DRAIN_FILE = os.getenv(
+    "NODE_DRAIN_FILE",
+    os.path.join(os.getenv("CANDYBOWL_DATA_DIR", "data"), f"{NODE_ID}.drain"),
+)
+
+# Whether clients may start and stop draining over HTTP. The endpoints are
+# not authenticated, so they are off unless the node is only reachable by
+# trusted clients. Draining by creating the file works either way.
+DRAIN_API_ENABLED = os.getenv("NODE_DRAIN_API_ENABLED", "false") == "true"
+
+
+def new_chat_id() -> str:
+    """Returns a unique chat ID owned by this node."""
+    return f"{NODE_ID}.{uuid.uuid4()}"
+
+
+def draining() -> bool:
+    """Whether this node refuses to start new chats."""
+    return os.path.exists(DRAIN_FILE)
+
+
+def set_draining(value: bool) -> None:
+    """Starts or stops draining this node."""
+    if not value:
+        with suppress(FileNotFoundError):
+            os.remove(DRAIN_FILE)
+        return
+
+    if os.path.dirname(DRAIN_FILE):
+        os.makedirs(os.path.dirname(DRAIN_FILE), exist_ok=True)
+    with open(DRAIN_FILE, "w"):
+        pass
+
+
+def status() -> dict:
+    """Returns what clients need to route chats to this node."""
+    return {"node_id": NODE_ID, "draining": draining()}
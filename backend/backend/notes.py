@@ -1,22 +1,505 @@
+from __future__ import annotations
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterable, TypeAlias
+
+from loguru import logger
+
+from backend import metrics
+from backend.linelog import LineLog
+from backend.locking import Version, atomic_write, file_lock, file_version
+from backend.search import TextIndex
+
+if TYPE_CHECKING:
+    from backend.storage.base import Notes
+
+
+COMPACT_INTERVAL_SECONDS = float(
+    os.getenv("NOTES_COMPACT_INTERVAL_SECONDS", "3600")
+)
+MAX_NOTE_AGE_SECONDS = float(
+    os.getenv("NOTES_MAX_AGE_SECONDS", str(14 * 24 * 3600))
+)
+RECENT_TEXTS_PER_ITEM = 3
+
+# Where a read of a notes file stopped: the inode of the file, the offset
+# read up to and the last line read, which ends at that offset.
+FileCursor: TypeAlias = tuple[int, int, bytes]
+
+
 class NotesFile:
+    """Text file of notes, safe to share between worker processes.
+
+    Reads hold a shared lock on the file and writes an exclusive one. Whole
+    file rewrites replace it atomically.
+    """
+
     def __init__(self, file_path: str):
         self.file_path = file_path
 
     def read(self) -> str:
         """Returns the contents of the note file."""
         try:
-            with open(self.file_path, "r") as file:
+            with file_lock(self.file_path), open(self.file_path, "r") as file:
                 return file.read()
 
         except FileNotFoundError:
             return "Note file not found."
 
+    def read_lines(self) -> list[str]:
+        """Returns the lines of the note file, or none if it does not exist."""
+        try:
+            with (
+                metrics.span(
+                    "storage.notes.read",
+                    metrics.STORAGE_LATENCY,
+                    operation="notes_read",
+                ),
+                file_lock(self.file_path),
+                open(self.file_path, "r") as file,
+            ):
+                return file.read().splitlines()
+
+        except FileNotFoundError:
+            return []
+
+    def version(self) -> Version:
+        """Returns a stamp that changes whenever the note file is written."""
+        return file_version(self.file_path)
+
+    def tail(
+        self, cursor: FileCursor | None = None
+    ) -> tuple[list[str], FileCursor | None] | None:
+        """Returns the lines appended since a cursor, and a cursor past them.
+
+        Only the appended part of the file is read. A cursor of None reads
+        every line.
+
+        Returns:
+            The new lines and cursor, or None if the file was rewritten since
+            the cursor was taken and has to be read from the start instead.
+        """
+        inode, offset, last_line = cursor or (0, 0, b"")
+        try:
+            with (
+                metrics.span(
+                    "storage.notes.read",
+                    metrics.STORAGE_LATENCY,
+                    operation="notes_read",
+                ),
+                file_lock(self.file_path),
+                open(self.file_path, "rb") as file,
+            ):
+                stat = os.fstat(file.fileno())
+                if cursor is not None and (
+                    stat.st_ino != inode or stat.st_size < offset
+                ):
+                    return None
+
+                # Re-read the last line seen, to tell an append from a
+                # rewrite that happened to reuse the inode.
+                file.seek(offset - len(last_line))
+                data = file.read()
+
+        except FileNotFoundError:
+            return None if cursor is not None else ([], None)
+
+        if not data.startswith(last_line):
+            return None
+
+        end = data.rfind(b"\n") + 1
+        if end <= len(last_line):
+            return [], cursor
+
+        new = data[len(last_line) : end]
+        return new.decode().splitlines(), (
+            stat.st_ino,
+            offset - len(last_line) + end,
+            new[new.rfind(b"\n", 0, -1) + 1 :],
+        )
+
     def append(self, content: str) -> None:
         """Appends content to the note file."""
-        with open(self.file_path, "a") as file:
-            file.write(content + "\n")
+        self.extend([content])
+
+    def extend(self, contents: list[str]) -> None:
+        """Appends each of the contents to the note file as one write."""
+        with (
+            metrics.span(
+                "storage.notes.append",
+                metrics.STORAGE_LATENCY,
+                operation="notes_append",
+            ),
+            file_lock(self.file_path, exclusive=True),
+            open(self.file_path, "a") as file,
+        ):
+            file.write("".join(content + "\n" for content in contents))
+
+    def write(self, lines: list[str]) -> None:
+        """Atomically replaces the note file with the given lines."""
+        with file_lock(self.file_path, exclusive=True):
+            self._write(lines)
+
+    def _write(self, lines: list[str]) -> None:
+        with (
+            metrics.span(
+                "storage.notes.write",
+                metrics.STORAGE_LATENCY,
+                operation="notes_write",
+            ),
+            atomic_write(self.file_path) as file,
+        ):
+            file.writelines(line + "\n" for line in lines)
+
+    def rewrite(self, transform: Callable[[list[str]], list[str]]) -> None:
+        """Atomically replaces the lines with the result of transforming them.
+
+        No other process can change the file between reading and writing it.
+        """
+        with file_lock(self.file_path, exclusive=True):
+            try:
+                with open(self.file_path, "r") as file:
+                    lines = file.read().splitlines()
+
+            except FileNotFoundError:
+                lines = []
+
+            self._write(transform(lines))
 
     def clear(self) -> None:
         """Clears the note file."""
-        with open(self.file_path, "w") as file:
-            file.write("")
+        self.write([])
+
+
+def _key(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def _isoformat(timestamp: float) -> str | None:
+    if not timestamp:
+        return None
+
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(
+        timespec="minutes"
+    )
+
+
+@dataclass(frozen=True, kw_only=True)
+class Note:
+    timestamp: float
+    text: str
+    user: str = ""
+    item: str = ""
+    suggested_price_usd: float | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "timestamp": _isoformat(self.timestamp),
+            "user": self.user or None,
+            "item": self.item or None,
+            "suggested_price_usd": self.suggested_price_usd,
+            "text": self.text,
+        }
+
+
+@dataclass(kw_only=True)
+class ItemSummary:
+    """Aggregate of the compacted notes about one item."""
+
+    item: str
+    count: int = 0
+    users: list[str] = field(default_factory=list)
+    min_suggested_price_usd: float | None = None
+    max_suggested_price_usd: float | None = None
+    mean_suggested_price_usd: float | None = None
+    price_suggestions: int = 0
+    first_seen: float = 0.0
+    last_seen: float = 0.0
+    recent_texts: list[str] = field(default_factory=list)
+
+    def add(self, note: Note) -> None:
+        """Folds a note into the aggregate."""
+        self.count += 1
+        if note.user and note.user not in self.users:
+            self.users.append(note.user)
+
+        price = note.suggested_price_usd
+        if price is not None:
+            total = (
+                self.mean_suggested_price_usd or 0
+            ) * self.price_suggestions
+            self.price_suggestions += 1
+            self.mean_suggested_price_usd = (total + price) / (
+                self.price_suggestions
+            )
+            if self.min_suggested_price_usd is None:
+                self.min_suggested_price_usd = price
+                self.max_suggested_price_usd = price
+            else:
+                self.min_suggested_price_usd = min(
+                    price, self.min_suggested_price_usd
+                )
+                self.max_suggested_price_usd = max(
+                    price, self.max_suggested_price_usd or 0.0
+                )
+
+        if note.timestamp:
+            self.first_seen = min(
+                note.timestamp, self.first_seen or note.timestamp
+            )
+            self.last_seen = max(note.timestamp, self.last_seen)
+
+        self.recent_texts = (self.recent_texts + [note.text])[
+            -RECENT_TEXTS_PER_ITEM:
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "item": self.item or None,
+            "first_seen": _isoformat(self.first_seen),
+            "last_seen": _isoformat(self.last_seen),
+        }
+
+
+class NotesLog(LineLog):
+    """Structured, indexed view of the notes taken by the model.
+
+    Each note is stored as one JSON line in the underlying notes backend,
+    alongside the per-item summaries that compaction rolls old notes into.
+    Lines that are not JSON, such as notes taken before this format, and
+    JSON lines that do not match it are read as notes without a user, item
+    or timestamp.
+    """
+
+    def __init__(self, backend: Notes):
+        self._notes: list[Note] = []
+        self._timestamps: list[float] = []
+        self._by_user: dict[str, list[int]] = {}
+        self._by_item: dict[str, list[int]] = {}
+        self._summaries: dict[str, ItemSummary] = {}
+        # Notes are keyed by position and summaries by item.
+        self._text: TextIndex[int | str] = TextIndex()
+        super().__init__(backend)
+
+    def _reset(self) -> None:
+        self._notes.clear()
+        self._timestamps.clear()
+        self._by_user.clear()
+        self._by_item.clear()
+        self._summaries.clear()
+        self._text.clear()
+
+    def _apply(self, line: str) -> None:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+
+        if not isinstance(data, dict):
+            self._index(Note(timestamp=0.0, text=line))
+            return
+
+        try:
+            if data.pop("type", "note") == "summary":
+                summary = ItemSummary(**data)
+                self._summaries[_key(summary.item)] = summary
+                self._text.add(
+                    _key(summary.item),
+                    " ".join(
+                        [summary.item, *summary.users, *summary.recent_texts]
+                    ),
+                )
+            else:
+                note = Note(**data)
+                if not isinstance(note.timestamp, (int, float)):
+                    raise TypeError(f"Invalid timestamp: {note.timestamp!r}")
+                self._index(note)
+
+        except (TypeError, ValueError) as ex:
+            # Kept as plain text, so a hand-edited or newer line neither
+            # breaks every read nor disappears.
+            logger.warning(f"Reading malformed note {line!r} as text: {ex}")
+            self._index(Note(timestamp=0.0, text=line))
+
+    def _index(self, note: Note) -> None:
+        # Notes are appended in time order, so the list stays sorted by
+        # timestamp and time windows can be found by bisection. Notes
+        # appended concurrently by other processes may be off by the time
+        # it took to write them, which does not matter at day granularity.
+        position = len(self._notes)
+        self._notes.append(note)
+        self._timestamps.append(note.timestamp)
+        if note.user:
+            self._by_user.setdefault(_key(note.user), []).append(position)
+        if note.item:
+            self._by_item.setdefault(_key(note.item), []).append(position)
+        self._text.add(position, f"{note.text} {note.item} {note.user}")
+
+    def append(
+        self,
+        text: str,
+        user: str = "",
+        item: str = "",
+        suggested_price_usd: float | None = None,
+    ) -> Note:
+        """Records a new note."""
+        note = Note(
+            timestamp=time.time(),
+            text=text,
+            user=user,
+            item=item,
+            suggested_price_usd=suggested_price_usd,
+        )
+        self._append([json.dumps({"type": "note", **asdict(note)})])
+        return note
+
+    def query(
+        self,
+        user: str = "",
+        item: str = "",
+        since: float = 0.0,
+        until: float | None = None,
+    ) -> list[Note]:
+        """Returns the notes matching every given filter, oldest first.
+
+        User and item filters match any recorded name containing them.
+        """
+        with self._lock:
+            self._refresh()
+            start = bisect_left(self._timestamps, since) if since else 0
+            end = (
+                bisect_right(self._timestamps, until)
+                if until is not None
+                else len(self._notes)
+            )
+            positions: set[int] | None = None
+
+            for index, value in ((self._by_user, user), (self._by_item, item)):
+                if not value:
+                    continue
+
+                matches = {
+                    position
+                    for name, indexed in index.items()
+                    if _key(value) in name
+                    for position in indexed
+                }
+                positions = (
+                    matches if positions is None else positions & matches
+                )
+
+            if positions is None:
+                return self._notes[start:end]
+
+            return [
+                self._notes[position]
+                for position in sorted(positions)
+                if start <= position < end
+            ]
+
+    def search(
+        self, query: str, limit: int = 5
+    ) -> list[tuple[Note | ItemSummary, float]]:
+        """Returns the notes and summaries most relevant to a query.
+
+        Matches are ranked by BM25 over the text, item and user of each note
+        and the item, users and recent texts of each summary.
+        """
+        with self._lock:
+            self._refresh()
+            return [
+                (
+                    self._notes[key]
+                    if isinstance(key, int)
+                    else self._summaries[key],
+                    score,
+                )
+                for key, score in self._text.search(query, limit)
+            ]
+
+    def summaries(self, user: str = "", item: str = "") -> list[ItemSummary]:
+        """Returns the summaries of compacted notes matching the filters."""
+        with self._lock:
+            self._refresh()
+            return [
+                summary
+                for name, summary in self._summaries.items()
+                if _key(item) in name
+                and (
+                    not user
+                    or any(_key(user) in _key(name) for name in summary.users)
+                )
+            ]
+
+    def compact(self, before: float) -> int:
+        """Rolls notes older than the given time into per-item summaries.
+
+        The notes are re-read and rewritten under the backend's exclusive
+        lock, so notes other processes append meanwhile are not lost.
+
+        Returns:
+            The number of notes that were compacted.
+        """
+        compacted = 0
+
+        def transform(lines: list[str]) -> list[str]:
+            nonlocal compacted
+            self._rebuild(lines)
+            compacted = bisect_left(self._timestamps, before)
+
+            for note in self._notes[:compacted]:
+                self._summaries.setdefault(
+                    _key(note.item), ItemSummary(item=note.item)
+                ).add(note)
+
+            return [
+                json.dumps({"type": "summary", **asdict(summary)})
+                for summary in self._summaries.values()
+            ] + [
+                json.dumps({"type": "note", **asdict(note)})
+                for note in self._notes[compacted:]
+            ]
+
+        with self._lock:
+            self._refresh()
+            if bisect_left(self._timestamps, before) == 0:
+                return 0
+
+            self._backend.rewrite(transform)
+            self._reload()
+
+        logger.info(f"Compacted {compacted} notes into item summaries.")
+        return compacted
+
+
+def schedule_compaction(
+    logs: Callable[[], Iterable[NotesLog]],
+    interval: float = COMPACT_INTERVAL_SECONDS,
+    max_age: float = MAX_NOTE_AGE_SECONDS,
+) -> threading.Thread:
+    """Starts a background thread that periodically compacts old notes.
+
+    Args:
+        logs: Returns the logs to compact, which are looked up on every run
+            so that logs opened since are covered too.
+    """
+
+    def run() -> None:
+        while True:
+            time.sleep(interval)
+            for log in logs():
+                try:
+                    log.compact(time.time() - max_age)
+
+                except Exception as ex:
+                    logger.error(f"Error compacting notes: {ex}")
+
+    thread = threading.Thread(target=run, name="notes-compaction", daemon=True)
+    thread.start()
+    return thread
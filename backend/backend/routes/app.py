@@ -1,9 +1,64 @@
-from flask import Flask
-from . import chat
+import time
+
+from flask import Flask, Response, g, jsonify, request
+
+from backend import amazon, metrics
+from backend.ai.chat import start_warm_up
+from backend.notes import schedule_compaction
+from backend.storage import open_storages
+from backend.tenancy import (
+    TENANT_HEADER,
+    TenantNotServed,
+    resolve_tenant,
+    set_tenant,
+)
+
+from . import chat, inventory
+from . import metrics as metrics_routes
+from . import node, sales
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
     app.register_blueprint(chat.bp)
+    app.register_blueprint(inventory.bp)
+    app.register_blueprint(metrics_routes.bp)
+    app.register_blueprint(node.bp)
+    app.register_blueprint(sales.bp)
+
+    @app.before_request
+    def start_timer() -> None:
+        g.request_start = time.perf_counter()
+
+    @app.before_request
+    def select_tenant() -> tuple[Response, int] | None:
+        try:
+            set_tenant(resolve_tenant(request.headers.get(TENANT_HEADER)))
+
+        except TenantNotServed as ex:
+            return jsonify({"error": str(ex)}), 421
+
+        except ValueError as ex:
+            return jsonify({"error": str(ex)}), 400
+
+        return None
+
+    @app.after_request
+    def record_latency(response: Response) -> Response:
+        # Streamed responses are measured up to their first byte.
+        metrics.ROUTE_LATENCY.labels(
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=str(response.status_code),
+        ).observe(time.perf_counter() - g.request_start)
+        return response
+
+    metrics.register_stats("chat_sessions", chat.chats.stats)
+    metrics.register_stats("product_search", amazon.cache_stats)
+
+    schedule_compaction(
+        lambda: [storage.notes_log for storage in open_storages()]
+    )
+    start_warm_up()
 
     return app
@@ -0,0 +1,67 @@
+import time
+
+from quart import Quart, Response, g, jsonify, request
+
+from backend import amazon, metrics
+from backend.ai.chat import start_warm_up
+from backend.notes import schedule_compaction
+from backend.storage import open_storages
+from backend.tenancy import (
+    TENANT_HEADER,
+    TenantNotServed,
+    resolve_tenant,
+    set_tenant,
+)
+
+from . import async_chat, async_inventory, async_node, async_sales
+
+
+def create_app() -> Quart:
+    app = Quart(__name__)
+    app.register_blueprint(async_chat.bp)
+    app.register_blueprint(async_inventory.bp)
+    app.register_blueprint(async_node.bp)
+    app.register_blueprint(async_sales.bp)
+
+    @app.before_request
+    async def start_timer() -> None:
+        g.request_start = time.perf_counter()
+
+    @app.before_request
+    async def select_tenant() -> tuple[Response, int] | None:
+        try:
+            set_tenant(resolve_tenant(request.headers.get(TENANT_HEADER)))
+
+        except TenantNotServed as ex:
+            return jsonify({"error": str(ex)}), 421
+
+        except ValueError as ex:
+            return jsonify({"error": str(ex)}), 400
+
+        return None
+
+    @app.after_request
+    async def record_latency(response: Response) -> Response:
+        # Streamed responses are measured up to their first byte.
+        metrics.ROUTE_LATENCY.labels(
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=str(response.status_code),
+        ).observe(time.perf_counter() - g.request_start)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    async def exposition() -> Response:
+        """Returns the Prometheus metrics of every worker process."""
+        body, content_type = metrics.exposition()
+        return Response(body, content_type=content_type)
+
+    metrics.register_stats("chat_sessions", async_chat.chats.stats)
+    metrics.register_stats("product_search", amazon.cache_stats)
+
+    schedule_compaction(
+        lambda: [storage.notes_log for storage in open_storages()]
+    )
+    start_warm_up(asynchronous=True)
+
+    return app
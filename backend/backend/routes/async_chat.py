@@ -0,0 +1,301 @@
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from functools import partial, wraps
+import json
+import os
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Literal,
+    TypeAlias,
+    TypeVar,
+)
+
+from quart import Blueprint, Response, jsonify, request
+
+from backend.ai.chat import (
+    RESTOCK_MESSAGE,
+    ChatKind,
+    create_async_chat,
+    create_chat,
+    restock_async_chat,
+    run_restock,
+    send_message_async,
+    send_message_stream_async,
+)
+from backend.ai.sessions import ChatSessionStore
+from backend.jobs import get_job_queue
+from backend.node import draining, new_chat_id
+from backend.tenancy import current_tenant
+
+if TYPE_CHECKING:
+    from backend.ai.chat import AsyncChat, Chat
+
+bp = Blueprint("async_chat", __name__)
+
+chats: ChatSessionStore[AsyncChat] = ChatSessionStore(create_async_chat)
+
+# Background jobs run on worker threads with synchronous chats. Their
+# sessions are persisted to the same directory, so `chats` rehydrates them
+# when the conversation continues.
+job_chats: ChatSessionStore[Chat] = ChatSessionStore(create_chat)
+
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "30"))
+
+_limits: dict[str, asyncio.Semaphore] = {
+    kind: asyncio.Semaphore(
+        int(os.getenv(f"CHAT_CONCURRENCY_{kind.upper()}", default))
+    )
+    for kind, default in (("request", "16"), ("haggle", "16"), ("restock", "2"))
+}
+
+StatusCode: TypeAlias = (
+    tuple[Response, Literal[200]]
+    | tuple[Response, Literal[202]]
+    | tuple[Response, Literal[400]]
+    | tuple[Response, Literal[404]]
+    | tuple[Response, Literal[500]]
+    | tuple[Response, Literal[503]]
+)
+
+R = TypeVar("R")
+
+
+class Overloaded(Exception):
+    """Raised when a chat type has no free capacity within the queue timeout."""
+
+
+@asynccontextmanager
+async def _limit(kind: str) -> AsyncIterator[None]:
+    """Bounds how many model calls of one chat type run at once."""
+    semaphore = _limits[kind]
+    try:
+        await asyncio.wait_for(semaphore.acquire(), QUEUE_TIMEOUT_SECONDS)
+
+    except asyncio.TimeoutError:
+        raise Overloaded(f"Too many concurrent {kind} chats.")
+
+    try:
+        yield
+
+    finally:
+        semaphore.release()
+
+
+def _starts_chat(
+    view: Callable[[], Awaitable[R]],
+) -> Callable[[], Awaitable[R | StatusCode]]:
+    """Refuses to start chats while this node is draining.
+
+    Clients then start them on another node, while the chats this node
+    already owns keep being served here.
+    """
+
+    @wraps(view)
+    async def wrapper() -> R | StatusCode:
+        if draining():
+            return jsonify({"error": "This node is draining"}), 503
+
+        return await view()
+
+    return wrapper
+
+
+async def _start(kind: ChatKind) -> StatusCode:
+    try:
+        chat = create_async_chat(kind)
+        chat_id = new_chat_id()
+        chats.add(chat_id, kind, chat)
+
+        return jsonify({"chat_id": chat_id}), 200
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/chat/request", methods=["GET"])
+@_starts_chat
+async def request_item() -> StatusCode:
+    """Starts a request session."""
+    return await _start("request")
+
+
+@bp.route("/chat/haggle", methods=["GET"])
+@_starts_chat
+async def haggle() -> StatusCode:
+    """Starts a haggling session."""
+    return await _start("haggle")
+
+
+@bp.route("/chat/restock", methods=["GET"])
+@_starts_chat
+async def restock() -> StatusCode:
+    """Starts a restocking session."""
+    try:
+        async with _limit("restock"):
+            chat, response = await restock_async_chat()
+
+        chat_id = new_chat_id()
+        chats.add(chat_id, "restock", chat)
+
+        return jsonify({"chat_id": chat_id, "response": response}), 200
+
+    except Overloaded as ex:
+        return jsonify({"error": str(ex)}), 503
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/chat/restock/jobs", methods=["POST"])
+@_starts_chat
+async def restock_job() -> StatusCode:
+    """Queues a restocking session to run in the background.
+
+    Only one restock runs at a time per bowl, so while one is queued or
+    running, its job is returned instead. Retries that send the same
+    `Idempotency-Key` header or `idempotency_key` field also get the original
+    job back. The finished job is POSTed to the optional `callback_url`,
+    whose host must be listed in JOB_CALLBACK_HOSTS.
+    """
+    try:
+        data = await request.get_json(silent=True) or {}
+        job, created = await asyncio.to_thread(
+            get_job_queue().submit,
+            "restock",
+            partial(run_restock, chats=job_chats),
+            idempotency_key=request.headers.get(
+                "Idempotency-Key", data.get("idempotency_key", "")
+            ),
+            callback_url=data.get("callback_url", ""),
+            single_flight=True,
+        )
+
+        if not created:
+            return jsonify(job.to_dict()), 200
+
+        return jsonify(job.to_dict()), 202
+
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 400
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/chat/restock/jobs/<job_id>", methods=["GET"])
+async def restock_job_status(job_id: str) -> StatusCode:
+    """Returns a restock job, with its output from the `offset` query on."""
+    job = await asyncio.to_thread(get_job_queue().get, job_id)
+    if job is None or job.kind != "restock" or job.tenant != current_tenant():
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.to_dict(request.args.get("offset", 0, int))), 200
+
+
+@bp.route("/chat/message", methods=["POST"])
+async def message() -> StatusCode:
+    """Sends a message to the chat and returns the response."""
+    try:
+        data = await request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "Invalid request format"}), 400
+
+        chat_id = data.get("chat_id")
+        chat = chats.get(chat_id) if isinstance(chat_id, str) else None
+        if not chat:
+            return jsonify({"error": "Chat not found"}), 404
+
+        message = data.get("message")
+        if not message:
+            return jsonify({"error": "Message cannot be empty"}), 400
+
+        async with _limit(chats.kind(chat_id) or "request"):
+            response = await send_message_async(chat, message)
+        chats.save(chat_id)
+        if not response:
+            return jsonify(
+                {"error": "Received empty response from the model"}
+            ), 500
+
+        return jsonify({"response": response}), 200
+
+    except Overloaded as ex:
+        return jsonify({"error": str(ex)}), 503
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+async def _ndjson(
+    chat_id: str, chat: AsyncChat, message: str
+) -> AsyncIterator[str]:
+    """Streams a model response as newline-delimited JSON objects.
+
+    The stream carries `{"text": ...}` objects as tokens arrive and ends with
+    either `{"done": true}` or `{"error": ...}`.
+    """
+    try:
+        async with _limit(chats.kind(chat_id) or "request"):
+            async for text in send_message_stream_async(chat, message):
+                yield json.dumps({"text": text}) + "\n"
+
+        chats.save(chat_id)
+        yield json.dumps({"done": True}) + "\n"
+
+    except Exception as ex:
+        yield json.dumps({"error": str(ex)}) + "\n"
+
+
+@bp.route("/chat/restock/stream", methods=["GET"])
+@_starts_chat
+async def restock_stream() -> Response | StatusCode:
+    """Starts a restocking session and streams the initial response."""
+    try:
+        chat = create_async_chat("restock")
+        chat_id = new_chat_id()
+        chats.add(chat_id, "restock", chat)
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+    async def generate() -> AsyncIterator[str]:
+        yield json.dumps({"chat_id": chat_id}) + "\n"
+        async for line in _ndjson(chat_id, chat, RESTOCK_MESSAGE):
+            yield line
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@bp.route("/chat/message/stream", methods=["POST"])
+async def message_stream() -> Response | StatusCode:
+    """Sends a message to the chat and streams the response."""
+    try:
+        data = await request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "Invalid request format"}), 400
+
+        chat_id = data.get("chat_id")
+        chat = chats.get(chat_id) if isinstance(chat_id, str) else None
+        if not chat:
+            return jsonify({"error": "Chat not found"}), 404
+
+        message = data.get("message")
+        if not message:
+            return jsonify({"error": "Message cannot be empty"}), 400
+
+        return Response(
+            _ndjson(chat_id, chat, message), mimetype="application/x-ndjson"
+        )
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/chat/stats", methods=["GET"])
+async def stats() -> StatusCode:
+    """Returns hit, miss and eviction counts of the chat session store."""
+    return jsonify(chats.stats()), 200
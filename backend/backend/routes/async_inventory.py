@@ -0,0 +1,90 @@
+from __future__ import annotations
+import asyncio
+from typing import TYPE_CHECKING, AsyncIterator
+
+from quart import Blueprint, Response
+
+from backend.feed import (
+    FEED_BUFFER_SIZE,
+    FEED_POLL_SECONDS,
+    jsonable,
+    server_sent_event,
+)
+from backend.storage import get_storage
+
+if TYPE_CHECKING:
+    from backend.feed import Change
+    from backend.storage import Inventory
+
+bp = Blueprint("async_inventory", __name__)
+
+
+async def _snapshot(inventory: Inventory) -> str:
+    inventory_frame = await asyncio.to_thread(inventory.get_inventory)
+    return server_sent_event(
+        "snapshot",
+        {
+            "items": [
+                jsonable(item) for item in inventory_frame.to_dict("records")
+            ]
+        },
+    )
+
+
+@bp.route("/inventory/changes", methods=["GET"])
+async def changes() -> Response:
+    """Streams changes to the inventory as server-sent events.
+
+    The stream opens with a `snapshot` event holding every item, followed by
+    a `change` event for each change, as described by `ChangeFeed`. A client
+    that falls behind is sent a fresh snapshot instead of the changes it
+    missed. While idle, the stream checks for changes made by other
+    processes and sends a comment to keep the connection open.
+    """
+    inventory = get_storage().inventory()
+    loop = asyncio.get_running_loop()
+    pending: asyncio.Queue[Change] = asyncio.Queue(FEED_BUFFER_SIZE)
+    overflowed = asyncio.Event()
+
+    def put(change: Change) -> None:
+        try:
+            pending.put_nowait(change)
+
+        except asyncio.QueueFull:
+            overflowed.set()
+
+    def receive(change: Change) -> None:
+        # Changes are published on whichever thread made them.
+        loop.call_soon_threadsafe(put, change)
+
+    async def generate() -> AsyncIterator[str]:
+        unsubscribe = inventory.subscribe(receive)
+        try:
+            yield await _snapshot(inventory)
+            while True:
+                if overflowed.is_set():
+                    overflowed.clear()
+                    while not pending.empty():
+                        pending.get_nowait()
+                    yield await _snapshot(inventory)
+
+                try:
+                    change = await asyncio.wait_for(
+                        pending.get(), FEED_POLL_SECONDS
+                    )
+
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(inventory.refresh)
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield server_sent_event("change", change)
+
+        finally:
+            unsubscribe()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Literal, TypeAlias
+
+from quart import Blueprint, Response, jsonify, request
+
+from backend.storage import get_storage
+
+bp = Blueprint("async_sales", __name__)
+
+StatusCode: TypeAlias = (
+    tuple[Response, Literal[200]]
+    | tuple[Response, Literal[400]]
+    | tuple[Response, Literal[500]]
+)
+
+
+@bp.route("/sales", methods=["POST"])
+async def record_sale() -> StatusCode:
+    """Records units of an item sold from the bowl."""
+    try:
+        data = await request.get_json(silent=True)
+        if data is None:
+            return jsonify({"error": "Invalid request format"}), 400
+
+        item_id = data.get("item_id")
+        if not isinstance(item_id, str) or not item_id:
+            return jsonify({"error": "Item ID cannot be empty"}), 400
+
+        try:
+            storage = get_storage()
+            sale = await asyncio.to_thread(
+                storage.sell,
+                item_id,
+                int(data.get("quantity", 1)),
+                data.get("unit_price_usd"),
+            )
+
+        except (TypeError, ValueError) as ex:
+            return jsonify({"error": str(ex)}), 400
+
+        return jsonify(
+            {
+                "item_name": sale.item_name,
+                "quantity": sale.quantity,
+                "revenue_usd": sale.amount_usd,
+                "balance_usd": storage.ledger.balance_usd,
+            }
+        ), 200
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/sales/summary", methods=["GET"])
+async def summary() -> StatusCode:
+    """Returns the balance, totals and per-item sales of the bowl."""
+    ledger = get_storage().ledger
+    return jsonify(
+        {
+            "balance_usd": ledger.balance_usd,
+            "totals": ledger.totals(),
+            "items": [item.to_dict() for item in ledger.items()],
+        }
+    ), 200
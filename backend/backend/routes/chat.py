@@ -1,36 +1,77 @@
-from typing import Literal, TypeAlias
-import uuid
+from __future__ import annotations
+from functools import partial, wraps
+import json
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterator,
+    Literal,
+    TypeAlias,
+    TypeVar,
+)
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, stream_with_context
 from flask.wrappers import Response
 
 from backend.ai.chat import (
-    Chat,
+    create_chat,
+    RESTOCK_MESSAGE,
     haggle_chat,
     restock_chat,
     request_chat,
+    run_restock,
     send_message,
+    send_message_stream,
 )
+from backend.ai.sessions import ChatSessionStore
+from backend.jobs import get_job_queue
+from backend.node import draining, new_chat_id
+from backend.tenancy import current_tenant
+
+if TYPE_CHECKING:
+    from backend.ai.chat import Chat
 
 bp = Blueprint("chat", __name__)
 
-chats: dict[str, Chat] = {}
+chats: ChatSessionStore[Chat] = ChatSessionStore(create_chat)
 
 StatusCode: TypeAlias = (
     tuple[Response, Literal[200]]
+    | tuple[Response, Literal[202]]
     | tuple[Response, Literal[400]]
     | tuple[Response, Literal[404]]
     | tuple[Response, Literal[500]]
+    | tuple[Response, Literal[503]]
 )
 
+R = TypeVar("R")
+
+
+def _starts_chat(view: Callable[[], R]) -> Callable[[], R | StatusCode]:
+    """Refuses to start chats while this node is draining.
+
+    Clients then start them on another node, while the chats this node
+    already owns keep being served here.
+    """
+
+    @wraps(view)
+    def wrapper() -> R | StatusCode:
+        if draining():
+            return jsonify({"error": "This node is draining"}), 503
+
+        return view()
+
+    return wrapper
+
 
 @bp.route(rule="/chat/request", methods=["GET"])
+@_starts_chat
 def request_item() -> StatusCode:
     """Starts a request session."""
     try:
         chat = request_chat()
-        chat_id = str(uuid.uuid4())
-        chats[chat_id] = chat
+        chat_id = new_chat_id()
+        chats.add(chat_id, "request", chat)
 
         return jsonify({"chat_id": chat_id}), 200
 
@@ -39,12 +80,13 @@ def request_item() -> StatusCode:
 
 
 @bp.route("/chat/haggle", methods=["GET"])
+@_starts_chat
 def haggle() -> StatusCode:
     """Starts a haggling session."""
     try:
         chat = haggle_chat()
-        chat_id = str(uuid.uuid4())
-        chats[chat_id] = chat
+        chat_id = new_chat_id()
+        chats.add(chat_id, "haggle", chat)
 
         return jsonify({"chat_id": chat_id}), 200
 
@@ -53,12 +95,13 @@ def haggle() -> StatusCode:
 
 
 @bp.route("/chat/restock", methods=["GET"])
+@_starts_chat
 def restock() -> StatusCode:
     """Starts a restocking session."""
     try:
         chat, response = restock_chat()
-        chat_id = str(uuid.uuid4())
-        chats[chat_id] = chat
+        chat_id = new_chat_id()
+        chats.add(chat_id, "restock", chat)
 
         return jsonify({"chat_id": chat_id, "response": response}), 200
 
@@ -66,6 +109,51 @@ def restock() -> StatusCode:
         return jsonify({"error": str(ex)}), 500
 
 
+@bp.route("/chat/restock/jobs", methods=["POST"])
+@_starts_chat
+def restock_job() -> StatusCode:
+    """Queues a restocking session to run in the background.
+
+    Only one restock runs at a time per bowl, so while one is queued or
+    running, its job is returned instead. Retries that send the same
+    `Idempotency-Key` header or `idempotency_key` field also get the original
+    job back. The finished job is POSTed to the optional `callback_url`,
+    whose host must be listed in JOB_CALLBACK_HOSTS.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        job, created = get_job_queue().submit(
+            "restock",
+            partial(run_restock, chats=chats),
+            idempotency_key=request.headers.get(
+                "Idempotency-Key", data.get("idempotency_key", "")
+            ),
+            callback_url=data.get("callback_url", ""),
+            single_flight=True,
+        )
+
+        if not created:
+            return jsonify(job.to_dict()), 200
+
+        return jsonify(job.to_dict()), 202
+
+    except ValueError as ex:
+        return jsonify({"error": str(ex)}), 400
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/chat/restock/jobs/<job_id>", methods=["GET"])
+def restock_job_status(job_id: str) -> StatusCode:
+    """Returns a restock job, with its output from the `offset` query on."""
+    job = get_job_queue().get(job_id)
+    if job is None or job.kind != "restock" or job.tenant != current_tenant():
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(job.to_dict(request.args.get("offset", 0, int))), 200
+
+
 @bp.route("/chat/message", methods=["POST"])
 def message() -> StatusCode:
     """Sends a message to the chat and returns the response."""
@@ -73,7 +161,8 @@ def message() -> StatusCode:
         if request.json is None:
             return jsonify({"error": "Invalid request format"}), 400
 
-        chat = chats.get(request.json.get("chat_id"))
+        chat_id = request.json.get("chat_id")
+        chat = chats.get(chat_id) if isinstance(chat_id, str) else None
         if not chat:
             return jsonify({"error": "Chat not found"}), 404
 
@@ -82,6 +171,7 @@ def message() -> StatusCode:
             return jsonify({"error": "Message cannot be empty"}), 400
 
         response = send_message(chat, message)
+        chats.save(chat_id)
         if not response:
             return jsonify(
                 {"error": "Received empty response from the model"}
@@ -91,3 +181,72 @@ def message() -> StatusCode:
 
     except Exception as ex:
         return jsonify({"error": str(ex)}), 500
+
+
+def _ndjson(chat_id: str, chat: Chat, message: str) -> Iterator[str]:
+    """Streams a model response as newline-delimited JSON objects.
+
+    The stream carries `{"text": ...}` objects as tokens arrive and ends with
+    either `{"done": true}` or `{"error": ...}`.
+    """
+    try:
+        for text in send_message_stream(chat, message):
+            yield json.dumps({"text": text}) + "\n"
+
+        chats.save(chat_id)
+        yield json.dumps({"done": True}) + "\n"
+
+    except Exception as ex:
+        yield json.dumps({"error": str(ex)}) + "\n"
+
+
+@bp.route("/chat/restock/stream", methods=["GET"])
+@_starts_chat
+def restock_stream() -> Response | StatusCode:
+    """Starts a restocking session and streams the initial response."""
+    try:
+        chat = create_chat("restock")
+        chat_id = new_chat_id()
+        chats.add(chat_id, "restock", chat)
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+    def generate() -> Iterator[str]:
+        yield json.dumps({"chat_id": chat_id}) + "\n"
+        yield from _ndjson(chat_id, chat, RESTOCK_MESSAGE)
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+
+@bp.route("/chat/message/stream", methods=["POST"])
+def message_stream() -> Response | StatusCode:
+    """Sends a message to the chat and streams the response."""
+    try:
+        if request.json is None:
+            return jsonify({"error": "Invalid request format"}), 400
+
+        chat_id = request.json.get("chat_id")
+        chat = chats.get(chat_id) if isinstance(chat_id, str) else None
+        if not chat:
+            return jsonify({"error": "Chat not found"}), 404
+
+        message = request.json.get("message")
+        if not message:
+            return jsonify({"error": "Message cannot be empty"}), 400
+
+        return Response(
+            stream_with_context(_ndjson(chat_id, chat, message)),
+            mimetype="application/x-ndjson",
+        )
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/chat/stats", methods=["GET"])
+def stats() -> StatusCode:
+    """Returns hit, miss and eviction counts of the chat session store."""
+    return jsonify(chats.stats()), 200
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import queue
+import threading
+from typing import TYPE_CHECKING, Iterator
+
+from flask import Blueprint, stream_with_context
+from flask.wrappers import Response
+
+from backend.feed import (
+    FEED_BUFFER_SIZE,
+    FEED_POLL_SECONDS,
+    jsonable,
+    server_sent_event,
+)
+from backend.storage import get_storage
+
+if TYPE_CHECKING:
+    from backend.feed import Change
+    from backend.storage import Inventory
+
+bp = Blueprint("inventory", __name__)
+
+
+def _snapshot(inventory: Inventory) -> str:
+    items = inventory.get_inventory().to_dict("records")
+    return server_sent_event(
+        "snapshot", {"items": [jsonable(item) for item in items]}
+    )
+
+
+@bp.route("/inventory/changes", methods=["GET"])
+def changes() -> Response:
+    """Streams changes to the inventory as server-sent events.
+
+    The stream opens with a `snapshot` event holding every item, followed by
+    a `change` event for each change, as described by `ChangeFeed`. A client
+    that falls behind is sent a fresh snapshot instead of the changes it
+    missed. While idle, the stream checks for changes made by other
+    processes and sends a comment to keep the connection open.
+    """
+    inventory = get_storage().inventory()
+    pending: queue.Queue[Change] = queue.Queue(FEED_BUFFER_SIZE)
+    overflowed = threading.Event()
+
+    def receive(change: Change) -> None:
+        try:
+            pending.put_nowait(change)
+
+        except queue.Full:
+            overflowed.set()
+
+    def generate() -> Iterator[str]:
+        unsubscribe = inventory.subscribe(receive)
+        try:
+            yield _snapshot(inventory)
+            while True:
+                if overflowed.is_set():
+                    overflowed.clear()
+                    with pending.mutex:
+                        pending.queue.clear()
+                    yield _snapshot(inventory)
+
+                try:
+                    change = pending.get(timeout=FEED_POLL_SECONDS)
+
+                except queue.Empty:
+                    inventory.refresh()
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield server_sent_event("change", change)
+
+        finally:
+            unsubscribe()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response
+
+from backend import metrics
+
+bp = Blueprint("metrics", __name__)
+
+
+@bp.route("/metrics", methods=["GET"])
+def exposition() -> Response:
+    """Returns the Prometheus metrics of this process."""
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
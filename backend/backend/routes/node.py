@@ -0,0 +1,41 @@
+from typing import Literal, TypeAlias
+
+from flask import Blueprint, jsonify
+from flask.wrappers import Response
+
+from backend import node
+
+bp = Blueprint("node", __name__)
+
+StatusCode: TypeAlias = (
+    tuple[Response, Literal[200]] | tuple[Response, Literal[404]]
+)
+
+
+@bp.route("/node", methods=["GET"])
+def status() -> Response:
+    """Returns the ID of this node and whether it is draining."""
+    return jsonify(node.status())
+
+
+@bp.route("/node/drain", methods=["POST"])
+def drain() -> StatusCode:
+    """Stops starting new chats here, while still serving existing ones.
+
+    Only available when NODE_DRAIN_API_ENABLED is "true".
+    """
+    if not node.DRAIN_API_ENABLED:
+        return jsonify({"error": "Draining over HTTP is disabled"}), 404
+
+    node.set_draining(True)
+    return jsonify(node.status()), 200
+
+
+@bp.route("/node/drain", methods=["DELETE"])
+def undrain() -> StatusCode:
+    """Starts accepting new chats again."""
+    if not node.DRAIN_API_ENABLED:
+        return jsonify({"error": "Draining over HTTP is disabled"}), 404
+
+    node.set_draining(False)
+    return jsonify(node.status()), 200
@@ -0,0 +1,62 @@
+from typing import Literal, TypeAlias
+
+from flask import Blueprint, jsonify, request
+from flask.wrappers import Response
+
+from backend.storage import get_storage
+
+bp = Blueprint("sales", __name__)
+
+StatusCode: TypeAlias = (
+    tuple[Response, Literal[200]]
+    | tuple[Response, Literal[400]]
+    | tuple[Response, Literal[500]]
+)
+
+
+@bp.route("/sales", methods=["POST"])
+def record_sale() -> StatusCode:
+    """Records units of an item sold from the bowl."""
+    try:
+        if request.json is None:
+            return jsonify({"error": "Invalid request format"}), 400
+
+        item_id = request.json.get("item_id")
+        if not isinstance(item_id, str) or not item_id:
+            return jsonify({"error": "Item ID cannot be empty"}), 400
+
+        try:
+            storage = get_storage()
+            sale = storage.sell(
+                item_id,
+                int(request.json.get("quantity", 1)),
+                request.json.get("unit_price_usd"),
+            )
+
+        except (TypeError, ValueError) as ex:
+            return jsonify({"error": str(ex)}), 400
+
+        return jsonify(
+            {
+                "item_name": sale.item_name,
+                "quantity": sale.quantity,
+                "revenue_usd": sale.amount_usd,
+                "balance_usd": storage.ledger.balance_usd,
+            }
+        ), 200
+
+    except Exception as ex:
+        return jsonify({"error": str(ex)}), 500
+
+
+@bp.route("/sales/summary", methods=["GET"])
+def summary() -> StatusCode:
+    """Returns the balance, totals and per-item sales of the bowl."""
+    ledger = get_storage().ledger
+    return jsonify(
+        {
+            "balance_usd": ledger.balance_usd,
+            "totals": ledger.totals(),
+            "items": [item.to_dict() for item in ledger.items()],
+        }
+    ), 200
@@ -0,0 +1,116 @@
+from collections import Counter
+import heapq
+import math
+import re
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or "
+    "that the their them they this to was we were will with you".split()
+)
+
+
+def words(text: str) -> list[str]:
+    """Splits text into lowercase words, leaving out stop words."""
+    return [
+        word for word in _WORD.findall(text.lower()) if word not in STOP_WORDS
+    ]
+
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into lowercase search terms, folding simple plurals."""
+    terms = []
+    for word in words(text):
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class TextIndex(Generic[K]):
+    """In-memory BM25 index over short documents.
+
+    Documents are added, replaced and removed one at a time, so the index can
+    follow the data it covers without being rebuilt. Searches only visit the
+    documents that contain a query term.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, dict[K, int]] = {}
+        self._texts: dict[K, str] = {}
+        self._lengths: dict[K, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, key: K, text: str) -> None:
+        """Indexes a document, replacing any previous one with the same key."""
+        if self._texts.get(key) == text:
+            return
+
+        self.remove(key)
+        terms = tokenize(text)
+        for term, count in Counter(terms).items():
+            self._postings.setdefault(term, {})[key] = count
+        self._texts[key] = text
+        self._lengths[key] = len(terms)
+        self._total_length += len(terms)
+
+    def remove(self, key: K) -> None:
+        """Removes a document from the index, if it is there."""
+        text = self._texts.pop(key, None)
+        if text is None:
+            return
+
+        for term in set(tokenize(text)):
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(key)
+
+    def clear(self) -> None:
+        """Removes every document from the index."""
+        self._postings.clear()
+        self._texts.clear()
+        self._lengths.clear()
+        self._total_length = 0
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[K, float]]:
+        """Returns the keys of the best matching documents and their scores.
+
+        Documents are ranked by BM25 and only those sharing a term with the
+        query are returned, best match first.
+        """
+        count = len(self._lengths)
+        if not count:
+            return []
+
+        average_length = self._total_length / count or 1.0
+        scores: dict[K, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(
+                1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for key, frequency in postings.items():
+                norm = 1 - self.b + self.b * self._lengths[key] / average_length
+                scores[key] = scores.get(key, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+                )
+
+        return heapq.nlargest(
+            max(limit, 0), scores.items(), key=lambda item: item[1]
+        )
@@ -0,0 +1,84 @@
+import os
+import threading
+
+from backend.tenancy import DEFAULT_TENANT, check_served, current_tenant
+
+from .base import BankAccount, Inventory, Notes, Storage
+from .files import FileStorage
+from .sqlite import SQLiteStorage
+
+__all__ = [
+    "BankAccount",
+    "FileStorage",
+    "Inventory",
+    "Notes",
+    "SQLiteStorage",
+    "Storage",
+    "get_storage",
+    "open_storages",
+]
+
+DATA_DIR = os.getenv("CANDYBOWL_DATA_DIR", "data")
+STORAGE_BACKEND = os.getenv("CANDYBOWL_STORAGE", "files")
+SQLITE_PATH = os.getenv(
+    "CANDYBOWL_SQLITE_PATH", os.path.join(DATA_DIR, "candybowl.db")
+)
+TENANT_DIR = os.getenv(
+    "CANDYBOWL_TENANT_DIR", os.path.join(DATA_DIR, "tenants")
+)
+
+_storages: dict[str, Storage] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(tenant: str | None = None) -> Storage:
+    """Returns the storage of a tenant's bowl.
+
+    The default tenant keeps the data directory it always had, and every
+    other tenant gets its own shard under `TENANT_DIR`, so bowls never share
+    files, locks or databases. Only the tenants this process serves are
+    opened, which also bounds how many stay open.
+
+    Args:
+        tenant: The tenant, or None for the tenant of the current request.
+
+    Raises:
+        TenantNotServed: If this process does not serve the tenant.
+    """
+    tenant = tenant or current_tenant()
+    storage = _storages.get(tenant)
+    if storage is not None:
+        return storage
+
+    with _storages_lock:
+        storage = _storages.get(tenant)
+        if storage is None:
+            check_served(tenant)
+            storage = _storages[tenant] = _open(tenant)
+        return storage
+
+
+def open_storages() -> list[Storage]:
+    """Returns the storage of every tenant opened by this process."""
+    with _storages_lock:
+        return list(_storages.values())
+
+
+def _open(tenant: str) -> Storage:
+    data_dir = (
+        DATA_DIR
+        if tenant == DEFAULT_TENANT
+        else os.path.join(TENANT_DIR, tenant)
+    )
+
+    if STORAGE_BACKEND == "files":
+        return FileStorage(data_dir)
+
+    if STORAGE_BACKEND == "sqlite":
+        return SQLiteStorage(
+            SQLITE_PATH
+            if tenant == DEFAULT_TENANT
+            else os.path.join(data_dir, "candybowl.db")
+        )
+
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
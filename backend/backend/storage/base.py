@@ -0,0 +1,148 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from functools import cached_property
+import math
+from typing import TYPE_CHECKING, Any, Callable, Protocol
+
+from backend.ledger import OPENING_BALANCE_USD, Event, Ledger
+from backend.notes import NotesLog
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from backend.feed import Subscriber
+
+
+class Inventory(Protocol):
+    """Operations every inventory backend provides."""
+
+    def get_inventory(self) -> pd.DataFrame: ...
+
+    def stock_item(
+        self,
+        item_name: str,
+        link: str,
+        quantity: int,
+        total_purchase_price_usd: float,
+        sell_price_usd: float,
+        description: str,
+    ) -> str: ...
+
+    def stock_items(self, items: list[dict]) -> list[str | Exception]: ...
+
+    def sell_item(self, item_id: str, quantity: int) -> dict: ...
+
+    def search(self, query: str, limit: int = 5) -> list[dict]: ...
+
+    def set_price(self, item_id: str, new_price_usd: float) -> None: ...
+
+    def set_prices(
+        self, prices: list[tuple[str, float]]
+    ) -> list[str | None]: ...
+
+    def subscribe(self, subscriber: Subscriber) -> Callable[[], None]: ...
+
+    def refresh(self) -> None: ...
+
+
+class Notes(Protocol):
+    """Operations every notes backend provides."""
+
+    def read(self) -> str: ...
+
+    def read_lines(self) -> list[str]: ...
+
+    def version(self) -> object: ...
+
+    # Each backend has its own cursor type, which callers only pass back.
+    def tail(self, cursor: Any = None) -> tuple[list[str], Any] | None: ...
+
+    def append(self, content: str) -> None: ...
+
+    def extend(self, contents: list[str]) -> None: ...
+
+    def write(self, lines: list[str]) -> None: ...
+
+    def rewrite(self, transform: Callable[[list[str]], list[str]]) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class BankAccount(Protocol):
+    """Operations every bank account backend provides."""
+
+    def read(self) -> str: ...
+
+
+class Storage(ABC):
+    """A backend holding the inventory, ledger and notes of a bowl."""
+
+    @abstractmethod
+    def inventory(self) -> Inventory:
+        """Returns the inventory."""
+
+    @abstractmethod
+    def notes(self) -> Notes:
+        """Returns the notes taken by the model."""
+
+    @cached_property
+    def notes_log(self) -> NotesLog:
+        """Returns the structured, indexed view of the notes."""
+        return NotesLog(self.notes())
+
+    @abstractmethod
+    def bank(self) -> BankAccount:
+        """Returns the bank account."""
+
+    @abstractmethod
+    def events(self) -> Notes:
+        """Returns the append-only log of ledger events, one per line."""
+
+    def opening_balance_usd(self) -> float:
+        """Returns the balance to open a new ledger with."""
+        return OPENING_BALANCE_USD
+
+    @cached_property
+    def ledger(self) -> Ledger:
+        """Returns the ledger of money and pricing events."""
+        return Ledger(self.events(), self.opening_balance_usd)
+
+    def sell(
+        self, item_id: str, quantity: int, unit_price_usd: float | None = None
+    ) -> Event:
+        """Takes sold units out of the inventory and records the sale.
+
+        Both happen in one transaction, so a sale that cannot be recorded
+        does not take the units either, where the backend can roll back.
+
+        Args:
+            item_id: The ID of the item sold.
+            quantity: The number of units sold.
+            unit_price_usd: The price each unit sold for, if not the item's
+                current sell price, such as after haggling.
+
+        Raises:
+            TypeError: If the unit price is not a number.
+            ValueError: If the unit price is negative or not finite, or the
+                item does not exist or has too few units.
+        """
+        if unit_price_usd is not None:
+            unit_price_usd = float(unit_price_usd)
+            if not math.isfinite(unit_price_usd) or unit_price_usd < 0:
+                raise ValueError(f"Invalid unit price: {unit_price_usd}")
+
+        with self.transaction():
+            item = self.inventory().sell_item(item_id, quantity)
+            return self.ledger.record_sale(
+                item_id,
+                item["item_name"],
+                quantity,
+                item["sell_price_usd"]
+                if unit_price_usd is None
+                else unit_price_usd,
+            )
+
+    @abstractmethod
+    def transaction(self) -> AbstractContextManager[None]:
+        """Groups several operations so they are applied atomically."""
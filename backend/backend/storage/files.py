@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+import os
+import threading
+from typing import Iterator
+
+from backend.inventory import InventoryManagerCSV
+from backend.ledger import parse_balance
+from backend.notes import NotesFile
+
+from .base import Storage
+
+
+class FileStorage(Storage):
+    """Stores a bowl as the CSV and text files of a data directory."""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self._lock = threading.RLock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def inventory(self) -> InventoryManagerCSV:
+        return InventoryManagerCSV(os.path.join(self.data_dir, "inventory.csv"))
+
+    def notes(self) -> NotesFile:
+        return NotesFile(os.path.join(self.data_dir, "notes.txt"))
+
+    def bank(self) -> NotesFile:
+        return NotesFile(os.path.join(self.data_dir, "bank.txt"))
+
+    def events(self) -> NotesFile:
+        return NotesFile(os.path.join(self.data_dir, "ledger.jsonl"))
+
+    def opening_balance_usd(self) -> float:
+        """Carries over the balance of the bank file, if there is one."""
+        bank = self.bank()
+        if not os.path.exists(bank.file_path):
+            return super().opening_balance_usd()
+
+        return parse_balance(bank.read())
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        """Serializes the enclosed operations within this process.
+
+        Inventory changes are rolled back if the block raises and are then
+        written behind like any other. Text files cannot be rolled back, so
+        a failed block keeps whatever it appended to them, and a crash can
+        still lose inventory changes that were recorded in the ledger.
+        """
+        with self._lock, self.inventory().transaction():
+            yield
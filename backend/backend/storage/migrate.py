@@ -0,0 +1,80 @@
+"""
+migrate.py
+---------
+One-shot migration of the flat data files into an SQLite database.
+
+Usage:
+    python -m backend.storage.migrate [--data-dir data] [--db data/candybowl.db]
+"""
+
+import argparse
+import os
+
+from loguru import logger
+
+from backend.ledger import parse_balance
+
+from .files import FileStorage
+from .sqlite import SQLiteStorage
+
+
+def migrate(source: FileStorage, target: SQLiteStorage) -> None:
+    """Copies the inventory, bank balance, ledger and notes into the database.
+
+    Raises:
+        ValueError: If the database already holds inventory, ledger events or
+            notes.
+    """
+    connection = target.connection()
+    for table in ("inventory", "ledger", "notes"):
+        if connection.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+            raise ValueError(f"Target database already has {table} rows.")
+
+    inventory = source.inventory().get_inventory()
+    notes_path = source.notes().file_path
+    bank_path = source.bank().file_path
+    events_path = source.events().file_path
+
+    with target.transaction():
+        connection.executemany(
+            "INSERT INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?)",
+            inventory.fillna({"description": ""}).itertuples(index=False),
+        )
+
+        if os.path.exists(notes_path):
+            notes = target.notes()
+            with open(notes_path, "r") as file:
+                for line in file:
+                    if line.strip():
+                        notes.append(line.rstrip("\n"))
+
+        if os.path.exists(bank_path):
+            with open(bank_path, "r") as file:
+                target.bank().set_balance(parse_balance(file.read()))
+
+        if os.path.exists(events_path):
+            events = target.events()
+            with open(events_path, "r") as file:
+                for line in file:
+                    if line.strip():
+                        events.append(line.rstrip("\n"))
+
+    logger.info(
+        f"Migrated {len(inventory)} items from {source.data_dir} "
+        f"to {target.db_path}."
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Migrate flat data files into SQLite."
+    )
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--db", default=os.path.join("data", "candybowl.db"))
+    args = parser.parse_args()
+
+    migrate(FileStorage(args.data_dir), SQLiteStorage(args.db))
+
+
+if __name__ == "__main__":
+    main()
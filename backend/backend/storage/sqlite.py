@@ -0,0 +1,576 @@
+from __future__ import annotations
+from contextlib import contextmanager
+import os
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterator
+import uuid
+
+from loguru import logger
+
+from backend import metrics
+from backend.feed import ChangeFeed, Subscriber, jsonable
+from backend.inventory import COLUMNS, check_price, check_quantity
+from backend.search import words
+
+from .base import Storage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    item_id TEXT PRIMARY KEY,
+    item_name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    total_purchase_price_usd REAL NOT NULL,
+    sell_price_usd REAL NOT NULL,
+    description TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS inventory_item_name ON inventory (item_name);
+CREATE INDEX IF NOT EXISTS inventory_link ON inventory (link);
+
+-- Full-text index over the inventory, kept in sync by the triggers below.
+CREATE VIRTUAL TABLE IF NOT EXISTS inventory_text USING fts5(
+    item_name,
+    description,
+    content='inventory',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS inventory_text_insert AFTER INSERT ON inventory
+BEGIN
+    INSERT INTO inventory_text (rowid, item_name, description)
+    VALUES (new.rowid, new.item_name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS inventory_text_delete AFTER DELETE ON inventory
+BEGIN
+    INSERT INTO inventory_text (inventory_text, rowid, item_name, description)
+    VALUES ('delete', old.rowid, old.item_name, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS inventory_text_update
+AFTER UPDATE OF item_name, description ON inventory
+BEGIN
+    INSERT INTO inventory_text (inventory_text, rowid, item_name, description)
+    VALUES ('delete', old.rowid, old.item_name, old.description);
+    INSERT INTO inventory_text (rowid, item_name, description)
+    VALUES (new.rowid, new.item_name, new.description);
+END;
+
+CREATE TABLE IF NOT EXISTS accounts (
+    name TEXT PRIMARY KEY,
+    balance_usd REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_created_at ON notes (created_at);
+
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    content TEXT NOT NULL
+);
+"""
+
+BANK_ACCOUNT = "bank"
+
+
+class SQLiteStorage(Storage):
+    """Stores a bowl in a single SQLite database running in WAL mode.
+
+    Each thread gets its own connection. Operations outside of a
+    `transaction` block commit individually; blocks may be nested, in which
+    case inner blocks become savepoints of the outermost transaction.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self.inventory_feed = ChangeFeed()
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        connection = self.connection()
+        indexed = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'inventory_text'"
+        ).fetchone()
+        connection.executescript(_SCHEMA)
+        if indexed is None:
+            # Index the rows of databases created before the full-text index.
+            connection.execute(
+                "INSERT INTO inventory_text (inventory_text) VALUES ('rebuild')"
+            )
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns the connection of the calling thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.db_path, isolation_level=None, timeout=5.0
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[None]:
+        connection = self.connection()
+        depth = self._local.depth
+        savepoint = f"sp_{depth}"
+
+        connection.execute(
+            "BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT {savepoint}"
+        )
+        self._local.depth = depth + 1
+        try:
+            with metrics.span(
+                "storage.sqlite.transaction",
+                metrics.STORAGE_LATENCY if depth == 0 else None,
+                operation="sqlite_transaction",
+            ):
+                yield
+
+        except BaseException:
+            if depth == 0:
+                connection.execute("ROLLBACK")
+            else:
+                connection.execute(f"ROLLBACK TO {savepoint}")
+                connection.execute(f"RELEASE {savepoint}")
+            raise
+
+        else:
+            connection.execute(
+                "COMMIT" if depth == 0 else f"RELEASE {savepoint}"
+            )
+
+        finally:
+            self._local.depth = depth
+
+    def inventory(self) -> "InventoryManagerSQLite":
+        return InventoryManagerSQLite(self)
+
+    def notes(self) -> "NotesSQLite":
+        return NotesSQLite(self)
+
+    def bank(self) -> "BankAccountSQLite":
+        return BankAccountSQLite(self)
+
+    def events(self) -> "NotesSQLite":
+        return NotesSQLite(self, table="ledger")
+
+    def opening_balance_usd(self) -> float:
+        """Carries over the balance of the bank account, if there is one."""
+        row = (
+            self.connection()
+            .execute(
+                "SELECT balance_usd FROM accounts WHERE name = ?",
+                (BANK_ACCOUNT,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return super().opening_balance_usd()
+
+        return row["balance_usd"]
+
+
+class InventoryManagerSQLite:
+    def __init__(self, storage: SQLiteStorage):
+        """Initializes the InventoryManager with an SQLite storage."""
+        self._storage = storage
+
+    def get_inventory(self) -> pd.DataFrame:
+        """Returns the inventory as a DataFrame."""
+        import pandas as pd
+
+        return pd.read_sql_query(
+            f"SELECT {', '.join(COLUMNS)} FROM inventory ORDER BY rowid",
+            self._storage.connection(),
+        )
+
+    def stock_item(
+        self,
+        item_name: str,
+        link: str,
+        quantity: int,
+        total_purchase_price_usd: float,
+        sell_price_usd: float,
+        description: str,
+    ) -> str:
+        """Adds new items to the inventory.
+
+        Increases the quantity of a given item if it already exists in the inventory, or adds a new entry if it does not.
+
+        Args:
+            item_name: The name of the item.
+            link: The link to the item.
+            quantity: The quantity to add.
+            total_purchase_price_usd: The price of one of the item in USD (note that one item can have multiple units).
+            sell_price_usd: The price of a single unit of the item in USD.
+            description: A description of the item.
+
+        Returns:
+            The ID of the item.
+
+        Raises:
+            TypeError: If the quantity or a price is not a number.
+            ValueError: If the quantity is not a positive whole number or a
+                price is negative or not finite.
+        """
+        check_quantity(quantity)
+        check_price("Purchase price", total_purchase_price_usd)
+        check_price("Sell price", sell_price_usd)
+
+        connection = self._storage.connection()
+        with self._storage.transaction():
+            row = connection.execute(
+                "SELECT item_id FROM inventory WHERE item_name = ? OR link = ?",
+                (item_name, link),
+            ).fetchone()
+
+            if row is not None:
+                logger.info(
+                    f"Item '{item_name}' already exists in inventory. Updating quantity..."
+                )
+                item_id = row["item_id"]
+                connection.execute(
+                    "UPDATE inventory SET quantity = quantity + ? "
+                    "WHERE item_id = ?",
+                    (quantity, item_id),
+                )
+
+            else:
+                item_id = str(uuid.uuid4())
+                connection.execute(
+                    "INSERT INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        item_id,
+                        item_name,
+                        link,
+                        quantity,
+                        total_purchase_price_usd,
+                        sell_price_usd,
+                        description,
+                    ),
+                )
+
+        self._publish(item_id)
+        return item_id
+
+    def stock_items(self, items: list[dict]) -> list[str | Exception]:
+        """Adds many items to the inventory in one transaction.
+
+        An item that cannot be stocked does not prevent the others from
+        being stocked.
+
+        Args:
+            items: The keyword arguments of `stock_item` for each item.
+
+        Returns:
+            For each item, its ID if it was stocked, or the error that
+            prevented it.
+        """
+        results: list[str | Exception] = []
+        with self._storage.transaction():
+            for item in items:
+                try:
+                    results.append(self.stock_item(**item))
+
+                except (TypeError, ValueError, sqlite3.Error) as ex:
+                    results.append(ex)
+
+        return results
+
+    def sell_item(self, item_id: str, quantity: int) -> dict:
+        """Takes sold units of an item out of the inventory.
+
+        Items that sell out are removed from the inventory.
+
+        Args:
+            item_id: The ID of the item sold.
+            quantity: The number of units sold.
+
+        Returns:
+            The item as it was before the sale.
+
+        Raises:
+            ValueError: If the item does not exist or has too few units.
+        """
+        if quantity <= 0:
+            raise ValueError("Quantity sold must be positive.")
+
+        connection = self._storage.connection()
+        with self._storage.transaction():
+            row = connection.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM inventory WHERE item_id = ?",
+                (item_id,),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Item with ID {item_id} does not exist.")
+            if row["quantity"] < quantity:
+                raise ValueError(
+                    f"Only {row['quantity']} units of item {item_id} are in "
+                    "stock."
+                )
+
+            if row["quantity"] == quantity:
+                connection.execute(
+                    "DELETE FROM inventory WHERE item_id = ?", (item_id,)
+                )
+            else:
+                connection.execute(
+                    "UPDATE inventory SET quantity = quantity - ? "
+                    "WHERE item_id = ?",
+                    (quantity, item_id),
+                )
+
+        self._publish(item_id)
+        return dict(row)
+
+    def set_price(self, item_id: str, new_price_usd: float) -> None:
+        """Sets the price of an item in the inventory.
+
+        Args:
+            item_id: The ID of the item to update.
+            new_price_usd: The new price of the item in USD.
+        """
+        check_price("Price", new_price_usd)
+        cursor = self._storage.connection().execute(
+            "UPDATE inventory SET sell_price_usd = ? WHERE item_id = ?",
+            (new_price_usd, item_id),
+        )
+        if cursor.rowcount == 0:
+            raise ValueError(f"Item with ID {item_id} does not exist.")
+
+        self._publish(item_id)
+
+    def set_prices(self, prices: list[tuple[str, float]]) -> list[str | None]:
+        """Sets the prices of many items in one transaction.
+
+        Args:
+            prices: The ID and new price in USD of each item.
+
+        Returns:
+            For each item, None if its price was set, or why it was not.
+        """
+        errors: list[str | None] = []
+        with self._storage.transaction():
+            for item_id, new_price_usd in prices:
+                try:
+                    self.set_price(item_id, new_price_usd)
+
+                except (TypeError, ValueError) as ex:
+                    errors.append(str(ex))
+
+                else:
+                    errors.append(None)
+
+        return errors
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Returns the items most relevant to a query, best match first.
+
+        Each item has its relevance under "score".
+        """
+        # The index stems words itself, so terms are passed on as written.
+        terms = words(query)
+        if not terms:
+            return []
+
+        rows = self._storage.connection().execute(
+            f"SELECT {', '.join(f'inventory.{column}' for column in COLUMNS)}, "
+            "-bm25(inventory_text) AS score FROM inventory_text "
+            "JOIN inventory ON inventory.rowid = inventory_text.rowid "
+            "WHERE inventory_text MATCH ? ORDER BY bm25(inventory_text) "
+            "LIMIT ?",
+            (" OR ".join(f'"{term}"' for term in terms), max(limit, 0)),
+        )
+        return [dict(row) for row in rows]
+
+    def commit(self) -> None:
+        """Present for parity with InventoryManagerCSV; writes are immediate."""
+
+    def subscribe(self, subscriber: Subscriber) -> Callable[[], None]:
+        """Calls the subscriber with every change made through this process.
+
+        Returns:
+            A function that unsubscribes it.
+        """
+        return self._storage.inventory_feed.subscribe(subscriber)
+
+    def refresh(self) -> None:
+        """Present for parity with InventoryManagerCSV.
+
+        Changes made by other processes are not published.
+        """
+
+    def _publish(self, item_id: str) -> None:
+        """Publishes the current state of an item, if anyone listens."""
+        if not self._storage.inventory_feed:
+            return
+
+        row = (
+            self._storage.connection()
+            .execute(
+                f"SELECT {', '.join(COLUMNS)} FROM inventory WHERE item_id = ?",
+                (item_id,),
+            )
+            .fetchone()
+        )
+        self._storage.inventory_feed.publish(
+            [
+                {"op": "put", "item": jsonable(dict(row))}
+                if row is not None
+                else {"op": "delete", "item_id": item_id}
+            ]
+        )
+
+
+class NotesSQLite:
+    def __init__(self, storage: SQLiteStorage, table: str = "notes"):
+        """Initializes the notes over one of the storage's line tables."""
+        self._storage = storage
+        self._table = table
+
+    def read(self) -> str:
+        """Returns the contents of the notes, one per line."""
+        rows = self._storage.connection().execute(
+            f"SELECT content FROM {self._table} ORDER BY id"
+        )
+        return "".join(row["content"] + "\n" for row in rows)
+
+    def read_lines(self) -> list[str]:
+        """Returns the notes in the order they were taken."""
+        rows = self._storage.connection().execute(
+            f"SELECT content FROM {self._table} ORDER BY id"
+        )
+        return [row["content"] for row in rows]
+
+    def version(self) -> tuple[int, int | None]:
+        """Returns a stamp that changes whenever notes are added or replaced."""
+        row = (
+            self._storage.connection()
+            .execute(f"SELECT count(*), max(id) FROM {self._table}")
+            .fetchone()
+        )
+        return row[0], row[1]
+
+    def tail(
+        self, cursor: tuple[int, int] | None = None
+    ) -> tuple[list[str], tuple[int, int] | None] | None:
+        """Returns the notes added since a cursor, and a cursor past them.
+
+        A cursor of None reads every note.
+
+        Returns:
+            The new notes and cursor, or None if the notes were replaced
+            since the cursor was taken and have to be read from the start.
+        """
+        last = cursor[1] if cursor is not None else 0
+        # A single statement reads a consistent snapshot, so a rewrite
+        # cannot slip in between checking the first note and reading on.
+        rows = (
+            self._storage.connection()
+            .execute(
+                f"SELECT id, content FROM {self._table} "
+                f"WHERE id > ? OR id = (SELECT min(id) FROM {self._table}) "
+                "ORDER BY id",
+                (last,),
+            )
+            .fetchall()
+        )
+        if cursor is not None and (not rows or rows[0]["id"] != cursor[0]):
+            return None
+
+        new = [row for row in rows if row["id"] > last]
+        if not new:
+            return [], cursor
+
+        # New notes mean `rows` is not empty, so it starts with the first.
+        first: int = rows[0]["id"]
+        return [row["content"] for row in new], (first, new[-1]["id"])
+
+    def append(self, content: str) -> None:
+        """Appends a note."""
+        self.extend([content])
+
+    def extend(self, contents: list[str]) -> None:
+        """Appends each of the contents as a note, in one transaction."""
+        with self._storage.transaction():
+            self._storage.connection().executemany(
+                f"INSERT INTO {self._table} (created_at, content) "
+                "VALUES (?, ?)",
+                ((time.time(), content) for content in contents),
+            )
+
+    def write(self, lines: list[str]) -> None:
+        """Atomically replaces every note with the given ones."""
+        with self._storage.transaction():
+            self.clear()
+            self._storage.connection().executemany(
+                f"INSERT INTO {self._table} (created_at, content) "
+                "VALUES (?, ?)",
+                ((time.time(), line) for line in lines),
+            )
+
+    def rewrite(self, transform: Callable[[list[str]], list[str]]) -> None:
+        """Atomically replaces the notes with the result of transforming them."""
+        with self._storage.transaction():
+            self.write(transform(self.read_lines()))
+
+    def clear(self) -> None:
+        """Removes every note."""
+        self._storage.connection().execute(f"DELETE FROM {self._table}")
+
+
+class BankAccountSQLite:
+    def __init__(self, storage: SQLiteStorage):
+        self._storage = storage
+
+    def get_balance(self) -> float:
+        """Returns the current balance in USD."""
+        row = (
+            self._storage.connection()
+            .execute(
+                "SELECT balance_usd FROM accounts WHERE name = ?",
+                (BANK_ACCOUNT,),
+            )
+            .fetchone()
+        )
+        return row["balance_usd"] if row is not None else 0.0
+
+    def set_balance(self, balance_usd: float) -> None:
+        """Overwrites the current balance."""
+        self._storage.connection().execute(
+            "INSERT INTO accounts (name, balance_usd) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET balance_usd = excluded.balance_usd",
+            (BANK_ACCOUNT, balance_usd),
+        )
+
+    def adjust(self, amount_usd: float) -> float:
+        """Adds the given amount to the balance and returns the new balance.
+
+        Raises:
+            ValueError: If the balance would drop below zero.
+        """
+        with self._storage.transaction():
+            balance = self.get_balance() + amount_usd
+            if balance < 0:
+                raise ValueError("Insufficient funds.")
+
+            self.set_balance(balance)
+            return balance
+
+    def read(self) -> str:
+        """Returns the current balance formatted for the model."""
+        return f"${self.get_balance():.2f}"
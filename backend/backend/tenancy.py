@@ -0,0 +1,82 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import re
+from typing import Iterator
+
+DEFAULT_TENANT = "default"
+TENANT_HEADER = "X-Tenant-Id"
+
+# Tenants this process serves. Bowls are only opened for these, so clients
+# cannot create storage by sending new tenant IDs, and bowls can be spread
+# over processes with their requests routed by tenant. Only the default
+# tenant is served when unset.
+SERVED_TENANTS = frozenset(
+    tenant.strip()
+    for tenant in os.getenv("CANDYBOWL_TENANTS", "").split(",")
+    if tenant.strip()
+) or frozenset([DEFAULT_TENANT])
+
+_TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_tenant: ContextVar[str] = ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+class TenantNotServed(Exception):
+    """Raised when a request is for a tenant served by another process."""
+
+
+def current_tenant() -> str:
+    """Returns the tenant whose bowl the current request or job works on."""
+    return _tenant.get()
+
+
+def resolve_tenant(tenant: str | None) -> str:
+    """Validates a tenant ID taken from a request.
+
+    Args:
+        tenant: The ID sent by the client, such as a Discord guild ID, or
+            None to use the default tenant.
+
+    Raises:
+        ValueError: If the ID is not a valid tenant ID.
+        TenantNotServed: If this process does not serve the tenant.
+    """
+    tenant = tenant or DEFAULT_TENANT
+    if not _TENANT_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant ID: {tenant!r}")
+
+    check_served(tenant)
+
+    return tenant
+
+
+def check_served(tenant: str) -> None:
+    """Checks that this process serves a tenant.
+
+    Raises:
+        TenantNotServed: If the tenant is not in `SERVED_TENANTS`.
+    """
+    if tenant not in SERVED_TENANTS:
+        raise TenantNotServed(f"Tenant {tenant} is not served here.")
+
+
+def set_tenant(tenant: str) -> None:
+    """Sets the tenant for the rest of the current request.
+
+    Every request sets its tenant before any handler runs, so a value left
+    over from an earlier request on the same thread is never seen.
+    """
+    _tenant.set(tenant)
+
+
+@contextmanager
+def use_tenant(tenant: str) -> Iterator[None]:
+    """Works on the given tenant's bowl within the block."""
+    token = _tenant.set(tenant)
+    try:
+        yield
+
+    finally:
+        _tenant.reset(token)
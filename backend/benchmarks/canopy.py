@@ -0,0 +1,88 @@
+"""Local stand-in for the Canopy GraphQL API used by the benchmarks."""
+
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+
+def _results(term: str, limit: int) -> list[dict]:
+    """Returns deterministic products for a search term."""
+    results = []
+    for index in range(limit):
+        digest = hashlib.sha1(f"{term}:{index}".encode()).hexdigest()
+        asin = "B0" + digest[:8].upper()
+        results.append(
+            {
+                "asin": asin,
+                "price": {
+                    "value": round(2 + int(digest[8:12], 16) % 2000 / 100, 2),
+                    "currency": "USD",
+                },
+                "rating": round(3 + int(digest[12:14], 16) % 20 / 10, 1),
+                "title": f"{term.title()} Variety Pack, {index + 1} lb",
+                "url": f"https://www.amazon.com/dp/{asin}",
+                "optimizedDescription": f"A bulk pack of {term} for sharing.",
+            }
+        )
+    return results
+
+
+class CanopyStub:
+    """Serves product searches from a local HTTP server.
+
+    Args:
+        latency: Seconds to wait before answering each search.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                variables = json.loads(self.rfile.read(length))["variables"]
+                stub.requests += 1
+                time.sleep(stub.latency)
+
+                body = json.dumps(
+                    {
+                        "data": {
+                            "amazonProductSearchResults": {
+                                "productResults": {
+                                    "results": _results(
+                                        variables["searchTerm"],
+                                        int(variables["limit"]),
+                                    )
+                                }
+                            }
+                        }
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="canopy-stub", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/"
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
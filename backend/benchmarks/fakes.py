@@ -0,0 +1,175 @@
+"""Offline stand-in for the Gemini client used by the benchmarks.
+
+Chats follow scripts instead of calling the model. A script is a generator
+that yields `(tool_name, args)` steps, receives each tool's result back, and
+returns the final response text, mimicking the SDK's automatic function
+calling without leaving the process.
+"""
+
+import time
+from typing import Any, Callable, Generator, Iterator, TypeAlias
+
+from google.genai import types
+
+Step: TypeAlias = tuple[str, dict[str, Any]]
+Script: TypeAlias = Callable[[str], Generator[Step, str, str]]
+
+
+def _estimate_tokens(contents: list[types.Content]) -> int:
+    return sum(len(content.model_dump_json()) for content in contents) // 4
+
+
+class FakeChat:
+    """Chat session that replays a script against the configured tools."""
+
+    def __init__(
+        self,
+        config: types.GenerateContentConfig,
+        script: Script,
+        history: list | None = None,
+        latency: float = 0.0,
+    ):
+        # The chats only configure plain functions as tools.
+        self._tools: dict[str, Callable[..., str]] = {
+            tool.__name__: tool for tool in config.tools or [] if callable(tool)
+        }
+        self._script = script
+        self._latency = latency
+        self._history: list[types.Content] = [
+            types.Content.model_validate(content) for content in history or []
+        ]
+
+    def get_history(self, curated: bool = False) -> list[types.Content]:
+        return list(self._history)
+
+    def _call(self, name: str, args: dict[str, Any]) -> dict[str, Any]:
+        try:
+            return {"result": self._tools[name](**args)}
+
+        except Exception as ex:
+            return {"error": str(ex)}
+
+    def _run(self, message: str) -> str:
+        self._history.append(
+            types.Content(role="user", parts=[types.Part(text=message)])
+        )
+        script = self._script(message)
+
+        try:
+            step = next(script)
+            while True:
+                # Each step is one round trip to the model.
+                time.sleep(self._latency)
+                name, args = step
+                response = self._call(name, args)
+                self._history += [
+                    types.Content(
+                        role="model",
+                        parts=[
+                            types.Part(
+                                function_call=types.FunctionCall(
+                                    name=name, args=args
+                                )
+                            )
+                        ],
+                    ),
+                    types.Content(
+                        role="user",
+                        parts=[
+                            types.Part(
+                                function_response=types.FunctionResponse(
+                                    name=name, response=response
+                                )
+                            )
+                        ],
+                    ),
+                ]
+                step = script.send(
+                    response.get("result") or f"Error: {response['error']}"
+                )
+
+        except StopIteration as stop:
+            text = stop.value
+
+        time.sleep(self._latency)
+        self._history.append(
+            types.Content(role="model", parts=[types.Part(text=text)])
+        )
+        return text
+
+    def _usage(self, text: str) -> types.GenerateContentResponseUsageMetadata:
+        return types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=_estimate_tokens(self._history),
+            candidates_token_count=len(text) // 4 + 1,
+        )
+
+    def _response(
+        self, text: str, usage: bool
+    ) -> types.GenerateContentResponse:
+        return types.GenerateContentResponse(
+            candidates=[
+                types.Candidate(
+                    content=types.Content(
+                        role="model", parts=[types.Part(text=text)]
+                    )
+                )
+            ],
+            usage_metadata=self._usage(text) if usage else None,
+        )
+
+    def send_message(self, message: str) -> types.GenerateContentResponse:
+        return self._response(self._run(message), usage=True)
+
+    def send_message_stream(
+        self, message: str
+    ) -> Iterator[types.GenerateContentResponse]:
+        words = self._run(message).split(" ")
+        for index in range(0, len(words), 8):
+            last = index + 8 >= len(words)
+            yield self._response(
+                " ".join(words[index : index + 8]) + ("" if last else " "),
+                usage=last,
+            )
+
+
+class _Chats:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def create(
+        self,
+        *,
+        model: str,
+        config: types.GenerateContentConfig,
+        history: list | None = None,
+    ) -> FakeChat:
+        return FakeChat(
+            config,
+            self._client.script_for(config),
+            history=history,
+            latency=self._client.latency,
+        )
+
+
+class _Models:
+    def get(self, *, model: str) -> None:
+        return None
+
+
+class FakeClient:
+    """Replaces `genai.Client`, handing out chats that follow scripts.
+
+    Args:
+        script_for: Picks the script for a chat from its configuration.
+        latency: Seconds to wait on each simulated model round trip.
+    """
+
+    def __init__(
+        self,
+        script_for: Callable[[types.GenerateContentConfig], Script],
+        latency: float = 0.0,
+    ):
+        self.script_for = script_for
+        self.latency = latency
+        self.chats = _Chats(self)
+        self.models = _Models()
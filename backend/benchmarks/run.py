@@ -0,0 +1,574 @@
+"""Offline throughput and latency benchmarks for the backend.
+
+Drives the Flask app with a scripted stand-in for Gemini and a local Canopy
+stub, so the numbers reflect the backend itself rather than the model or
+the network. Results are compared against baselines, and the run fails if
+any benchmark regresses by more than the tolerance.
+
+Timings only compare within one machine, so baselines are not kept in git.
+Record them from the code before a change, with the same settings, and then
+compare the change against them. Run from the `backend` directory:
+
+    python -m benchmarks.run [--quick] --update-baselines
+    python -m benchmarks.run [--quick]
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Generator, cast
+import uuid
+import zlib
+
+from google.genai import types
+
+from .canopy import CanopyStub
+from .fakes import FakeClient, Script, Step
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+INVENTORY_SIZES = (100, 10_000, 100_000)
+MESSAGES_PER_CHAT = 10
+CANDIES = [
+    "gummy bears",
+    "sour worms",
+    "chocolate bar",
+    "peanut butter cups",
+    "licorice",
+    "jelly beans",
+    "lollipops",
+    "mints",
+]
+
+
+@dataclass
+class Result:
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p99_ms: float
+
+
+def _percentile(samples: list[float], percentile: int) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method="inclusive")[
+        percentile - 1
+    ]
+
+
+def measure(
+    operation: Callable[[int, int], bool], iterations: int, concurrency: int
+) -> Result:
+    """Runs an operation repeatedly across workers and collects latencies.
+
+    Args:
+        operation: Called with the worker index and iteration number, and
+            returns whether the call succeeded.
+        iterations: How many calls each worker makes.
+        concurrency: How many workers call the operation at once.
+    """
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        nonlocal errors
+        for iteration in range(iterations):
+            start = time.perf_counter()
+            ok = operation(index, iteration)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                errors += not ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return Result(
+        requests=len(latencies),
+        errors=errors,
+        rps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(_percentile(latencies, 50) * 1000, 3),
+        p99_ms=round(_percentile(latencies, 99) * 1000, 3),
+    )
+
+
+def request_script(message: str) -> Generator[Step, str, str]:
+    candy = CANDIES[zlib.crc32(message.encode()) % len(CANDIES)]
+    yield "get_inventory", {"name_contains": candy.split()[0]}
+    yield "get_notes", {"item": candy}
+    yield (
+        "add_note",
+        {
+            "note": f"Requested {candy}.",
+            "user": "benchmark",
+            "item": candy,
+            "suggested_price_usd": 1.25,
+        },
+    )
+    return f"Thanks! I'll consider stocking {candy} at about $1.25 each."
+
+
+def haggle_script(message: str) -> Generator[Step, str, str]:
+    listing = json.loads((yield "get_inventory", {"limit": 5}))
+    yield "get_notes", {"user": "benchmark"}
+    if not listing.get("items"):
+        return "There is nothing to haggle over right now."
+
+    items = listing["items"]
+    item = items[zlib.crc32(message.encode()) % len(items)]
+    price = round(max(0.25, item["sell_price_usd"] * 0.95), 2)
+    yield "set_price", {"item_id": item["item_id"], "new_price_usd": price}
+    yield (
+        "add_note",
+        {
+            "note": f"Agreed on ${price:.2f}.",
+            "user": "benchmark",
+            "item": item["item_name"],
+            "suggested_price_usd": price,
+        },
+    )
+    return f"Deal, {item['item_name']} is now ${price:.2f}."
+
+
+def restock_script(message: str) -> Generator[Step, str, str]:
+    yield "get_inventory", {}
+    yield "get_notes", {}
+    yield "get_account_balance", {}
+    batch = uuid.uuid4().hex[:6]
+    yield "search_products", {"names": [f"{c} {batch}" for c in CANDIES[:4]]}
+    return "Restock the bowl with the four cheapest products found."
+
+
+def _inventory_rows(size: int) -> list[dict]:
+    return [
+        {
+            "item_id": str(uuid.UUID(int=index)),
+            "item_name": f"{CANDIES[index % len(CANDIES)].title()} #{index}",
+            "link": f"https://www.amazon.com/dp/B{index:09d}",
+            "quantity": 1 + index % 20,
+            "total_purchase_price_usd": round(5 + index % 50 / 10, 2),
+            "sell_price_usd": round(0.5 + index % 30 / 10, 2),
+            "description": f"A bag of {CANDIES[index % len(CANDIES)]}.",
+        }
+        for index in range(size)
+    ]
+
+
+def _seed_inventory(size: int) -> None:
+    from backend.inventory import get_store
+    from backend.storage import FileStorage, SQLiteStorage, get_storage
+
+    storage = get_storage()
+    rows = _inventory_rows(size)
+    if isinstance(storage, FileStorage):
+        storage.inventory()  # Creates the CSV file on first use.
+        store = get_store(os.path.join(storage.data_dir, "inventory.csv"))
+        store.replace_all(rows)
+        store.flush()
+
+    elif isinstance(storage, SQLiteStorage):
+        with storage.transaction():
+            connection = storage.connection()
+            connection.execute("DELETE FROM inventory")
+            connection.executemany(
+                "INSERT INTO inventory VALUES (:item_id, :item_name, :link, "
+                ":quantity, :total_purchase_price_usd, :sell_price_usd, "
+                ":description)",
+                rows,
+            )
+
+    # Collect the seeding garbage now rather than in a timed call.
+    gc.collect()
+
+
+class Harness:
+    """Holds the app under test and the offline services it talks to."""
+
+    def __init__(self, app: Any, canopy: CanopyStub):
+        self.app = app
+        self.canopy = canopy
+        self._local = threading.local()
+
+    @property
+    def client(self) -> Any:
+        # Flask test clients keep per-request state, so each worker
+        # thread gets its own.
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def start_chat(self, kind: str) -> str:
+        response = self.client.get(f"/chat/{kind}")
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to start {kind} chat: {response.json}")
+        return response.json["chat_id"]
+
+    def start_chats(
+        self, kind: str, workers: int, iterations: int
+    ) -> list[list[str]]:
+        """Starts enough chats for each worker to send every message.
+
+        Each chat receives at most MESSAGES_PER_CHAT messages, like a real
+        conversation, so results do not depend on the iteration count.
+        """
+        per_worker = -(-iterations // MESSAGES_PER_CHAT)
+        return [
+            [self.start_chat(kind) for _ in range(per_worker)]
+            for _ in range(workers)
+        ]
+
+    def send(self, chat_id: str, message: str) -> bool:
+        response = self.client.post(
+            "/chat/message", json={"chat_id": chat_id, "message": message}
+        )
+        return response.status_code == 200
+
+
+def bench_chat_message(
+    harness: Harness, iterations: int, concurrency: int
+) -> dict[str, Result]:
+    _seed_inventory(100)
+    chat_ids = harness.start_chats("request", concurrency, iterations)
+    return {
+        "chat_message": measure(
+            lambda worker, i: harness.send(
+                chat_ids[worker][i // MESSAGES_PER_CHAT],
+                f"Please stock candy number {i}.",
+            ),
+            iterations,
+            concurrency,
+        )
+    }
+
+
+def bench_inventory_tools(
+    harness: Harness, iterations: int, concurrency: int
+) -> dict[str, Result]:
+    from backend.ai.tools import inventory
+
+    def ok(result: str) -> bool:
+        return not result.startswith("Error")
+
+    results: dict[str, Result] = {}
+    for size in INVENTORY_SIZES:
+        _seed_inventory(size)
+        # Larger inventories take proportionally longer per call.
+        count = max(5, iterations * 1000 // max(size, 1000))
+        operations: dict[str, Callable[[int, int], bool]] = {
+            "get_inventory": lambda w, i: ok(inventory.get_inventory()),
+            "get_inventory_filtered": lambda w, i: ok(
+                inventory.get_inventory(name_contains=f"#{i}")
+            ),
+            "set_price": lambda w, i: ok(
+                inventory.set_price(
+                    str(uuid.UUID(int=i % size)), 1 + (i % 100) / 100
+                )
+            ),
+            "set_prices_50": lambda w, i: ok(
+                inventory.set_prices(
+                    [
+                        inventory.PriceChange(
+                            item_id=str(uuid.UUID(int=(i * 50 + j) % size)),
+                            new_price_usd=1 + j / 100,
+                        )
+                        for j in range(50)
+                    ]
+                )
+            ),
+            "stock_item": lambda w, i: ok(
+                inventory.stock_item(
+                    f"Benchmark Candy {w}.{i}",
+                    f"https://www.amazon.com/dp/BENCH{w}x{i}",
+                    10,
+                    9.99,
+                    1.25,
+                    "Stocked by the benchmark.",
+                )
+            ),
+            "stock_items_50": lambda w, i: ok(
+                inventory.stock_items(
+                    [
+                        inventory.StockEntry(
+                            item_name=f"Benchmark Bulk Candy {w}.{i}.{j}",
+                            link=f"https://www.amazon.com/dp/BULK{w}x{i}x{j}",
+                            quantity=10,
+                            total_purchase_price_usd=9.99,
+                            sell_price_usd=1.25,
+                            description="Stocked by the benchmark.",
+                        )
+                        for j in range(50)
+                    ]
+                )
+            ),
+        }
+        for name, operation in operations.items():
+            results[f"inventory.{name}.{size}"] = measure(operation, count, 1)
+
+    return results
+
+
+def bench_haggle_concurrent(
+    harness: Harness, iterations: int, concurrency: int
+) -> dict[str, Result]:
+    _seed_inventory(100)
+    sessions = concurrency * 2
+    count = max(1, iterations // 2)
+    chat_ids = harness.start_chats("haggle", sessions, count)
+    return {
+        f"haggle_concurrent.{sessions}": measure(
+            lambda worker, i: harness.send(
+                chat_ids[worker][i // MESSAGES_PER_CHAT],
+                f"Would you take less for item {i}?",
+            ),
+            count,
+            sessions,
+        )
+    }
+
+
+def bench_restock(
+    harness: Harness, iterations: int, concurrency: int
+) -> dict[str, Result]:
+    _seed_inventory(100)
+    # The first search pays for opening the HTTP session to Canopy.
+    harness.client.get("/chat/restock")
+    return {
+        "restock": measure(
+            lambda worker, i: (
+                harness.client.get("/chat/restock").status_code == 200
+            ),
+            max(1, iterations // 10),
+            1,
+        )
+    }
+
+
+BENCHMARKS: dict[str, Callable[[Harness, int, int], dict[str, Result]]] = {
+    "chat_message": bench_chat_message,
+    "inventory_tools": bench_inventory_tools,
+    "haggle_concurrent": bench_haggle_concurrent,
+    "restock": bench_restock,
+}
+
+
+def compare(
+    results: dict[str, Result],
+    baselines: dict[str, dict],
+    tolerance: float,
+    min_delta_ms: float,
+) -> list[str]:
+    """Returns a description of every result that regressed past the baseline.
+
+    A result regresses when it is worse than the baseline by more than the
+    tolerance and, to keep sub-millisecond timings from flagging noise, by
+    more than `min_delta_ms` per request.
+    """
+
+    def worse(value: float, baseline: float) -> bool:
+        return (
+            value > baseline * (1 + tolerance)
+            and value - baseline > min_delta_ms
+        )
+
+    regressions: list[str] = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+
+        if result.rps and worse(1000 / result.rps, 1000 / baseline["rps"]):
+            regressions.append(
+                f"{name}: {result.rps} req/s is below the baseline of "
+                f"{baseline['rps']} req/s"
+            )
+        for field in ("p50_ms", "p99_ms"):
+            value = getattr(result, field)
+            if worse(value, baseline[field]):
+                regressions.append(
+                    f"{name}: {field} of {value} is above the baseline of "
+                    f"{baseline[field]}"
+                )
+        if result.errors:
+            regressions.append(f"{name}: {result.errors} requests failed")
+
+    return regressions
+
+
+def _setup_environment(data_dir: str, canopy: CanopyStub) -> None:
+    # The backend reads its configuration when first imported, so this must
+    # run before anything from it is imported.
+    os.environ["CANDYBOWL_DATA_DIR"] = data_dir
+    os.environ["CHAT_SESSION_DIR"] = os.path.join(data_dir, "chats")
+    os.environ["CANOPY_API_URL"] = canopy.url
+    os.environ.setdefault("CANOPY_RATE_LIMIT_PER_SECOND", "1000")
+    os.environ.setdefault("CANOPY_RATE_LIMIT_BURST", "1000")
+
+
+def _create_harness(canopy: CanopyStub, model_latency: float) -> Harness:
+    from loguru import logger
+
+    from backend.ai import chat
+    from backend.routes.app import create_app
+
+    # Every chat gets its own copy of the configuration, so scripts are
+    # picked by its system instruction, which differs for each kind.
+    def instruction(config: types.GenerateContentConfig) -> tuple[str, ...]:
+        return tuple(cast(list[str], config.system_instruction))
+
+    scripts: dict[tuple[str, ...], Script] = {
+        instruction(chat._config("request")): request_script,
+        instruction(chat._config("haggle")): haggle_script,
+        instruction(chat._config("restock")): restock_script,
+    }
+    chat._client = FakeClient(  # type: ignore[assignment]
+        lambda config: scripts[instruction(config)],
+        latency=model_latency,
+    )
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    return Harness(create_app(), canopy)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"Benchmarks to run, out of {', '.join(BENCHMARKS)}; runs all "
+        "of them by default.",
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Run a tenth of the iterations, for a fast smoke check.",
+    )
+    parser.add_argument(
+        "--model-latency-ms",
+        type=float,
+        default=0.0,
+        help="Simulated time per model round trip.",
+    )
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.3,
+        help="Fraction a result may be worse than its baseline.",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=1.0,
+        help="Smallest per-request slowdown that counts as a regression.",
+    )
+    parser.add_argument(
+        "--update-baselines",
+        action="store_true",
+        help="Store the results as the new baselines instead of comparing.",
+    )
+    parser.add_argument("--output", help="Also write the results as JSON here.")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+    selected = args.benchmarks or list(BENCHMARKS)
+    iterations = (
+        max(1, args.iterations // 10) if args.quick else args.iterations
+    )
+
+    canopy = CanopyStub()
+    canopy.start()
+    with tempfile.TemporaryDirectory(prefix="candybowl-bench-") as data_dir:
+        _setup_environment(data_dir, canopy)
+        harness = _create_harness(canopy, args.model_latency_ms / 1000)
+
+        results: dict[str, Result] = {}
+        for name in selected:
+            print(f"Running {name}...", file=sys.stderr)
+            results.update(
+                BENCHMARKS[name](harness, iterations, args.concurrency)
+            )
+
+        from backend.inventory import flush_all
+
+        flush_all()
+    canopy.stop()
+
+    print(
+        f"{'benchmark':<40} {'requests':>8} {'errors':>6} "
+        f"{'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<40} {result.requests:>8} {result.errors:>6} "
+            f"{result.rps:>10} {result.p50_ms:>10} {result.p99_ms:>10}"
+        )
+
+    serialized = {name: asdict(result) for name, result in results.items()}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(serialized, file, indent=2)
+
+    # Results only compare between runs with the same settings.
+    settings = {
+        "iterations": iterations,
+        "concurrency": args.concurrency,
+        "model_latency_ms": args.model_latency_ms,
+    }
+    baselines: dict[str, Any] = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as file:
+            baselines = json.load(file)
+
+    if args.update_baselines:
+        if baselines.get("settings") != settings:
+            baselines = {"settings": settings, "results": {}}
+        baselines["results"].update(serialized)
+        with open(args.baselines, "w") as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"Updated baselines in {args.baselines}.")
+        return
+
+    if not baselines:
+        print("No baselines to compare against.")
+        return
+
+    if baselines.get("settings") != settings:
+        print(
+            f"The baselines were recorded with {baselines.get('settings')}, "
+            f"not {settings}. Record them again with --update-baselines."
+        )
+        sys.exit(2)
+
+    regressions = compare(
+        results, baselines["results"], args.tolerance, args.min_delta_ms
+    )
+
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+    print("\nNo regressions against the baselines.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Cold start profile of the backend and chatbot entry points.
+
+Starts each app in a fresh interpreter with `-X importtime`, reports how long
+it took to become ready and which packages its imports spent that time in,
+and fails if any app takes longer than the budget.
+
+Run from the `backend` directory:
+
+    python -m benchmarks.startup [--budget SECONDS] [--top N]
+"""
+
+import argparse
+from collections import defaultdict
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+# Each target exits as soon as it is ready, so work the app hands off to
+# background threads, such as loading the model client, is not counted.
+TARGETS = {
+    "backend": (
+        "backend",
+        "import os; from backend.routes.app import create_app; create_app()",
+    ),
+    "backend-asgi": (
+        "backend",
+        "import os; from backend.routes.asgi import create_app; create_app()",
+    ),
+    "chatbot": ("chatbot", "import os; import apps.main"),
+}
+
+
+def profile(
+    directory: str, code: str, data_dir: str
+) -> tuple[float, dict[str, float]]:
+    """Runs code in a fresh interpreter and times it.
+
+    Returns:
+        The wall time in seconds and the import time spent in each top-level
+        package, in seconds.
+    """
+    env = {
+        **os.environ,
+        "CANDYBOWL_DATA_DIR": data_dir,
+        "CHAT_SESSION_DIR": os.path.join(data_dir, "chats"),
+    }
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{code}; os._exit(0)"],
+        cwd=os.path.join(ROOT, directory),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"Failed to start {directory}:\n{process.stderr}")
+
+    packages: dict[str, float] = defaultdict(float)
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        own, _, name = line.removeprefix("import time:").split("|")
+        packages[name.strip().split(".")[0]] += int(own) / 1e6
+
+    return elapsed, packages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        help=f"Apps to profile, out of {', '.join(TARGETS)}; profiles all of "
+        "them by default.",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=1.0,
+        help="Most seconds an app may take to start.",
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="How many packages to list."
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Runs per app; the fastest is reported.",
+    )
+    args = parser.parse_args()
+    for name in args.targets:
+        if name not in TARGETS:
+            parser.error(f"unknown app: {name}")
+
+    over_budget = []
+    with tempfile.TemporaryDirectory(prefix="candybowl-startup-") as data_dir:
+        for name in args.targets or list(TARGETS):
+            directory, code = TARGETS[name]
+            elapsed, packages = min(
+                (
+                    profile(directory, code, data_dir)
+                    for _ in range(max(1, args.repeat))
+                ),
+                key=lambda run: run[0],
+            )
+
+            print(f"{name}: ready in {elapsed:.3f} s")
+            heaviest = sorted(packages.items(), key=lambda p: -p[1])
+            for package, seconds in heaviest[: args.top]:
+                print(f"  {package:<30} {seconds * 1000:>8.1f} ms")
+
+            if elapsed > args.budget:
+                over_budget.append(name)
+
+    if over_budget:
+        print(
+            f"\nOver the {args.budget:.2f} s budget: {', '.join(over_budget)}"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
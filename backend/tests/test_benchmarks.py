@@ -0,0 +1,39 @@
+"""Runs every benchmark briefly to check that its requests succeed.
+
+Timings are not checked here, as they only compare against baselines
+recorded on the same machine.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_benchmarks_run_without_errors(tmp_path):
+    results_path = tmp_path / "results.json"
+
+    # The backend reads its configuration when first imported, so the
+    # benchmarks run in their own process.
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.run",
+            "--iterations=10",
+            "--concurrency=2",
+            f"--baselines={tmp_path / 'baselines.json'}",
+            f"--output={results_path}",
+        ],
+        cwd=BACKEND_DIR,
+        check=True,
+        capture_output=True,
+    )
+
+    results = json.loads(results_path.read_text())
+    assert results
+    assert {name: result["errors"] for name, result in results.items()} == {
+        name: 0 for name in results
+    }
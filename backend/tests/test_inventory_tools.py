@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from backend.ai.tools import inventory as tools
+from backend.storage import FileStorage, SQLiteStorage
+
+
+@pytest.fixture(params=["files", "sqlite"])
+def storage(request, tmp_path, monkeypatch):
+    if request.param == "files":
+        storage = FileStorage(str(tmp_path))
+    else:
+        storage = SQLiteStorage(str(tmp_path / "candybowl.db"))
+    monkeypatch.setattr(tools, "get_storage", lambda: storage)
+    yield storage
+
+    # Writes out the inventory now rather than at exit, after the test.
+    storage.inventory().commit()
+
+
+def _entry(item_name: str, **fields) -> tools.StockEntry:
+    return tools.StockEntry(
+        **{
+            "item_name": item_name,
+            "link": f"https://example.com/{item_name}",
+            "quantity": 10,
+            "total_purchase_price_usd": 5.0,
+            "sell_price_usd": 1.0,
+            "description": "",
+            **fields,
+        }
+    )
+
+
+def test_stock_items_reports_invalid_rows_and_keeps_valid_ones(storage):
+    results = json.loads(
+        tools.stock_items(
+            [
+                _entry("Twix"),
+                _entry("Mars", quantity=-3),
+                _entry("Snickers", quantity=0),
+                _entry("Bounty", total_purchase_price_usd=-1.0),
+                _entry("Kitkat", sell_price_usd=float("nan")),
+                _entry("Skittles", quantity=4),
+            ]
+        )
+    )
+
+    assert [result["item_name"] for result in results] == [
+        "Twix",
+        "Mars",
+        "Snickers",
+        "Bounty",
+        "Kitkat",
+        "Skittles",
+    ]
+    assert [result["result"] == "ok" for result in results] == [
+        True,
+        False,
+        False,
+        False,
+        False,
+        True,
+    ]
+    assert "Quantity" in results[1]["result"]
+
+    inventory = storage.inventory().get_inventory()
+    assert dict(zip(inventory["item_name"], inventory["quantity"])) == {
+        "Twix": 10,
+        "Skittles": 4,
+    }
+    assert {
+        stats.item_name: stats.units_purchased
+        for stats in storage.ledger.items()
+    } == {"Twix": 10, "Skittles": 4}
+
+
+def test_stock_items_rejects_invalid_restock_of_existing_item(storage):
+    tools.stock_items([_entry("Twix")])
+
+    results = json.loads(tools.stock_items([_entry("Twix", quantity=-10)]))
+
+    assert results[0]["result"] != "ok"
+    inventory = storage.inventory().get_inventory()
+    assert list(inventory["quantity"]) == [10]
+
+
+def test_set_prices_reports_invalid_prices(storage):
+    tools.stock_items([_entry("Twix"), _entry("Mars")])
+    item_ids = list(storage.inventory().get_inventory()["item_id"])
+
+    results = json.loads(
+        tools.set_prices(
+            [
+                tools.PriceChange(item_id=item_ids[0], new_price_usd=2.0),
+                tools.PriceChange(item_id=item_ids[1], new_price_usd=-1.0),
+            ]
+        )
+    )
+
+    assert [result["result"] == "ok" for result in results] == [True, False]
+    inventory = storage.inventory().get_inventory()
+    assert list(inventory["sell_price_usd"]) == [2.0, 1.0]
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from backend.ai.tools import notes as tools
+from backend.storage import FileStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = FileStorage(str(tmp_path))
+    monkeypatch.setattr(tools, "get_storage", lambda: storage)
+    return storage
+
+
+def test_get_notes_keeps_summaries_within_budget(storage, monkeypatch):
+    monkeypatch.setattr(tools, "CHAR_BUDGET", 2000)
+    log = storage.notes_log
+    for index in range(100):
+        log.append("x" * 1000, user=f"user-{index}", item=f"candy-{index}")
+    log.compact(before=float("inf"))
+    log.append("Wants more gummy bears", user="alice", item="gummy bears")
+
+    result = json.loads(tools.get_notes())
+
+    assert len(json.dumps(result)) < 2 * tools.CHAR_BUDGET
+    assert 0 < len(result["summaries"]) < 100
+    assert result["omitted_summaries"] == 100 - len(result["summaries"])
+    assert [note["text"] for note in result["notes"]] == [
+        "Wants more gummy bears"
+    ]
+    for summary in result["summaries"]:
+        for text in summary["recent_texts"]:
+            assert len(text) <= tools.SNIPPET_CHARS
+
+
+def test_malformed_note_lines_are_read_as_text(storage):
+    storage.notes().extend(
+        [
+            json.dumps({"type": "note", "text": "No timestamp"}),
+            json.dumps(
+                {"type": "note", "timestamp": 1.0, "text": "Hi", "x": 1}
+            ),
+            json.dumps({"type": "summary", "items": []}),
+            json.dumps({"type": "note", "timestamp": "soon", "text": "Later"}),
+        ]
+    )
+    storage.notes_log.append("Likes licorice", user="bob", item="licorice")
+
+    result = json.loads(tools.get_notes())
+
+    assert len(result["notes"]) == 5
+    assert result["notes"][0]["text"] == "Likes licorice"
+    assert "No timestamp" in result["notes"][-1]["text"]
@@ -0,0 +1,71 @@
+from backend.search import TextIndex, tokenize
+
+
+def test_tokenize_drops_stop_words_and_folds_plurals():
+    assert tokenize("The Gummies and the Mints") == ["gummy", "mint"]
+
+
+def test_search_ranks_by_relevance():
+    index = TextIndex()
+    index.add("sour worms", "Sour gummy worms")
+    index.add("bears", "Gummy bears")
+    index.add("chocolate", "Milk chocolate bar")
+    index.add("sour bears", "Sour gummy bears")
+
+    results = index.search("sour worms")
+
+    # Matching both terms beats matching one, and documents without any of
+    # the terms are left out.
+    assert [key for key, _ in results] == ["sour worms", "sour bears"]
+    assert results[0][1] > results[1][1] > 0
+
+
+def test_search_respects_limit():
+    index = TextIndex()
+    for number in range(10):
+        index.add(number, f"gummy bear {number}")
+
+    assert len(index.search("gummy", limit=3)) == 3
+    assert index.search("gummy", limit=0) == []
+
+
+def test_add_replaces_document_with_same_key():
+    index = TextIndex()
+    index.add("item", "Gummy bears")
+    index.add("item", "Milk chocolate")
+
+    assert len(index) == 1
+    assert index.search("gummy") == []
+    assert [key for key, _ in index.search("chocolate")] == ["item"]
+
+
+def test_remove_drops_document():
+    index = TextIndex()
+    index.add("bears", "Gummy bears")
+    index.add("worms", "Gummy worms")
+
+    index.remove("bears")
+    index.remove("missing")
+
+    assert len(index) == 1
+    assert [key for key, _ in index.search("gummy bears")] == ["worms"]
+
+
+def test_clear_empties_index():
+    index = TextIndex()
+    index.add("bears", "Gummy bears")
+
+    index.clear()
+
+    assert len(index) == 0
+    assert index.search("gummy") == []
+
+
+def test_empty_queries_match_nothing():
+    index = TextIndex()
+    index.add("bears", "Gummy bears")
+
+    assert index.search("") == []
+    assert index.search("the and of") == []
+    assert index.search("licorice") == []
+    assert TextIndex().search("gummy") == []
@@ -0,0 +1,149 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Callable
+
+import discord
+from loguru import logger
+
+from .stream import MESSAGE_LIMIT
+
+RECONNECT_SECONDS = float(os.getenv("BOWL_RECONNECT_SECONDS", "1"))
+MAX_RECONNECT_SECONDS = float(os.getenv("BOWL_MAX_RECONNECT_SECONDS", "60"))
+
+
+def _describe(item: dict) -> str:
+    price = item.get("sell_price_usd")
+    price_text = f"${price:.2f}" if price is not None else "unpriced"
+    return f"{item.get('item_name')} ({item.get('quantity')} @ {price_text})"
+
+
+def _difference(before: dict, after: dict) -> str:
+    changed = [
+        f"{column} {before.get(column)} → {after.get(column)}"
+        for column in ("quantity", "sell_price_usd")
+        if before.get(column) != after.get(column)
+    ]
+    return f"{after.get('item_name')}: {', '.join(changed) or 'details'}"
+
+
+class BowlBoard:
+    """Keeps one message showing a bowl's inventory as it changes.
+
+    Events from the backend's `/inventory/changes` stream are applied to a
+    local copy of the inventory, and the message is edited to show it along
+    with the latest change, at most once per `edit_interval` seconds to stay
+    clear of rate limits.
+    """
+
+    def __init__(self, message: discord.Message, edit_interval: float = 1.0):
+        self.message = message
+        self._edit_interval = edit_interval
+        self._items: dict[str, dict] = {}
+        self._last_change = ""
+        self._shown = ""
+        self._last_edit = 0.0
+        self._pending: asyncio.Task | None = None
+
+    def apply(self, event: str, data: dict) -> None:
+        """Applies a `snapshot` or `change` event to the local inventory."""
+        if event == "snapshot" or data.get("op") == "reset":
+            self._items = {item["item_id"]: item for item in data["items"]}
+            if event != "snapshot":
+                self._last_change = "Inventory replaced"
+            return
+
+        if event != "change":
+            return
+
+        if data["op"] == "put":
+            item = data["item"]
+            before = self._items.get(item["item_id"])
+            self._items[item["item_id"]] = item
+            self._last_change = (
+                f"Added {_describe(item)}"
+                if before is None
+                else _difference(before, item)
+            )
+        elif data["op"] == "delete":
+            before = self._items.pop(data["item_id"], None)
+            if before is not None:
+                self._last_change = f"Removed {before.get('item_name')}"
+
+    async def show(self) -> None:
+        """Edits the message, or schedules the edit if it is too soon."""
+        delay = self._last_edit + self._edit_interval - time.monotonic()
+        if delay > 0:
+            if self._pending is None:
+                self._pending = asyncio.create_task(self._show_later(delay))
+            return
+
+        text = self.render()
+        if text == self._shown:
+            return
+
+        await self.message.edit(content=text)
+        self._shown = text
+        self._last_edit = time.monotonic()
+
+    async def follow(
+        self, connect: Callable[[], AsyncIterator[tuple[str, dict]]]
+    ) -> None:
+        """Applies streamed events until the message is deleted.
+
+        Args:
+            connect: Opens the event stream. It is called again, backing off,
+                whenever the stream ends or fails, and every stream starts
+                with a snapshot, so no change is lost across reconnects.
+        """
+        delay = RECONNECT_SECONDS
+        while True:
+            try:
+                async for event, data in connect():
+                    self.apply(event, data)
+                    await self.show()
+                    delay = RECONNECT_SECONDS
+
+            except discord.NotFound:
+                logger.info(f"Bowl message {self.message.id} was deleted.")
+                self.close()
+                return
+
+            except Exception as ex:
+                logger.warning(f"Bowl change stream failed: {ex}")
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_SECONDS)
+
+    async def _show_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._pending = None
+        try:
+            await self.show()
+
+        except Exception as ex:
+            logger.error(f"Error updating bowl message: {ex}")
+
+    def close(self) -> None:
+        """Cancels any scheduled edit."""
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+    def render(self) -> str:
+        """Returns the message text, cut to fit within one message."""
+        lines = [
+            f"- {_describe(item)}"
+            for item in sorted(
+                self._items.values(),
+                key=lambda item: str(item.get("item_name")).lower(),
+            )
+        ]
+        footer = (
+            f"\nLast change: {self._last_change}" if self._last_change else ""
+        )
+        text = "**Current bowl**\n" + ("\n".join(lines) or "The bowl is empty.")
+        limit = MESSAGE_LIMIT - len(footer)
+        if len(text) > limit:
+            text = text[: limit - 2].rsplit("\n", 1)[0] + "\n…"
+        return text + footer
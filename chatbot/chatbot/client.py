@@ -0,0 +1,265 @@
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
+import json
+import os
+from typing import AsyncIterator
+
+import aiohttp
+from loguru import logger
+
+TIMEOUT_SECONDS = float(os.getenv("BACKEND_TIMEOUT_SECONDS", "120"))
+MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "16"))
+MAX_RETRIES = int(os.getenv("BACKEND_MAX_RETRIES", "3"))
+BACKOFF_SECONDS = float(os.getenv("BACKEND_BACKOFF_SECONDS", "0.5"))
+POLL_SECONDS = float(os.getenv("BACKEND_POLL_SECONDS", "1"))
+MAX_POLL_SECONDS = float(os.getenv("BACKEND_MAX_POLL_SECONDS", "5"))
+
+TENANT_HEADER = "X-Tenant-Id"
+
+_RETRY_STATUSES = {502, 503, 504}
+
+
+class BackendClient:
+    """Asynchronous client for the candy bowl backend.
+
+    Requests share one keep-alive connection pool, at most `max_connections`
+    run at once, and failures that cannot have reached the model (connection
+    errors and 502/503/504 responses) are retried with exponential backoff.
+    Event streams stay open indefinitely, so they get connections of their
+    own and do not hold slots that other requests wait for.
+
+    Requests may name a tenant, such as the Discord guild they come from, so
+    that the backend works on that tenant's bowl.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = TIMEOUT_SECONDS,
+        max_connections: int = MAX_CONNECTIONS,
+        max_retries: int = MAX_RETRIES,
+        backoff: float = BACKOFF_SECONDS,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._timeout = timeout
+        self._max_connections = max_connections
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_connections)
+        self._session: aiohttp.ClientSession | None = None
+        self._stream_session: aiohttp.ClientSession | None = None
+
+    async def start(self) -> None:
+        """Opens the connection pools."""
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=10, sock_read=self._timeout
+        )
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections),
+                timeout=timeout,
+            )
+        if self._stream_session is None:
+            self._stream_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0), timeout=timeout
+            )
+
+    async def close(self) -> None:
+        """Closes the connection pools."""
+        for session in (self._session, self._stream_session):
+            if session is not None:
+                await session.close()
+        self._session = None
+        self._stream_session = None
+
+    @asynccontextmanager
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        tenant: str | None = None,
+        stream: bool = False,
+        **kwargs,
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Sends a request, retrying failures the backend never processed.
+
+        Args:
+            stream: Whether the response stays open indefinitely. It is then
+                sent over the event stream pool, outside `max_connections`.
+        """
+        await self.start()
+        session = self._stream_session if stream else self._session
+        assert session is not None
+
+        if tenant is not None:
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                TENANT_HEADER: tenant,
+            }
+
+        async with nullcontext() if stream else self._semaphore:
+            for attempt in range(self._max_retries + 1):
+                try:
+                    response = await session.request(
+                        method, f"{self.base_url}{path}", **kwargs
+                    )
+
+                except aiohttp.ClientConnectorError as ex:
+                    if attempt == self._max_retries:
+                        raise
+
+                    logger.warning(f"{method} {path} failed: {ex}")
+
+                else:
+                    if (
+                        response.status not in _RETRY_STATUSES
+                        or attempt == self._max_retries
+                    ):
+                        break
+
+                    logger.warning(
+                        f"{method} {path} returned {response.status}"
+                    )
+                    response.release()
+
+                await asyncio.sleep(self._backoff * 2**attempt)
+
+            try:
+                response.raise_for_status()
+                yield response
+
+            finally:
+                response.release()
+
+    async def get_json(self, path: str, tenant: str | None = None) -> dict:
+        """Sends a GET request and returns the decoded JSON body."""
+        async with self._request(
+            "GET",
+            path,
+            tenant,
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        ) as response:
+            return await response.json()
+
+    async def post_json(
+        self, path: str, data: dict, tenant: str | None = None
+    ) -> dict:
+        """Sends a JSON POST request and returns the decoded JSON body."""
+        async with self._request(
+            "POST",
+            path,
+            tenant,
+            json=data,
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        ) as response:
+            return await response.json()
+
+    async def stream_ndjson(
+        self,
+        method: str,
+        path: str,
+        data: dict | None = None,
+        tenant: str | None = None,
+    ) -> AsyncIterator[dict]:
+        """Yields the objects of a newline-delimited JSON response as they arrive.
+
+        Raises:
+            RuntimeError: If the stream reports an error.
+        """
+        async with self._request(method, path, tenant, json=data) as response:
+            async for line in response.content:
+                if not line.strip():
+                    continue
+
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+
+                yield chunk
+
+    async def stream_events(
+        self, path: str, tenant: str | None = None
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """Yields the events of a server-sent event stream as they arrive.
+
+        Yields:
+            The name of each event and its decoded JSON data. Comments, such
+            as keep-alives, are skipped.
+        """
+        async with self._request(
+            "GET",
+            path,
+            tenant,
+            stream=True,
+            headers={"Accept": "text/event-stream"},
+        ) as response:
+            event = "message"
+            data: list[str] = []
+            async for raw in response.content:
+                line = raw.decode().rstrip("\r\n")
+                if not line:
+                    if data:
+                        yield event, json.loads("\n".join(data))
+                    event = "message"
+                    data = []
+                    continue
+
+                field, _, value = line.partition(":")
+                value = value.removeprefix(" ")
+                if field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+
+    async def follow_job(
+        self,
+        path: str,
+        data: dict,
+        idempotency_key: str,
+        tenant: str | None = None,
+    ) -> AsyncIterator[dict]:
+        """Submits a background job and yields its progress until it finishes.
+
+        The job is submitted with an idempotency key, so retried submissions
+        cannot start it twice. Its status is then polled, backing off while
+        nothing changes, and the result fields are yielded as
+        `{"result": ...}` once they appear, followed by `{"text": ...}` for
+        output as it arrives.
+
+        Raises:
+            RuntimeError: If the job fails.
+        """
+        async with self._request(
+            "POST",
+            path,
+            tenant,
+            json=data,
+            headers={"Idempotency-Key": idempotency_key},
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        ) as response:
+            job = await response.json()
+
+        result: dict = {}
+        offset = 0
+        delay = POLL_SECONDS
+        while True:
+            if job["result"] != result:
+                result = job["result"]
+                yield {"result": result}
+
+            if job["output"]:
+                yield {"text": job["output"]}
+                delay = POLL_SECONDS
+            else:
+                delay = min(delay * 2, MAX_POLL_SECONDS)
+            offset = job["offset"]
+
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+            if job["status"] == "succeeded":
+                return
+
+            await asyncio.sleep(delay)
+            job = await self.get_json(
+                f"{path}/{job['job_id']}?offset={offset}", tenant
+            )
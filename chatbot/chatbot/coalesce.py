@@ -0,0 +1,76 @@
+import asyncio
+from dataclasses import dataclass, field
+import os
+import time
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from loguru import logger
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "1.5"))
+COALESCE_MAX_WAIT_SECONDS = float(os.getenv("COALESCE_MAX_WAIT_SECONDS", "6"))
+
+
+@dataclass
+class _Batch(Generic[T]):
+    first_at: float
+    last_at: float
+    items: list[T] = field(default_factory=list)
+
+
+class MessageCoalescer(Generic[K, T]):
+    """Merges bursts of messages per key into single calls of a handler.
+
+    A batch is handed over once no message has arrived for `window` seconds,
+    or `max_wait` seconds after its first message, whichever comes first.
+    Each key has at most one handler call in flight, and messages arriving
+    during it form the next batch, so batches are handled in order.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[K, list[T]], Awaitable[None]],
+        window: float = COALESCE_WINDOW_SECONDS,
+        max_wait: float = COALESCE_MAX_WAIT_SECONDS,
+    ):
+        self._handler = handler
+        self._window = window
+        self._max_wait = max_wait
+        self._pending: dict[K, _Batch[T]] = {}
+        self._workers: dict[K, asyncio.Task] = {}
+
+    def add(self, key: K, item: T) -> None:
+        """Queues a message, starting a worker for its key if there is none."""
+        now = time.monotonic()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(now, now)
+        batch.items.append(item)
+        batch.last_at = now
+
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._work(key))
+
+    async def _work(self, key: K) -> None:
+        try:
+            while (batch := self._pending.get(key)) is not None:
+                deadline = min(
+                    batch.last_at + self._window,
+                    batch.first_at + self._max_wait,
+                )
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                del self._pending[key]
+                try:
+                    await self._handler(key, batch.items)
+
+                except Exception as ex:
+                    logger.error(f"Error handling messages for {key}: {ex}")
+
+        finally:
+            del self._workers[key]
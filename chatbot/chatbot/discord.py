@@ -1,13 +1,24 @@
+import asyncio
+from contextlib import suppress
 import os
-import requests
 
 import discord
 from discord import app_commands
 from loguru import logger
 
-API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:5000")
+from .board import BowlBoard
+from .coalesce import MessageCoalescer
+from .routing import BackendRouter
+from .stream import MessageStreamer
 
 _thread_chats = {}
+# The pinned inventory message of each bowl, and the task keeping it current.
+_bowls: dict[str | None, tuple[BowlBoard, asyncio.Task]] = {}
+
+
+def _tenant(guild: discord.Guild | None) -> str | None:
+    """Returns the tenant of a guild's bowl, or None for the default bowl."""
+    return str(guild.id) if guild is not None else None
 
 
 class CandyBowlBot(discord.Client):
@@ -16,11 +27,19 @@ class CandyBowlBot(discord.Client):
     def __init__(self):
         super().__init__(intents=discord.Intents.default())
         self.tree = app_commands.CommandTree(self)
+        self.backends = BackendRouter()
 
     async def setup_hook(self):
+        await self.backends.start()
         await self.tree.sync()
         logger.info("Slash commands synced!")
 
+    async def close(self):
+        for _, task in _bowls.values():
+            task.cancel()
+        await self.backends.close()
+        await super().close()
+
 
 bot = CandyBowlBot()
 
@@ -57,10 +76,12 @@ async def request(interaction: discord.Interaction) -> None:
             message=intial_message,
         )
 
-        response = requests.get(f"{API_BASE_URL}/chat/request")
-        response.raise_for_status()
+        tenant = _tenant(interaction.guild)
+        response = await bot.backends.for_tenant(tenant).get_json(
+            "/chat/request", tenant
+        )
 
-        chat_id = response.json().get("chat_id")
+        chat_id = response.get("chat_id")
         if not chat_id:
             raise ValueError("Chat ID not found in response.")
 
@@ -98,10 +119,12 @@ async def haggle(interaction: discord.Interaction) -> None:
             message=intial_message,
         )
 
-        response = requests.get(f"{API_BASE_URL}/chat/haggle")
-        response.raise_for_status()
+        tenant = _tenant(interaction.guild)
+        response = await bot.backends.for_tenant(tenant).get_json(
+            "/chat/haggle", tenant
+        )
 
-        chat_id = response.json().get("chat_id")
+        chat_id = response.get("chat_id")
         if not chat_id:
             raise ValueError("Chat ID not found in response.")
 
@@ -139,27 +162,109 @@ async def restock(interaction: discord.Interaction) -> None:
             message=intial_message,
         )
 
-        response = requests.get(f"{API_BASE_URL}/chat/restock")
-        response.raise_for_status()
-        response = response.json()
+        streamer = MessageStreamer(thread)
+        tenant = _tenant(interaction.guild)
+        async for data in bot.backends.for_tenant(tenant).follow_job(
+            "/chat/restock/jobs",
+            {},
+            idempotency_key=str(interaction.id),
+            tenant=tenant,
+        ):
+            if data.get("result", {}).get("chat_id"):
+                _thread_chats[thread.id] = data["result"]["chat_id"]
+            elif "text" in data:
+                await streamer.write(data["text"])
+
+        await streamer.close()
 
-        chat_id = response.get("chat_id")
-        if not chat_id:
-            raise ValueError("Chat ID not found in response.")
+    except Exception as ex:
+        await interaction.followup.send(f"An error occurred: {ex}")
+        logger.error(f"Error in /restock command: {ex}")
 
-        response = response.get("response")
-        if not response:
-            raise ValueError("Response from the model is empty.")
 
-        _thread_chats[thread.id] = chat_id
+@bot.tree.command(
+    name="sale", description="Record items sold from the candy bowl."
+)
+@app_commands.describe(
+    item_id="The ID of the item sold.",
+    quantity="The number of units sold.",
+    price="The price each unit sold for, if not the listed price.",
+)
+async def sale(
+    interaction: discord.Interaction,
+    item_id: str,
+    quantity: int = 1,
+    price: float | None = None,
+) -> None:
+    """Handles the /sale slash command to record a sale in the ledger."""
+    logger.info(f"Recording sale of {quantity} of item {item_id}...")
+    await interaction.response.defer()
 
-        logger.info(f"Response from Gemini model: {response}")
-        for i in range(0, len(response), 2000):
-            await thread.send(response[i : i + 2000])
+    data: dict = {"item_id": item_id, "quantity": quantity}
+    if price is not None:
+        data["unit_price_usd"] = price
+
+    try:
+        tenant = _tenant(interaction.guild)
+        response = await bot.backends.for_tenant(tenant).post_json(
+            "/sales", data, tenant
+        )
+        await interaction.followup.send(
+            f"Sold {response['quantity']} of {response['item_name']} for "
+            f"${response['revenue_usd']:.2f}. Balance: "
+            f"${response['balance_usd']:.2f}."
+        )
 
     except Exception as ex:
         await interaction.followup.send(f"An error occurred: {ex}")
-        logger.error(f"Error in /restock command: {ex}")
+        logger.error(f"Error in /sale command: {ex}")
+
+
+@bot.tree.command(
+    name="bowl", description="Pin a live view of the candy bowl's inventory."
+)
+async def bowl(interaction: discord.Interaction) -> None:
+    """Handles the /bowl slash command to pin a message that tracks the inventory.
+
+    Each bowl has one such message. Running the command again moves it to
+    the current channel.
+    """
+    if not isinstance(interaction.channel, discord.TextChannel):
+        logger.error(
+            f"Command can only be used in text channels. Channel type: {type(interaction.channel)}"
+        )
+        return
+
+    await interaction.response.defer()
+
+    try:
+        # Sent to the channel rather than as a follow-up, which can only be
+        # edited while the interaction lasts.
+        message = await interaction.channel.send("Loading the candy bowl...")
+        await message.pin()
+
+        tenant = _tenant(interaction.guild)
+        if tenant in _bowls:
+            previous, task = _bowls.pop(tenant)
+            task.cancel()
+            previous.close()
+            with suppress(discord.HTTPException):
+                await previous.message.unpin()
+
+        board = BowlBoard(message)
+        task = asyncio.create_task(
+            board.follow(
+                lambda: bot.backends.for_tenant(tenant).stream_events(
+                    "/inventory/changes", tenant
+                )
+            )
+        )
+        _bowls[tenant] = (board, task)
+        await interaction.followup.send("Pinned the current bowl.")
+
+    except Exception as ex:
+        await interaction.followup.send(f"An error occurred: {ex}")
+        logger.error(f"Error in /bowl command: {ex}")
 
 
 @bot.event
@@ -172,20 +277,44 @@ async def on_message(message: discord.Message) -> None:
     if len(message.content) == 0 or message.author == bot.user:
         return
 
-    chat_id = _thread_chats.get(message.channel.id)
-    if chat_id:
+    if message.channel.id in _thread_chats:
         logger.info(
             f"Received message in thread {message.channel.id}: {message.content}"
         )
+        _messages.add(message.channel.id, message)
+
+
+async def _reply(thread_id: int, messages: list[discord.Message]) -> None:
+    """Sends a burst of thread messages to the model as one turn."""
+    channel = messages[-1].channel
+    chat_id = _thread_chats[thread_id]
+    tenant = _tenant(messages[-1].guild)
+    data = {
+        "chat_id": chat_id,
+        "message": "\n".join(
+            f"{message.author.name}: {message.content}"[:2000]
+            for message in messages
+        ),
+    }
+
+    try:
+        streamer = MessageStreamer(channel)
+        async for chunk in bot.backends.for_chat(chat_id, tenant).stream_ndjson(
+            "POST", "/chat/message/stream", data, tenant
+        ):
+            if "text" in chunk:
+                await streamer.write(chunk["text"])
+
+        await streamer.close()
+
+    except Exception as ex:
+        await channel.send(f"An error occurred: {ex}")
+        logger.error(f"Error handling message: {ex}")
 
-        data = {
-            "chat_id": chat_id,
-            "message": f"{message.author.name}: {message.content}"[:2000],
-        }
-        response = requests.post(f"{API_BASE_URL}/chat/message", json=data)
 
-        logger.info(f"Response from Gemini model: {response}")
-        await message.channel.send(f"{response}")
+# Messages sent in quick succession are answered together, one turn at a time
+# per thread.
+_messages: MessageCoalescer[int, discord.Message] = MessageCoalescer(_reply)
 
 
 def start_bot() -> None:
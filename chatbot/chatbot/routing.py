@@ -0,0 +1,146 @@
+import asyncio
+from bisect import bisect
+import hashlib
+import os
+
+from loguru import logger
+
+from .client import BackendClient
+
+API_BASE_URLS = [
+    url.strip()
+    for url in os.getenv(
+        "API_BASE_URLS", os.getenv("API_BASE_URL", "http://localhost:5000")
+    ).split(",")
+    if url.strip()
+]
+VIRTUAL_NODES = int(os.getenv("BACKEND_VIRTUAL_NODES", "128"))
+REFRESH_SECONDS = float(os.getenv("BACKEND_REFRESH_SECONDS", "15"))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring that maps keys onto a set of nodes.
+
+    Each node is placed on the ring many times, so keys spread evenly and
+    adding or removing a node only moves the keys nearest to its points.
+    """
+
+    def __init__(self, nodes: list[str], virtual_nodes: int = VIRTUAL_NODES):
+        self._points = sorted(
+            (_hash(f"{node}#{index}"), node)
+            for node in nodes
+            for index in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in self._points]
+
+    def __bool__(self) -> bool:
+        return bool(self._points)
+
+    def get(self, key: str) -> str:
+        """Returns the node that owns the key."""
+        if not self._points:
+            raise LookupError("The ring has no nodes.")
+
+        index = bisect(self._hashes, _hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+class BackendRouter:
+    """Spreads bowls over backend nodes and keeps each chat on its owner.
+
+    New chats and sales are routed by tenant over a consistent hash ring of
+    the nodes that are up and not draining, so a bowl stays on one node and
+    only the bowls of an added or drained node move. Chat IDs name the node
+    that started them, and follow-up messages go back to that node while it
+    is up, even when it is draining. Once it is gone they go to the bowl's
+    node instead, which can only pick the chat up if the nodes share their
+    data and chat session directories (see `backend.node`). Node membership
+    is refreshed every `refresh_interval` seconds from each node's `/node`
+    endpoint.
+    """
+
+    def __init__(
+        self,
+        base_urls: list[str] = API_BASE_URLS,
+        refresh_interval: float = REFRESH_SECONDS,
+    ):
+        self._clients = {url: BackendClient(url) for url in base_urls}
+        self._refresh_interval = refresh_interval
+        self._owners: dict[str, str] = {}
+        self._accepting = list(base_urls)
+        self._ring = HashRing(base_urls)
+        self._all = HashRing(base_urls)
+        self._refresher: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Opens the connection pools and starts tracking node membership."""
+        for client in self._clients.values():
+            await client.start()
+
+        await self.refresh()
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_forever())
+
+    async def close(self) -> None:
+        """Stops tracking membership and closes the connection pools."""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+
+        for client in self._clients.values():
+            await client.close()
+
+    def for_tenant(self, tenant: str | None) -> BackendClient:
+        """Returns the node that starts chats and records sales for a bowl."""
+        ring = self._ring or self._all
+        return self._clients[ring.get(tenant or "default")]
+
+    def for_chat(self, chat_id: str, tenant: str | None) -> BackendClient:
+        """Returns the node holding a chat, or the tenant's if it is gone."""
+        node_id, separator, _ = chat_id.partition(".")
+        url = self._owners.get(node_id) if separator else None
+        if url is not None:
+            return self._clients[url]
+
+        return self.for_tenant(tenant)
+
+    async def refresh(self) -> None:
+        """Asks every node whether it is up and accepting new chats."""
+        statuses = await asyncio.gather(
+            *(client.get_json("/node") for client in self._clients.values()),
+            return_exceptions=True,
+        )
+
+        owners = {}
+        accepting = []
+        for url, status in zip(self._clients, statuses):
+            if isinstance(status, BaseException):
+                logger.warning(f"Backend {url} is unavailable: {status}")
+                continue
+
+            owners[status["node_id"]] = url
+            if not status["draining"]:
+                accepting.append(url)
+
+        if accepting != self._accepting:
+            if accepting:
+                logger.info(f"Routing new chats to {', '.join(accepting)}.")
+            else:
+                logger.warning("No backend accepts new chats; trying them all.")
+
+        self._owners = owners
+        self._accepting = accepting
+        self._ring = HashRing(accepting)
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self._refresh_interval)
+            try:
+                await self.refresh()
+
+            except Exception as ex:
+                logger.error(f"Error refreshing backend nodes: {ex}")
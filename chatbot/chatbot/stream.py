@@ -0,0 +1,55 @@
+import time
+
+import discord
+
+MESSAGE_LIMIT = 2000
+
+
+class MessageStreamer:
+    """Writes streamed text into a channel, editing messages as it grows.
+
+    Text is split across as many messages as needed to stay within Discord's
+    2000 character limit, and the message being written is edited at most
+    once per `edit_interval` seconds to stay clear of rate limits.
+    """
+
+    def __init__(
+        self, channel: discord.abc.Messageable, edit_interval: float = 1.0
+    ):
+        self._channel = channel
+        self._edit_interval = edit_interval
+        self._message: discord.Message | None = None
+        self._text = ""
+        self._shown = ""
+        self._last_edit = 0.0
+
+    async def write(self, text: str) -> None:
+        """Appends text to the stream."""
+        self._text += text
+
+        while len(self._text) > MESSAGE_LIMIT:
+            head, self._text = (
+                self._text[:MESSAGE_LIMIT],
+                self._text[MESSAGE_LIMIT:],
+            )
+            await self._show(head)
+            self._message, self._shown = None, ""
+
+        if time.monotonic() - self._last_edit >= self._edit_interval:
+            await self._show(self._text)
+
+    async def close(self) -> None:
+        """Writes out any text that has not been shown yet."""
+        await self._show(self._text)
+
+    async def _show(self, text: str) -> None:
+        if not text or text == self._shown:
+            return
+
+        if self._message is None:
+            self._message = await self._channel.send(text)
+        else:
+            await self._message.edit(content=text)
+
+        self._shown = text
+        self._last_edit = time.monotonic()
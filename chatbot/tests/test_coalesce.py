@@ -0,0 +1,116 @@
+import asyncio
+
+from chatbot.coalesce import MessageCoalescer
+
+WINDOW = 0.1
+
+
+class Recorder:
+    """Records handler calls, optionally taking a while over each."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: list[tuple[str, list[int]]] = []
+        self.in_flight: dict[str, int] = {}
+        self.most_in_flight = 0
+
+    async def __call__(self, key: str, items: list[int]) -> None:
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight[key])
+        self.calls.append((key, items))
+        await asyncio.sleep(self.delay)
+        self.in_flight[key] -= 1
+
+
+def test_burst_is_handled_once_after_window():
+    async def main() -> Recorder:
+        recorder = Recorder()
+        coalescer = MessageCoalescer(recorder, window=WINDOW, max_wait=1.0)
+        for item in range(3):
+            coalescer.add("a", item)
+            await asyncio.sleep(WINDOW / 5)
+        assert recorder.calls == []
+
+        await asyncio.sleep(WINDOW * 3)
+        return recorder
+
+    recorder = asyncio.run(main())
+
+    assert recorder.calls == [("a", [0, 1, 2])]
+
+
+def test_steady_stream_is_flushed_at_max_wait():
+    async def main() -> Recorder:
+        recorder = Recorder()
+        coalescer = MessageCoalescer(
+            recorder, window=WINDOW, max_wait=WINDOW * 3
+        )
+        # Never pauses for a whole window, so only max_wait splits batches.
+        for item in range(20):
+            coalescer.add("a", item)
+            await asyncio.sleep(WINDOW / 2)
+
+        await asyncio.sleep(WINDOW * 3)
+        return recorder
+
+    recorder = asyncio.run(main())
+
+    assert len(recorder.calls) > 1
+    assert [item for _, items in recorder.calls for item in items] == list(
+        range(20)
+    )
+
+
+def test_keys_are_batched_separately():
+    async def main() -> Recorder:
+        recorder = Recorder()
+        coalescer = MessageCoalescer(recorder, window=WINDOW, max_wait=1.0)
+        coalescer.add("a", 1)
+        coalescer.add("b", 2)
+        coalescer.add("a", 3)
+
+        await asyncio.sleep(WINDOW * 3)
+        return recorder
+
+    recorder = asyncio.run(main())
+
+    assert sorted(recorder.calls) == [("a", [1, 3]), ("b", [2])]
+
+
+def test_one_call_in_flight_per_key_and_batches_stay_in_order():
+    async def main() -> Recorder:
+        recorder = Recorder(delay=WINDOW * 4)
+        coalescer = MessageCoalescer(recorder, window=WINDOW, max_wait=1.0)
+        coalescer.add("a", 1)
+        await asyncio.sleep(WINDOW * 2)
+
+        # Arrive while the first batch is being handled.
+        coalescer.add("a", 2)
+        coalescer.add("a", 3)
+
+        await asyncio.sleep(WINDOW * 12)
+        return recorder
+
+    recorder = asyncio.run(main())
+
+    assert recorder.calls == [("a", [1]), ("a", [2, 3])]
+    assert recorder.most_in_flight == 1
+
+
+def test_failing_handler_does_not_stop_later_batches():
+    async def main() -> list[list[int]]:
+        handled = []
+
+        async def handler(key: str, items: list[int]) -> None:
+            handled.append(items)
+            if items == [1]:
+                raise RuntimeError("Backend is down")
+
+        coalescer = MessageCoalescer(handler, window=WINDOW, max_wait=1.0)
+        coalescer.add("a", 1)
+        await asyncio.sleep(WINDOW * 3)
+        coalescer.add("a", 2)
+        await asyncio.sleep(WINDOW * 3)
+        return handled
+
+    assert asyncio.run(main()) == [[1], [2]]
@@ -0,0 +1,140 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from chatbot.client import BackendClient
+from chatbot.routing import BackendRouter, HashRing
+
+NODES = ["http://a:5000", "http://b:5000", "http://c:5000"]
+KEYS = [f"tenant-{index}" for index in range(3000)]
+
+
+def test_ring_spreads_keys_evenly():
+    ring = HashRing(NODES)
+
+    counts = Counter(ring.get(key) for key in KEYS)
+
+    assert set(counts) == set(NODES)
+    for count in counts.values():
+        assert abs(count - len(KEYS) / len(NODES)) < 0.2 * len(KEYS)
+
+
+def test_ring_is_deterministic():
+    assert [HashRing(NODES).get(key) for key in KEYS[:100]] == [
+        HashRing(list(reversed(NODES))).get(key) for key in KEYS[:100]
+    ]
+
+
+def test_adding_a_node_only_moves_keys_to_it():
+    before = HashRing(NODES)
+    after = HashRing([*NODES, "http://d:5000"])
+
+    moved = [key for key in KEYS if before.get(key) != after.get(key)]
+
+    assert {after.get(key) for key in moved} == {"http://d:5000"}
+    assert len(moved) < 0.4 * len(KEYS)
+
+
+def test_removing_a_node_only_moves_its_keys():
+    before = HashRing(NODES)
+    after = HashRing(NODES[1:])
+
+    for key in KEYS:
+        if before.get(key) != NODES[0]:
+            assert after.get(key) == before.get(key)
+
+
+def test_empty_ring_has_no_owner():
+    ring = HashRing([])
+
+    assert not ring
+    with pytest.raises(LookupError):
+        ring.get("tenant")
+
+
+class _FakeNode(BackendClient):
+    """Client whose node reports a fixed status, or None when it is down."""
+
+    def __init__(self, base_url: str, status: dict | None):
+        super().__init__(base_url)
+        self._status = status
+
+    async def get_json(self, path: str, tenant: str | None = None) -> dict:
+        assert path == "/node"
+        if self._status is None:
+            raise ConnectionError("Node is down")
+        return self._status
+
+
+def _router(statuses: dict[str, dict | None]) -> BackendRouter:
+    """Returns a router whose nodes report the given statuses.
+
+    A status of None makes the node unreachable.
+    """
+    router = BackendRouter(list(statuses))
+    for url in router._clients:
+        router._clients[url] = _FakeNode(url, statuses[url])
+
+    asyncio.run(router.refresh())
+    return router
+
+
+def _status(node_id: str, draining: bool = False) -> dict:
+    return {"node_id": node_id, "draining": draining}
+
+
+def test_tenants_move_off_a_draining_node():
+    router = _router(dict(zip(NODES, map(_status, "abc"))))
+    owners = {key: router.for_tenant(key).base_url for key in KEYS[:300]}
+
+    drained = _router(
+        {
+            NODES[0]: _status("a", draining=True),
+            NODES[1]: _status("b"),
+            NODES[2]: _status("c"),
+        }
+    )
+
+    for key, owner in owners.items():
+        url = drained.for_tenant(key).base_url
+        assert url != NODES[0]
+        if owner != NODES[0]:
+            assert url == owner
+
+
+def test_chats_stay_on_their_node_while_it_drains():
+    router = _router(
+        {
+            NODES[0]: _status("a", draining=True),
+            NODES[1]: _status("b"),
+            NODES[2]: _status("c"),
+        }
+    )
+
+    assert router.for_chat("a.1234", "tenant").base_url == NODES[0]
+    assert router.for_chat("c.1234", "tenant").base_url == NODES[2]
+
+
+def test_chats_fall_back_to_the_tenant_node_when_their_node_is_gone():
+    router = _router(
+        {NODES[0]: None, NODES[1]: _status("b"), NODES[2]: _status("c")}
+    )
+    tenant_node = router.for_tenant("tenant")
+
+    assert tenant_node.base_url != NODES[0]
+    assert router.for_chat("a.1234", "tenant") is tenant_node
+    assert router.for_chat("unknown.1234", "tenant") is tenant_node
+    assert router.for_chat("no-node-prefix", "tenant") is tenant_node
+
+
+def test_every_node_is_tried_when_none_accepts_chats():
+    router = _router(
+        {
+            NODES[0]: _status("a", draining=True),
+            NODES[1]: _status("b", draining=True),
+            NODES[2]: _status("c", draining=True),
+        }
+    )
+
+    assert router.for_tenant("tenant").base_url in NODES